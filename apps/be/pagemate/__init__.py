@@ -5,12 +5,13 @@ from fastapi.exceptions import RequestValidationError
 from scalar_fastapi import get_scalar_api_reference
 
 from pagemate import routers
-from pagemate.assemble import middleware, exception
+from pagemate.assemble import middleware, exception, lifespan
 
 TITLE = "PageMate API"
 
 app = FastAPI(
     title=TITLE,
+    lifespan=lifespan.lifespan,
     middleware=[
         middleware.cors_middleware,
         middleware.context_middleware,
@@ -38,3 +39,4 @@ app.include_router(routers.tenant.router)
 app.include_router(routers.document.router)
 app.include_router(routers.retrieval.router)
 app.include_router(routers.upstage.router)
+app.include_router(routers.chat.router)
@@ -0,0 +1,28 @@
+import logging
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI
+from pymongo.errors import PyMongoError
+
+from pagemate import clients
+from pagemate.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    await clients.mongo.connection.connect()
+    if settings.mongo_ensure_indexes:
+        try:
+            await clients.mongo.indexes.ensure_indexes()
+        except PyMongoError as e:
+            # Serving without an index is slow, not wrong: keep starting up
+            logger.warning("Could not ensure MongoDB indexes: %s", e)
+    if settings.embedding_cache_backend == "mongo":
+        await clients.mongo.embedding_cache.ensure_indexes()
+    try:
+        yield
+    finally:
+        clients.mongo.connection.close()
+        await clients.opanai.close()
@@ -0,0 +1,72 @@
+import argparse
+import asyncio
+import time
+from typing import List, Optional
+
+import numpy as np
+
+from pagemate.services import index_service
+from pagemate.tools.ann import recall_at_k
+
+
+async def run(tenant_id: str, k: int, queries: int, nprobes: List[int]) -> int:
+    index = await index_service.get_index(tenant_id)
+    if index is None or len(index) == 0:
+        print(f"No chunks indexed for tenant '{tenant_id}'.")
+        return 1
+
+    quantizer = await index_service.train_quantizer(tenant_id)
+    if quantizer is None:
+        print("Failed to build the ANN index.")
+        return 1
+
+    # Use stored chunk vectors as queries (the chunk itself is always a hit)
+    rng = np.random.default_rng(0)
+    rows = rng.choice(len(index), size=min(queries, len(index)), replace=False)
+    query_vectors = index.vectors[rows].copy()
+
+    t0 = time.perf_counter()
+    exact = [index.search(q, limit=k)[0].tolist() for q in query_vectors]
+    exact_ms = (time.perf_counter() - t0) * 1000 / len(query_vectors)
+
+    print(
+        f"tenant={tenant_id} size={len(index)} nlist={quantizer.nlist} "
+        f"k={k} queries={len(query_vectors)}"
+    )
+    print(f"{'mode':>10} {'recall@k':>10} {'ms/query':>10}")
+    print(f"{'exact':>10} {1.0:>10.4f} {exact_ms:>10.3f}")
+
+    for nprobe in nprobes:
+        t0 = time.perf_counter()
+        approx = [
+            index.search(q, limit=k, nprobe=nprobe)[0].tolist() for q in query_vectors
+        ]
+        ann_ms = (time.perf_counter() - t0) * 1000 / len(query_vectors)
+        recall = np.mean([recall_at_k(e, a, k) for e, a in zip(exact, approx)])
+        print(f"{f'nprobe={nprobe}':>10} {recall:>10.4f} {ann_ms:>10.3f}")
+
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Measure ANN recall@k against exact search for a tenant"
+    )
+    parser.add_argument("tenant_id", help="Tenant to evaluate")
+    parser.add_argument("--k", type=int, default=10, help="Top-k (default: 10)")
+    parser.add_argument(
+        "--queries", type=int, default=200, help="Sampled queries (default: 200)"
+    )
+    parser.add_argument(
+        "--nprobe",
+        type=int,
+        nargs="+",
+        default=[1, 4, 8, 16, 32],
+        help="nprobe values to evaluate (default: 1 4 8 16 32)",
+    )
+    args = parser.parse_args(argv)
+    return asyncio.run(run(args.tenant_id, args.k, args.queries, args.nprobe))
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
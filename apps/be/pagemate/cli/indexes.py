@@ -0,0 +1,56 @@
+import argparse
+import asyncio
+from typing import List, Optional
+
+from pymongo.errors import PyMongoError
+
+from pagemate.clients.mongo import indexes
+
+
+async def run(ensure: bool) -> int:
+    if ensure:
+        try:
+            created = await indexes.ensure_indexes()
+        except PyMongoError as e:
+            print(f"Failed to ensure indexes: {e}")
+            return 1
+        for collection, names in created.items():
+            print(f"{collection}: {', '.join(names)}")
+        print()
+
+    plans = await indexes.explain_hot_queries()
+    print(f"{'query':<34} {'plan':<28} index")
+    for plan in plans:
+        stages = ">".join(reversed(plan.stages))
+        print(
+            f"{plan.query.name:<34} {stages:<28} {', '.join(plan.index_names) or '-'}"
+        )
+
+    collscans = [plan for plan in plans if plan.is_collscan]
+    if collscans:
+        print()
+        print(f"{len(collscans)} hot query(s) run as a COLLSCAN:")
+        for plan in collscans:
+            print(f"  {plan.query.name} on {plan.query.collection}: {plan.query.filter}")
+        return 1
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description=(
+            "Create the declared MongoDB indexes and report hot queries "
+            "that run as a COLLSCAN"
+        )
+    )
+    parser.add_argument(
+        "--check-only",
+        action="store_true",
+        help="Only explain the hot queries; do not create indexes",
+    )
+    args = parser.parse_args(argv)
+    return asyncio.run(run(ensure=not args.check_only))
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,114 @@
+import argparse
+import asyncio
+import statistics
+import time
+from typing import List, Optional
+
+import httpx
+
+
+async def _worker(
+    client: httpx.AsyncClient,
+    target: str,
+    tenant_id: str,
+    query: str,
+    deadline: float,
+    latencies: List[float],
+    errors: List[str],
+) -> None:
+    while time.perf_counter() < deadline:
+        t0 = time.perf_counter()
+        try:
+            if target == "retrieval":
+                resp = await client.get(
+                    f"/tenants/{tenant_id}/retrieval",
+                    params={"query": query, "limit": 5},
+                )
+            else:
+                resp = await client.post(
+                    "/upstage/v1/chat/completions",
+                    json={"messages": [{"role": "user", "content": query}]},
+                )
+            resp.raise_for_status()
+            latencies.append(time.perf_counter() - t0)
+        except Exception as e:
+            errors.append(type(e).__name__)
+
+
+async def run(
+    base_url: str,
+    target: str,
+    tenant_id: str,
+    query: str,
+    concurrency: int,
+    duration: float,
+) -> None:
+    latencies: List[float] = []
+    errors: List[str] = []
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(
+        base_url=base_url, limits=limits, timeout=120.0
+    ) as client:
+        deadline = time.perf_counter() + duration
+        await asyncio.gather(
+            *(
+                _worker(client, target, tenant_id, query, deadline, latencies, errors)
+                for _ in range(concurrency)
+            )
+        )
+
+    print(f"target={target} concurrency={concurrency} duration={duration:.0f}s")
+    print(f"  ok={len(latencies)} errors={len(errors)}")
+    print(f"  throughput={len(latencies) / duration:.2f} req/s")
+    if latencies:
+        ordered = sorted(latencies)
+        p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+        print(
+            f"  latency p50={statistics.median(ordered) * 1000:.1f}ms "
+            f"p95={p95 * 1000:.1f}ms max={ordered[-1] * 1000:.1f}ms"
+        )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Concurrent load test for retrieval / chat endpoints"
+    )
+    parser.add_argument(
+        "--base-url", default="http://localhost:8000", help="API base URL"
+    )
+    parser.add_argument(
+        "--target", choices=["retrieval", "chat"], default="retrieval"
+    )
+    parser.add_argument("--tenant", dest="tenant_id", default="", help="Tenant id")
+    parser.add_argument("--query", default="How do I file a claim?")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        nargs="+",
+        default=[1, 8, 32, 64],
+        help="Concurrency levels to run (default: 1 8 32 64)",
+    )
+    parser.add_argument(
+        "--duration", type=float, default=20.0, help="Seconds per level"
+    )
+    args = parser.parse_args(argv)
+
+    if args.target == "retrieval" and not args.tenant_id:
+        parser.error("--tenant is required for the retrieval target")
+
+    for concurrency in args.concurrency:
+        asyncio.run(
+            run(
+                args.base_url,
+                args.target,
+                args.tenant_id,
+                args.query,
+                concurrency,
+                args.duration,
+            )
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
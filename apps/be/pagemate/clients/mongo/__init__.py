@@ -1,8 +1,19 @@
 from pagemate.clients.mongo import chunk
+from pagemate.clients.mongo import connection
 from pagemate.clients.mongo import document
+from pagemate.clients.mongo import embedding_cache
+from pagemate.clients.mongo import embedding_store
+from pagemate.clients.mongo import file_object
+from pagemate.clients.mongo import indexes
 from pagemate.clients.mongo import tenant
 
 __all__ = [
+    "chunk",
+    "connection",
     "document",
+    "embedding_cache",
+    "embedding_store",
+    "file_object",
+    "indexes",
     "tenant",
 ]
@@ -1,19 +1,98 @@
+from collections import defaultdict
+from datetime import datetime
 from typing import Optional
 
-from motor.motor_asyncio import AsyncIOMotorClient
+from pagemate.clients.mongo import connection
 
-from pagemate.settings import settings
+# Phase one of retrieval: only what the vector index needs
+VECTOR_PROJECTION = {
+    "_id": 1,
+    "document_id": 1,
+    "embedding": 1,
+    "embedding_encoding": 1,
+    "embedding_scale": 1,
+    "schema_version": 1,
+    "gen_from": 1,
+    "gen_to": 1,
+    "updated_at": 1,
+}
+
+# Phase two of retrieval: everything except the (large) vector fields
+CONTENT_PROJECTION = {
+    "embedding": 0,
+    "embedding_encoding": 0,
+    "embedding_scale": 0,
+}
+
+
+def visible_filter(generation: int) -> dict:
+    """
+    Chunks are versioned by generation: a row is visible while
+    gen_from <= document.chunk_generation < gen_to (missing bounds are open,
+    so chunks written before generations existed are always visible).
+    """
+    return {
+        "$and": [
+            {
+                "$or": [
+                    {"gen_from": {"$exists": False}},
+                    {"gen_from": {"$lte": generation}},
+                ]
+            },
+            {
+                "$or": [
+                    {"gen_to": {"$exists": False}},
+                    {"gen_to": {"$gt": generation}},
+                ]
+            },
+        ]
+    }
+
+
+def generations_filter(generations: dict[str, int]) -> dict:
+    """
+    Rows visible in each document's own generation ({document_id: generation}).
+    Documents are grouped by generation, so the $or stays short.
+    """
+    by_generation: dict[int, list[str]] = defaultdict(list)
+    for document_id, generation in generations.items():
+        by_generation[generation].append(document_id)
+    if not by_generation:
+        return {"_id": {"$in": []}}
+    return {
+        "$or": [
+            {"document_id": {"$in": document_ids}, **visible_filter(generation)}
+            for generation, document_ids in sorted(by_generation.items())
+        ]
+    }
+
+
+def is_visible(chunk: dict, generation: int) -> bool:
+    """In-memory counterpart of visible_filter."""
+    gen_from = chunk.get("gen_from")
+    gen_to = chunk.get("gen_to")
+    return (gen_from is None or gen_from <= generation) and (
+        gen_to is None or gen_to > generation
+    )
 
 
 def get_chunks_collection():
-    client = AsyncIOMotorClient(settings.mongo_url)
-    db = client.pagemate
-    return db.document_chunks
+    return connection.get_database().document_chunks
 
 
-async def count_chunks_by_document_id(document_id: str) -> int:
+async def count_chunks_by_document_id(
+    document_id: str, generation: int | None = None
+) -> int:
     col = get_chunks_collection()
-    return await col.count_documents({"document_id": document_id})
+    condition: dict = {"document_id": document_id}
+    if generation is not None:
+        condition.update(visible_filter(generation))
+    return await col.count_documents(condition)
+
+
+async def count_chunks_by_tenant_id(tenant_id: str) -> int:
+    col = get_chunks_collection()
+    return await col.count_documents({"tenant_id": tenant_id})
 
 
 async def list_document_chunks(
@@ -22,14 +101,21 @@ async def list_document_chunks(
     limit: int | None = None,
     *,
     tenant_id: str,
+    projection: dict | None = None,
+    generations: dict[str, int],
 ) -> list[dict]:
-    """Returns a list of chunks for the given document_id with pagination."""
+    """
+    Returns a list of chunks for the given document_id (or the whole tenant)
+    with pagination. Only the chunks visible in their document's published
+    generation (`generations`, see generations_filter) are returned.
+    """
     col = get_chunks_collection()
-    condition = {"tenant_id": tenant_id}
+    condition: dict = {"tenant_id": tenant_id}
     if document_id:
         condition["document_id"] = document_id
+    condition.update(generations_filter(generations))
 
-    cursor = col.find(condition).skip(offset)
+    cursor = col.find(condition, projection=projection).skip(offset)
 
     if limit is not None:
         cursor = cursor.limit(limit)
@@ -37,6 +123,67 @@ async def list_document_chunks(
     return await cursor.to_list()
 
 
+async def list_chunk_embeddings(
+    *,
+    tenant_id: str,
+    updated_after: datetime | None = None,
+    document_ids: list[str] | None = None,
+) -> list[dict]:
+    """Returns only the fields needed to index chunks (id, document, vector)."""
+    col = get_chunks_collection()
+    condition: dict = {"tenant_id": tenant_id}
+    if updated_after is not None:
+        condition["updated_at"] = {"$gte": updated_after}
+    if document_ids is not None:
+        condition["document_id"] = {"$in": document_ids}
+
+    cursor = col.find(condition, projection=VECTOR_PROJECTION)
+    return await cursor.to_list()
+
+
+async def list_chunks_by_ids(
+    chunk_ids: list[str],
+    *,
+    tenant_id: str,
+    projection: dict | None = None,
+) -> list[dict]:
+    """Returns the chunks for the given ids in a single query (order not preserved)."""
+    if not chunk_ids:
+        return []
+    col = get_chunks_collection()
+    cursor = col.find(
+        {"_id": {"$in": chunk_ids}, "tenant_id": tenant_id},
+        projection=projection,
+    )
+    return await cursor.to_list()
+
+
+async def count_content_hashes_by_document_id(
+    document_id: str, *, tenant_id: str
+) -> dict[str, dict[str, int]]:
+    """Returns {embedding_model: {content_hash: chunk count}} for the document's chunks."""
+    col = get_chunks_collection()
+    cursor = col.aggregate([
+        {
+            "$match": {
+                "document_id": document_id,
+                "tenant_id": tenant_id,
+                "content_hash": {"$exists": True},
+            }
+        },
+        {
+            "$group": {
+                "_id": {"model": "$embedding_model", "hash": "$content_hash"},
+                "n": {"$sum": 1},
+            }
+        },
+    ])
+    counts: dict[str, dict[str, int]] = {}
+    async for row in cursor:
+        counts.setdefault(row["_id"]["model"], {})[row["_id"]["hash"]] = row["n"]
+    return counts
+
+
 async def delete_chunks_by_document_id(document_id: str, *, tenant_id: str) -> bool:
     """Deletes all chunks for the given document_id and tenant_id and returns deletion success status."""
     col = get_chunks_collection()
@@ -0,0 +1,53 @@
+import asyncio
+import logging
+
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+
+from pagemate.settings import settings
+
+logger = logging.getLogger(__name__)
+
+_client: AsyncIOMotorClient | None = None
+
+
+def get_client() -> AsyncIOMotorClient:
+    """앱 전체에서 공유하는 Motor 클라이언트(커넥션 풀)를 반환합니다."""
+    global _client
+    if _client is None:
+        _client = AsyncIOMotorClient(
+            settings.mongo_url,
+            maxPoolSize=settings.mongo_max_pool_size,
+            minPoolSize=settings.mongo_min_pool_size,
+            maxIdleTimeMS=settings.mongo_max_idle_time_ms,
+            connectTimeoutMS=settings.mongo_connect_timeout_ms,
+            serverSelectionTimeoutMS=settings.mongo_server_selection_timeout_ms,
+            waitQueueTimeoutMS=settings.mongo_wait_queue_timeout_ms,
+        )
+    return _client
+
+
+def get_database() -> AsyncIOMotorDatabase:
+    """공유 클라이언트의 기본 데이터베이스를 반환합니다."""
+    return get_client()[settings.mongo_database]
+
+
+async def connect() -> None:
+    """클라이언트를 만들고 커넥션을 미리 열어둡니다 (startup warm-up)."""
+    database = get_database()
+    warm_up = max(1, settings.mongo_min_pool_size)
+    # Concurrent pings force the pool to open that many sockets up front
+    await asyncio.gather(*(database.command("ping") for _ in range(warm_up)))
+    logger.info(
+        "MongoDB connected: database=%s, warmed_up=%d, max_pool_size=%d",
+        settings.mongo_database,
+        warm_up,
+        settings.mongo_max_pool_size,
+    )
+
+
+def close() -> None:
+    """공유 클라이언트를 닫습니다 (shutdown)."""
+    global _client
+    if _client is not None:
+        _client.close()
+        _client = None
@@ -1,13 +1,11 @@
 from bson import ObjectId
-from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorCollection
+from motor.motor_asyncio import AsyncIOMotorCollection
 
-from pagemate.settings import settings
+from pagemate.clients.mongo import connection
 
 
 def get_document_collection() -> AsyncIOMotorCollection:
-    client = AsyncIOMotorClient(settings.mongo_url)
-    db = client.pagemate
-    return db.documents
+    return connection.get_database().documents
 
 
 async def list_documents(offset: int = 0, limit: int = 20) -> list[dict]:
@@ -22,11 +20,18 @@ async def list_documents(offset: int = 0, limit: int = 20) -> list[dict]:
 
 
 async def list_documents_by_tenant_id(
-    tenant_id: str, offset: int = 0, limit: int = 20
+    tenant_id: str, offset: int = 0, limit: int = 20, newest_first: bool = True
 ) -> list[dict]:
-    """모든 테넌트 정보를 리스트로 반환합니다."""
+    """테넌트의 문서를 created_at 순서로 정렬해 페이지 단위로 반환합니다."""
     collection = get_document_collection()
-    cursor = collection.find({"tenant_id": tenant_id}).skip(offset).limit(limit)
+    # Sorted in the query, so skip/limit page through the (tenant_id, created_at)
+    # index instead of sorting each page on its own
+    cursor = (
+        collection.find({"tenant_id": tenant_id})
+        .sort("created_at", -1 if newest_first else 1)
+        .skip(offset)
+        .limit(limit)
+    )
     documents = []
     async for doc in cursor:
         doc["_id"] = str(doc["_id"])
@@ -48,6 +53,23 @@ async def get_document_by_id(document_id: str, *, tenant_id: str) -> dict | None
     return doc
 
 
+async def get_chunk_generations(
+    tenant_id: str, document_ids: list[str] | None = None
+) -> dict[str, int]:
+    """문서별 현재 청크 세대(chunk_generation, 없으면 0)를 반환합니다."""
+    collection = get_document_collection()
+    condition: dict = {"tenant_id": tenant_id}
+    if document_ids is not None:
+        condition["_id"] = {
+            "$in": [ObjectId(x) for x in document_ids if ObjectId.is_valid(x)]
+        }
+    cursor = collection.find(condition, projection={"chunk_generation": 1})
+    return {
+        str(doc["_id"]): int(doc.get("chunk_generation") or 0)
+        async for doc in cursor
+    }
+
+
 async def create_document(document_data: dict, *, tenant_id: str) -> dict:
     """새로운 테넌트를 생성하고 생성된 테넌트 정보를 반환합니다."""
     document_data["tenant_id"] = tenant_id
@@ -0,0 +1,38 @@
+from datetime import datetime, timezone
+
+from bson import Binary
+from motor.motor_asyncio import AsyncIOMotorCollection
+
+from pagemate.clients.mongo import connection
+
+
+def get_embedding_cache_collection() -> AsyncIOMotorCollection:
+    return connection.get_database().query_embedding_cache
+
+
+async def ensure_indexes() -> None:
+    """만료된 캐시 항목을 MongoDB TTL 모니터가 지우도록 인덱스를 만듭니다."""
+    collection = get_embedding_cache_collection()
+    await collection.create_index("expires_at", expireAfterSeconds=0)
+
+
+async def get_embedding(key: str) -> bytes | None:
+    """주어진 key에 해당하는 (만료되지 않은) 임베딩 바이트를 반환합니다."""
+    collection = get_embedding_cache_collection()
+    doc = await collection.find_one(
+        {"_id": key, "expires_at": {"$gt": datetime.now(timezone.utc)}},
+        projection={"vector": 1},
+    )
+    if doc is None:
+        return None
+    return bytes(doc["vector"])
+
+
+async def set_embedding(key: str, vector: bytes, expires_at: datetime) -> None:
+    """주어진 key에 임베딩 바이트를 저장합니다."""
+    collection = get_embedding_cache_collection()
+    await collection.update_one(
+        {"_id": key},
+        {"$set": {"vector": Binary(vector), "expires_at": expires_at}},
+        upsert=True,
+    )
@@ -0,0 +1,25 @@
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import UpdateOne
+
+from pagemate.clients.mongo import connection
+
+
+def get_embedding_store_collection() -> AsyncIOMotorCollection:
+    """워커가 채우는 content-addressed 청크 임베딩 저장소 (apps/worker/embedding_store.py)."""
+    return connection.get_database().embedding_store
+
+
+async def release(model: str, counts: dict[str, int]) -> None:
+    """content_hash별 참조 수를 줄이고, 더 이상 참조되지 않는 항목을 삭제합니다."""
+    if not counts:
+        return
+    collection = get_embedding_store_collection()
+    keys = [f"{model}:{digest}" for digest in counts]
+    await collection.bulk_write(
+        [
+            UpdateOne({"_id": f"{model}:{digest}"}, {"$inc": {"refcount": -n}})
+            for digest, n in counts.items()
+        ],
+        ordered=False,
+    )
+    await collection.delete_many({"_id": {"$in": keys}, "refcount": {"$lte": 0}})
@@ -0,0 +1,45 @@
+from datetime import datetime, timezone
+
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import ReturnDocument
+
+from pagemate.clients.mongo import connection
+
+
+def get_file_object_collection() -> AsyncIOMotorCollection:
+    """content-addressed 파일 객체(_id = sha256)의 참조 수를 담는 컬렉션."""
+    return connection.get_database().file_objects
+
+
+async def acquire(sha256: str, size: int) -> int:
+    """파일 객체의 참조 수를 하나 늘리고 (없으면 만들고) 늘어난 참조 수를 반환합니다."""
+    now = datetime.now(timezone.utc)
+    result = await get_file_object_collection().find_one_and_update(
+        {"_id": sha256},
+        {
+            "$inc": {"refcount": 1},
+            "$set": {"last_used_at": now},
+            "$setOnInsert": {"size": size, "created_at": now},
+        },
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return int(result["refcount"])
+
+
+async def release(sha256: str) -> int:
+    """파일 객체의 참조 수를 하나 줄이고 남은 참조 수를 반환합니다 (항목이 없으면 0)."""
+    result = await get_file_object_collection().find_one_and_update(
+        {"_id": sha256},
+        {"$inc": {"refcount": -1}},
+        return_document=ReturnDocument.AFTER,
+    )
+    return int(result["refcount"]) if result else 0
+
+
+async def delete_if_unreferenced(sha256: str) -> bool:
+    """참조 수가 0 이하일 때만 항목을 삭제하고, 삭제했는지 여부를 반환합니다."""
+    result = await get_file_object_collection().delete_one(
+        {"_id": sha256, "refcount": {"$lte": 0}}
+    )
+    return result.deleted_count > 0
@@ -0,0 +1,214 @@
+import dataclasses
+import logging
+from datetime import datetime, timezone
+from typing import Any
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+from pagemate.clients.mongo import chunk, connection
+
+logger = logging.getLogger(__name__)
+
+# 컬렉션별로 필요한 인덱스 (워커도 같은 컬렉션을 조회합니다).
+# apps/worker/indexes.py의 INDEXES와 같은 내용으로 유지해야 합니다.
+INDEXES: dict[str, list[IndexModel]] = {
+    "documents": [
+        # 테넌트별 문서 목록 (created_at 정렬, skip/limit)
+        IndexModel(
+            [("tenant_id", ASCENDING), ("created_at", DESCENDING)],
+            name="tenant_id_created_at",
+        ),
+        # 워커의 작업 선점 (pending, 또는 lease가 만료된 processing)
+        IndexModel(
+            [("embedding_status", ASCENDING), ("lease_expires_at", ASCENDING)],
+            name="embedding_status_lease_expires_at",
+        ),
+        # 워커의 실패 문서 재시도 (requeue_one_failed)
+        IndexModel(
+            [
+                ("embedding_status", ASCENDING),
+                ("next_retry_at", ASCENDING),
+                ("attempts", ASCENDING),
+            ],
+            name="embedding_status_next_retry_at_attempts",
+        ),
+        # 선점한 문서를 claim_token으로 다시 읽기 (선점 중인 문서에만 있는 필드)
+        IndexModel([("claim_token", ASCENDING)], name="claim_token", sparse=True),
+    ],
+    "document_chunks": [
+        # 테넌트 단위 조회/개수와 인덱스 증분 동기화 (updated_at >= ...)
+        IndexModel(
+            [("tenant_id", ASCENDING), ("updated_at", ASCENDING)],
+            name="tenant_id_updated_at",
+        ),
+        # 문서 단위 조회/삭제와 워커의 세대 전환 (gen_from/gen_to)
+        IndexModel(
+            [
+                ("document_id", ASCENDING),
+                ("tenant_id", ASCENDING),
+                ("gen_from", ASCENDING),
+            ],
+            name="document_id_tenant_id_gen_from",
+        ),
+    ],
+    "tenants": [
+        IndexModel([("name", ASCENDING)], name="name"),
+    ],
+}
+
+
+@dataclasses.dataclass(frozen=True)
+class HotQuery:
+    """explain으로 실행 계획을 확인할 자주 실행되는 쿼리."""
+
+    name: str
+    collection: str
+    filter: dict
+    sort: list[tuple[str, int]] | None = None
+
+
+@dataclasses.dataclass(frozen=True)
+class QueryPlan:
+    query: HotQuery
+    stages: list[str]
+    index_names: list[str]
+
+    @property
+    def is_collscan(self) -> bool:
+        return "COLLSCAN" in self.stages
+
+
+def hot_queries() -> list[HotQuery]:
+    """API와 워커의 대표 쿼리들 (값은 실행 계획에만 쓰이는 예시입니다)."""
+    now = datetime.now(timezone.utc)
+    tenant_id = "explain-tenant"
+    document_id = "explain-document"
+    return [
+        HotQuery(
+            "documents.list_by_tenant",
+            "documents",
+            {"tenant_id": tenant_id},
+            [("created_at", DESCENDING)],
+        ),
+        HotQuery(
+            "documents.chunk_generations",
+            "documents",
+            {"tenant_id": tenant_id},
+        ),
+        HotQuery(
+            "worker.claim",
+            "documents",
+            {
+                "$or": [
+                    {"embedding_status": "pending"},
+                    {
+                        "embedding_status": "processing",
+                        "lease_expires_at": {"$lte": now},
+                    },
+                ]
+            },
+        ),
+        HotQuery(
+            "worker.claimed_by_token",
+            "documents",
+            {"claim_token": "explain-token"},
+        ),
+        HotQuery(
+            "worker.requeue_failed",
+            "documents",
+            {
+                "embedding_status": "failed",
+                "$and": [
+                    {
+                        "$or": [
+                            {"attempts": {"$exists": False}},
+                            {"attempts": {"$lt": 5}},
+                        ]
+                    },
+                    {
+                        "$or": [
+                            {"next_retry_at": {"$exists": False}},
+                            {"next_retry_at": {"$lte": now}},
+                        ]
+                    },
+                ],
+            },
+        ),
+        HotQuery(
+            "chunks.list_by_document",
+            "document_chunks",
+            {
+                "tenant_id": tenant_id,
+                "document_id": document_id,
+                **chunk.generations_filter({document_id: 1}),
+            },
+        ),
+        HotQuery(
+            "chunks.count_by_tenant",
+            "document_chunks",
+            {"tenant_id": tenant_id},
+        ),
+        HotQuery(
+            "chunks.embeddings_updated_after",
+            "document_chunks",
+            {"tenant_id": tenant_id, "updated_at": {"$gte": now}},
+        ),
+        HotQuery(
+            "worker.rollback_unpublished",
+            "document_chunks",
+            {"document_id": document_id, "gen_from": {"$gt": 0}},
+        ),
+        HotQuery(
+            "tenants.by_name",
+            "tenants",
+            {"name": "explain-tenant"},
+        ),
+    ]
+
+
+async def ensure_indexes() -> dict[str, list[str]]:
+    """선언된 인덱스를 만들고 (이미 있으면 그대로 둡니다) 컬렉션별 이름을 반환합니다.
+
+    같은 이름에 다른 정의의 인덱스가 있으면 OperationFailure가 발생합니다.
+    """
+    database = connection.get_database()
+    created: dict[str, list[str]] = {}
+    for name, models in INDEXES.items():
+        created[name] = await database[name].create_indexes(models)
+        logger.info("Ensured indexes on %s: %s", name, ", ".join(created[name]))
+    return created
+
+
+async def explain(query: HotQuery) -> QueryPlan:
+    """쿼리의 winning plan에 포함된 stage와 사용된 인덱스를 조회합니다."""
+    cursor = connection.get_database()[query.collection].find(query.filter)
+    if query.sort:
+        cursor = cursor.sort(query.sort)
+    result = await cursor.explain()
+    winning_plan = result.get("queryPlanner", {}).get("winningPlan", {})
+    stages: list[str] = []
+    index_names: list[str] = []
+    _walk_plan(winning_plan, stages, index_names)
+    return QueryPlan(query=query, stages=stages, index_names=index_names)
+
+
+async def explain_hot_queries() -> list[QueryPlan]:
+    """모든 hot query의 실행 계획을 반환합니다 (COLLSCAN 여부는 is_collscan)."""
+    return [await explain(query) for query in hot_queries()]
+
+
+def _walk_plan(stage: Any, stages: list[str], index_names: list[str]) -> None:
+    if isinstance(stage, list):
+        for child in stage:
+            _walk_plan(child, stages, index_names)
+        return
+    if not isinstance(stage, dict):
+        return
+    if "stage" in stage:
+        stages.append(stage["stage"])
+    if "indexName" in stage:
+        index_names.append(stage["indexName"])
+    # Slot-based (SBE) plans wrap the classic tree in queryPlan
+    for key in ("queryPlan", "inputStage", "inputStages"):
+        if key in stage:
+            _walk_plan(stage[key], stages, index_names)
@@ -1,13 +1,11 @@
 from bson import ObjectId
-from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorCollection
+from motor.motor_asyncio import AsyncIOMotorCollection
 
-from pagemate.settings import settings
+from pagemate.clients.mongo import connection
 
 
 def get_tenant_collection() -> AsyncIOMotorCollection:
-    client = AsyncIOMotorClient(settings.mongo_url)
-    db = client.pagemate
-    return db.tenants
+    return connection.get_database().tenants
 
 
 async def list_tenants(offset: int = 0, limit: int = 20) -> list[dict]:
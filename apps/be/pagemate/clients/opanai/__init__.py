@@ -1,18 +1,67 @@
 import asyncio
 from typing import Literal
 
-from openai import OpenAI
+import httpx
+from openai import AsyncOpenAI
 
 from pagemate.settings import settings
 
-client = OpenAI(
-    api_key=settings.upstage_embedding_api_key,
-    base_url=settings.upstage_embedding_base_url,
-)
+# One connection pool shared by every Upstage (OpenAI-compatible) client.
+# Built on first use and rebuilt after close(), so a second lifespan in the
+# same process (reload, test client reuse) never sees a closed transport.
+_http_client: httpx.AsyncClient | None = None
+_client: AsyncOpenAI | None = None
+_completion_client: AsyncOpenAI | None = None
+
+# Caps in-flight upstream calls (retries with backoff happen inside a slot)
+embedding_semaphore = asyncio.Semaphore(settings.upstage_embedding_max_concurrency)
+completion_semaphore = asyncio.Semaphore(settings.upstage_completion_max_concurrency)
+
+
+def get_http_client() -> httpx.AsyncClient:
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.upstage_max_connections,
+                max_keepalive_connections=settings.upstage_max_keepalive_connections,
+            ),
+        )
+    return _http_client
+
+
+def get_client() -> AsyncOpenAI:
+    """Embedding client on the shared connection pool."""
+    global _client
+    if _client is None:
+        _client = AsyncOpenAI(
+            api_key=settings.upstage_embedding_api_key,
+            base_url=settings.upstage_embedding_base_url,
+            timeout=settings.upstage_embedding_timeout_seconds,
+            max_retries=settings.upstage_max_retries,
+            http_client=get_http_client(),
+        )
+    return _client
+
+
+def get_completion_client() -> AsyncOpenAI:
+    """Chat completion client on the shared connection pool."""
+    global _completion_client
+    if _completion_client is None:
+        _completion_client = AsyncOpenAI(
+            api_key=settings.upstage_completion_api_key,
+            base_url=settings.upstage_completion_base_url,
+            timeout=settings.upstage_completion_timeout_seconds,
+            max_retries=settings.upstage_max_retries,
+            http_client=get_http_client(),
+        )
+    return _completion_client
 
 
 async def get_embedding(
-    query: str, embedding_type: Literal["query", "document"]
+    query: str,
+    embedding_type: Literal["query", "document"],
+    timeout: float | None = None,
 ) -> list[float]:
     if embedding_type == "query":
         embedding_model = settings.query_embedding_model
@@ -21,12 +70,24 @@ async def get_embedding(
     else:
         raise ValueError(f"Unsupported embedding_type: {embedding_type}")
 
-    loop = asyncio.get_running_loop()
-    resp = await loop.run_in_executor(
-        None,
-        lambda: client.embeddings.create(
+    async with embedding_semaphore:
+        resp = await get_client().embeddings.create(
             model=embedding_model,
             input=query,
-        ),
-    )
+            timeout=timeout or settings.upstage_embedding_timeout_seconds,
+        )
     return resp.data[0].embedding
+
+
+async def close() -> None:
+    global _http_client, _client, _completion_client
+    global embedding_semaphore, completion_semaphore
+    http_client = _http_client
+    _http_client = _client = _completion_client = None
+    # Semaphores bind to the running loop; the next lifespan may run another
+    embedding_semaphore = asyncio.Semaphore(settings.upstage_embedding_max_concurrency)
+    completion_semaphore = asyncio.Semaphore(
+        settings.upstage_completion_max_concurrency
+    )
+    if http_client is not None:
+        await http_client.aclose()
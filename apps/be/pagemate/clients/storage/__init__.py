@@ -1,8 +1,39 @@
+import os
 import pathlib
 
 import aiofiles
 import aiofiles.os
 
+from pagemate.clients.storage.backend import (
+    FileTooLargeError,
+    LocalStorageBackend,
+    ObjectStat,
+    StagedObject,
+    StorageBackend,
+)
+from pagemate.settings import settings
+
+__all__ = [
+    "FileTooLargeError",
+    "LocalStorageBackend",
+    "ObjectStat",
+    "StagedObject",
+    "StorageBackend",
+    "get_backend",
+]
+
+_backend: StorageBackend | None = None
+
+
+def get_backend() -> StorageBackend:
+    """앱 전체에서 공유하는 객체 저장소 백엔드를 반환합니다."""
+    global _backend
+    if _backend is None:
+        if settings.storage_backend != "local":
+            raise ValueError(f"Unsupported storage backend: {settings.storage_backend}")
+        _backend = LocalStorageBackend(settings.file_storage_base_path)
+    return _backend
+
 
 async def is_exists(path: pathlib.Path) -> bool:
     """주어진 경로의 path에 파일이 존재하는지 확인합니다."""
@@ -17,6 +48,11 @@ async def save_file(path: pathlib.Path, data: bytes) -> int:
     return len(data)
 
 
+async def stat_file(path: pathlib.Path) -> os.stat_result:
+    """주어진 경로의 path에 있는 파일의 크기, 수정 시각 등을 조회합니다."""
+    return await aiofiles.os.stat(path)
+
+
 async def read_file(path: str | pathlib.Path) -> bytes:
     """주어진 경로의 path에서 데이터를 읽어옵니다."""
     path = pathlib.Path(path) if isinstance(path, str) else path
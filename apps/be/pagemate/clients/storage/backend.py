@@ -0,0 +1,157 @@
+import abc
+import dataclasses
+import hashlib
+import pathlib
+import uuid
+from typing import AsyncIterable
+
+import aiofiles
+import aiofiles.os
+
+
+class FileTooLargeError(ValueError):
+    def __init__(self, max_size: int):
+        super().__init__(f"File exceeds the maximum size of {max_size} bytes")
+        self.max_size = max_size
+
+
+@dataclasses.dataclass(frozen=True)
+class StagedObject:
+    """기록은 끝났지만 아직 key로 공개되지 않은 객체."""
+
+    token: str
+    size: int
+    sha256: str
+
+
+@dataclasses.dataclass(frozen=True)
+class ObjectStat:
+    size: int
+    mtime: float
+
+
+class StorageBackend(abc.ABC):
+    """key(예: objects/ab/cd/<sha256>)로 주소를 매기는 객체 저장소.
+
+    파일 시스템 경로 대신 key를 다루므로 로컬 디스크 외에 S3 호환 구현을 붙일 수
+    있습니다. publish와 move는 대상 key를 원자적으로 덮어써야 합니다 (읽는 쪽은
+    이전 객체나 새 객체 중 하나만 봅니다).
+    """
+
+    @abc.abstractmethod
+    async def write_staged(
+        self, chunks: AsyncIterable[bytes], max_size: int | None = None
+    ) -> StagedObject:
+        """스트림을 임시 객체로 기록하면서 크기와 sha256을 계산합니다.
+
+        max_size를 넘으면 임시 객체를 지우고 FileTooLargeError를 발생시킵니다.
+        """
+
+    @abc.abstractmethod
+    async def publish(self, staged: StagedObject, key: str) -> None:
+        """임시 객체를 key로 공개합니다 (같은 key가 있으면 덮어씁니다)."""
+
+    @abc.abstractmethod
+    async def discard(self, staged: StagedObject) -> None:
+        """공개하지 않을 임시 객체를 지웁니다."""
+
+    @abc.abstractmethod
+    async def exists(self, key: str) -> bool:
+        """key에 객체가 있는지 확인합니다."""
+
+    @abc.abstractmethod
+    async def stat(self, key: str) -> ObjectStat:
+        """객체의 크기와 수정 시각을 조회합니다. 없으면 FileNotFoundError."""
+
+    @abc.abstractmethod
+    async def read(self, key: str) -> bytes:
+        """객체 전체를 읽어옵니다. 없으면 FileNotFoundError."""
+
+    @abc.abstractmethod
+    async def move(self, src: str, dst: str) -> bool:
+        """src 객체를 dst로 옮깁니다. src가 없으면 False를 반환합니다."""
+
+    @abc.abstractmethod
+    async def delete(self, key: str) -> None:
+        """객체를 삭제합니다 (없으면 아무 일도 하지 않습니다)."""
+
+    def local_path(self, key: str) -> pathlib.Path | None:
+        """객체를 로컬 파일로 읽을 수 있으면 그 경로를 (sendfile 등), 아니면 None."""
+        return None
+
+
+class LocalStorageBackend(StorageBackend):
+    """root 아래 디렉터리에 객체를 파일로 저장하는 백엔드.
+
+    임시 객체는 root/tmp에 쓰고 rename으로 공개하므로 (같은 파일 시스템)
+    공개와 이동이 원자적입니다.
+    """
+
+    def __init__(self, root: pathlib.Path):
+        self.root = root
+        self.tmp_dir = root / "tmp"
+
+    def local_path(self, key: str) -> pathlib.Path:
+        path = (self.root / key).resolve()
+        if not path.is_relative_to(self.root.resolve()):
+            raise ValueError(f"Invalid object key: {key}")
+        return path
+
+    async def write_staged(
+        self, chunks: AsyncIterable[bytes], max_size: int | None = None
+    ) -> StagedObject:
+        await aiofiles.os.makedirs(self.tmp_dir, exist_ok=True)
+        token = f"{uuid.uuid4().hex}.part"
+        tmp_path = self.tmp_dir / token
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            async with aiofiles.open(tmp_path, "wb") as f:
+                async for chunk in chunks:
+                    size += len(chunk)
+                    if max_size is not None and size > max_size:
+                        raise FileTooLargeError(max_size)
+                    digest.update(chunk)
+                    await f.write(chunk)
+        except BaseException:
+            await self._remove(tmp_path)
+            raise
+        return StagedObject(token=token, size=size, sha256=digest.hexdigest())
+
+    async def publish(self, staged: StagedObject, key: str) -> None:
+        path = self.local_path(key)
+        await aiofiles.os.makedirs(path.parent, exist_ok=True)
+        await aiofiles.os.replace(self.tmp_dir / staged.token, path)
+
+    async def discard(self, staged: StagedObject) -> None:
+        await self._remove(self.tmp_dir / staged.token)
+
+    async def exists(self, key: str) -> bool:
+        return await aiofiles.os.path.isfile(self.local_path(key))
+
+    async def stat(self, key: str) -> ObjectStat:
+        result = await aiofiles.os.stat(self.local_path(key))
+        return ObjectStat(size=result.st_size, mtime=result.st_mtime)
+
+    async def read(self, key: str) -> bytes:
+        async with aiofiles.open(self.local_path(key), "rb") as f:
+            return await f.read()
+
+    async def move(self, src: str, dst: str) -> bool:
+        dst_path = self.local_path(dst)
+        await aiofiles.os.makedirs(dst_path.parent, exist_ok=True)
+        try:
+            await aiofiles.os.replace(self.local_path(src), dst_path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    async def delete(self, key: str) -> None:
+        await self._remove(self.local_path(key))
+
+    @staticmethod
+    async def _remove(path: pathlib.Path) -> None:
+        try:
+            await aiofiles.os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -1,3 +1,4 @@
+from pagemate.routers import chat
 from pagemate.routers import document
 from pagemate.routers import index
 from pagemate.routers import retrieval
@@ -10,4 +11,5 @@ __all__ = [
     "document",
     "retrieval",
     "upstage",
+    "chat",
 ]
@@ -0,0 +1,123 @@
+import asyncio
+import time
+from typing import List, Literal
+
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel, Field
+from starlette.responses import JSONResponse, StreamingResponse
+
+from pagemate.routers.upstage import Message
+from pagemate.services import (
+    document_service,
+    embedding_service,
+    index_service,
+    rag_service,
+    upstage_service,
+)
+from pagemate.settings import settings
+from pagemate.tools import sse
+
+router = APIRouter(prefix="/tenants/{tenant_id}", tags=["chat"])
+
+
+class RagChatRequest(BaseModel):
+    messages: List[Message] = Field(..., min_length=1)
+    stream: bool = True
+    limit: int | None = Field(None, ge=1, description="Chunks to retrieve")
+    document_id: str | None = None
+    mode: Literal["exact", "ann"] | None = None
+
+
+def _server_timing(timings: dict[str, float]) -> str:
+    return ", ".join(f"{name};dur={ms:.1f}" for name, ms in timings.items())
+
+
+def _sources(chunks) -> list[dict]:
+    return [
+        {"index": i + 1, "id": chunk.id, "document_id": chunk.document_id}
+        for i, chunk in enumerate(chunks)
+    ]
+
+
+@router.post("/chat/completions")
+async def rag_chat_completions(tenant_id: str, request: RagChatRequest):
+    """
+    Retrieval-augmented chat in one round trip.
+    Embeds the last user turn, retrieves the top chunks from the tenant index,
+    packs them into the prompt and completes (SSE when `stream` is true: a
+    `sources` event, then `data: {"content": ...}` deltas and `data: [DONE]`).
+    Stage durations are reported in the `Server-Timing` header.
+    """
+    query = next(
+        (msg.content for msg in reversed(request.messages) if msg.role == "user"),
+        None,
+    )
+    if not query:
+        raise HTTPException(status_code=422, detail="No user message to answer")
+
+    timings: dict[str, float] = {}
+    started = time.perf_counter()
+
+    # Kick off the embedding first; index sync and prompt setup overlap it
+    embedding_task = asyncio.create_task(
+        embedding_service.get_embedding(query, embedding_type="query")
+    )
+    index_task = asyncio.create_task(index_service.get_index(tenant_id))
+    history = [{"role": msg.role, "content": msg.content} for msg in request.messages]
+
+    try:
+        query_embedding = await embedding_task
+        timings["embed"] = (time.perf_counter() - started) * 1000
+        await index_task
+    except BaseException:
+        embedding_task.cancel()
+        index_task.cancel()
+        raise
+
+    t0 = time.perf_counter()
+    chunk_ids, _ = await index_service.search(
+        tenant_id,
+        query_embedding,
+        limit=request.limit or settings.rag_top_k,
+        document_id=request.document_id,
+        mode=request.mode,
+    )
+    chunks = await document_service.list_document_chunks_by_ids(
+        chunk_ids, tenant_id=tenant_id
+    )
+    timings["retrieve"] = (time.perf_counter() - t0) * 1000
+
+    t0 = time.perf_counter()
+    context, used = rag_service.build_context(chunks, settings.rag_context_max_chars)
+    messages = rag_service.build_messages(history, context)
+    sources = _sources(used)
+    timings["prompt"] = (time.perf_counter() - t0) * 1000
+
+    try:
+        if request.stream:
+            t0 = time.perf_counter()
+            deltas = upstage_service.stream_chat(messages)
+            first = await sse.prime(deltas)
+            timings["ttft"] = (time.perf_counter() - t0) * 1000
+            timings["total"] = (time.perf_counter() - started) * 1000
+            return StreamingResponse(
+                sse.stream_events(
+                    first,
+                    deltas,
+                    preamble=[sse.format_event(sources, event="sources")],
+                ),
+                media_type="text/event-stream",
+                headers={**sse.HEADERS, "Server-Timing": _server_timing(timings)},
+            )
+
+        t0 = time.perf_counter()
+        content = await upstage_service.complete_chat(messages)
+        timings["completion"] = (time.perf_counter() - t0) * 1000
+        timings["total"] = (time.perf_counter() - started) * 1000
+        return JSONResponse(
+            {"content": content, "sources": sources},
+            headers={"Server-Timing": _server_timing(timings)},
+        )
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,8 +1,9 @@
 from typing import Literal
 
-from fastapi import APIRouter, HTTPException, UploadFile, File
-from fastapi.responses import Response
+from fastapi import APIRouter, HTTPException, Request, UploadFile, File
+from fastapi.responses import FileResponse
 
+from pagemate.tools import conditional
 from pagemate.schema import DocumentChunk
 from pagemate.schema.document import Document, DocumentStatus
 from pagemate.services import document_service, storage_service
@@ -18,43 +19,41 @@ async def list_documents(
     sort: Literal["latest-first", "oldest-first"] = "latest-first",
 ):
     """List documents for a tenant with pagination."""
-    documents = await document_service.list_documents_by_tenant_id(
-        tenant_id=tenant_id, offset=offset, limit=limit
-    )
-
-    if sort == "latest-first":
-        documents.sort(key=lambda doc: doc.created_at, reverse=True)
-    elif sort == "oldest-first":
-        documents.sort(key=lambda doc: doc.created_at)
-    else:
+    if sort not in ("latest-first", "oldest-first"):
         raise HTTPException(status_code=400, detail="Invalid sort option")
 
-    return documents
+    return await document_service.list_documents_by_tenant_id(
+        tenant_id=tenant_id,
+        offset=offset,
+        limit=limit,
+        newest_first=sort == "latest-first",
+    )
 
 
 @router.post("/", response_model=Document, status_code=201)
 async def create_document(tenant_id: str, file: UploadFile = File(...)):
     """Create a new document by uploading a file."""
-    # Read file content
-    content: bytes = await file.read()
-
     # Validate file extension
     if not file.filename.endswith((".txt", ".pdf", ".md")):
         raise HTTPException(
             status_code=400, detail="Only .txt, .md, or .pdf files are supported"
         )
 
-    # Save file to storage and get path and size
+    # Stream the upload to storage (constant memory), hashing it on the way
     file_ext = file.filename.split(".")[-1]
-    object_path, file_size = await storage_service.save_file(
-        content, extension=file_ext
-    )
+    try:
+        object_path, file_size, sha256 = await storage_service.save_upload(
+            file, extension=file_ext
+        )
+    except storage_service.FileTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
 
     # Create document record (embedding_status is set to pending in service)
     document = await document_service.create_document(
         name=file.filename or "untitled",
         object_path=str(object_path),
         size=file_size,
+        sha256=sha256,
         tenant_id=tenant_id,
     )
 
@@ -84,15 +83,23 @@ async def get_document_status(tenant_id: str, document_id: str):
 
 
 @router.get("/{document_id}/attachment")
-async def get_document_attachment(tenant_id: str, document_id: str):
-    """Get the attachment (file content) of a document by ID."""
+async def get_document_attachment(tenant_id: str, document_id: str, request: Request):
+    """
+    Get the attachment (file content) of a document by ID.
+
+    Streamed from disk (sendfile-style `pathsend` where the server supports
+    it) with Range support, and 304 for a cached copy that is still current.
+    """
     document = await document_service.get_document_by_id(
         document_id=document_id, tenant_id=tenant_id
     )
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
 
-    file_content = await storage_service.read_file(document.object_path)
+    try:
+        stat_result = await storage_service.stat_file(document.object_path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Attachment not found")
 
     # Determine media type based on file extension
     if document.name.endswith(".pdf"):
@@ -104,11 +111,23 @@ async def get_document_attachment(tenant_id: str, document_id: str):
     else:
         media_type = "application/octet-stream"
 
-    return Response(
-        content=file_content,
+    # Uploaded files never change in place, so their content hash is a
+    # strong validator; older documents fall back to mtime + size
+    headers = {"Cache-Control": "private, no-cache"}
+    if document.sha256:
+        headers["ETag"] = f'"{document.sha256}"'
+
+    response = FileResponse(
+        document.object_path,
         media_type=media_type,
-        headers={"Content-Disposition": f'inline; filename="{document.name}"'},
+        headers=headers,
+        filename=document.name,
+        content_disposition_type="inline",
+        stat_result=stat_result,
     )
+    if conditional.is_not_modified(request.headers, response.headers):
+        return conditional.not_modified(response)
+    return response
 
 
 @router.delete("/{document_id}", status_code=204)
@@ -1,6 +1,8 @@
 from fastapi import APIRouter
 from starlette.responses import HTMLResponse
 
+from pagemate.services import embedding_service
+
 router = APIRouter()
 
 
@@ -10,3 +12,11 @@ async def index():
     return """
     <a href="/scalar">Go to API Documentation</a>
     """
+
+
+@router.get("/stats", include_in_schema=False)
+async def stats():
+    """Runtime counters (cache hit/miss/eviction)."""
+    return {
+        "embedding_cache": embedding_service.cache_stats(),
+    }
@@ -1,7 +1,9 @@
+from typing import Literal
+
 from fastapi import Query, APIRouter
 
 from pagemate.schema import DocumentChunk
-from pagemate.services import embedding_service, document_service
+from pagemate.services import embedding_service, document_service, index_service
 
 router = APIRouter(prefix="/tenants/{tenant_id}", tags=["retrieval"])
 
@@ -16,29 +18,35 @@ async def retrieval(
     query: str = Query(..., description="Query text to embed and search"),
     limit: int = Query(10, description="Number of results"),
     document_id: str | None = Query(None, description="Filter by document_id"),
+    mode: Literal["exact", "ann"] | None = Query(
+        None, description="Search mode (default: per-tenant setting)"
+    ),
+    nprobe: int | None = Query(
+        None, ge=1, description="ANN lists to probe (higher: better recall, slower)"
+    ),
 ):
     """
     Semantic search over document_chunks (cosine_similarity)
-    Not ANN, Exact Nearest Neighbor Search...
+    Exact Nearest Neighbor Search over the tenant's resident index, or
+    approximate (IVF) search with `mode=ann`.
     """
 
     query_embedding = await embedding_service.get_embedding(
         query, embedding_type="query"
     )
-    candidate_chunks = await document_service.list_document_chunks(
+    # Phase one: ids + vectors only, served from the resident index
+    chunk_ids, _ = await index_service.search(
+        tenant_id,
+        query_embedding,
+        limit=limit,
         document_id=document_id,
-        offset=0,
-        tenant_id=tenant_id,
+        mode=mode,
+        nprobe=nprobe,
     )
 
-    retrived_chunks = await embedding_service.list_exact_nearest_neighbors(
-        query_embedding=query_embedding,
-        candidate_chunks=candidate_chunks,
-        metric="cosine",
-        limit=limit,
+    # Phase two: hydrate only the winners, without their vectors
+    retrived_chunks = await document_service.list_document_chunks_by_ids(
+        chunk_ids, tenant_id=tenant_id
     )
 
-    for chunk in retrived_chunks:
-        chunk.embedding = []
-
     return retrived_chunks
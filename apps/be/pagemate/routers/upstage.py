@@ -1,12 +1,12 @@
 from typing import List, Literal
 
-import openai
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-from starlette.responses import PlainTextResponse
+from starlette.responses import PlainTextResponse, StreamingResponse
 
 from pagemate.services import upstage_service
 from pagemate.settings import settings
+from pagemate.tools import sse
 
 router = APIRouter(prefix="/upstage", tags=["upstage"])
 
@@ -17,11 +17,17 @@ class Message(BaseModel):
 
 class ChatCompletionRequest(BaseModel):
     messages: List[Message]
+    stream: bool = False
+
 
 
 @router.post("/v1/chat/completions", response_class=PlainTextResponse)
 async def upstage_chat_completions(request: ChatCompletionRequest):
-    """Proxy for Upstage chat completions endpoint."""
+    """
+    Proxy for Upstage chat completions endpoint.
+    With `stream: true` the completion is streamed as Server-Sent Events
+    (`data: {"content": ...}` per delta, then `data: [DONE]`).
+    """
     try:
         messages = []
 
@@ -32,6 +38,15 @@ async def upstage_chat_completions(request: ChatCompletionRequest):
             [{"role": msg.role, "content": msg.content} for msg in request.messages]
         )
 
+        if request.stream:
+            deltas = upstage_service.stream_chat(messages)
+            first = await sse.prime(deltas)
+            return StreamingResponse(
+                sse.stream_events(first, deltas),
+                media_type="text/event-stream",
+                headers=sse.HEADERS,
+            )
+
         content = await upstage_service.complete_chat(messages)
 
         return content
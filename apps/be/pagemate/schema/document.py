@@ -18,6 +18,7 @@ class Document(BaseModel):
     name: str = Field(..., description="Document name")
     object_path: str = Field(..., description="Object storage path")
     size: int = Field(..., description="Document size in bytes")
+    sha256: Optional[str] = Field(None, description="SHA-256 of the file content")
     created_at: datetime = Field(
         default_factory=lambda: datetime.now(timezone.utc),
         description="Creation timestamp",
@@ -62,7 +63,10 @@ class DocumentChunk(BaseModel):
     index: int = Field(..., description="Chunk index in document (0-based)")
 
     text: str = Field(..., description="Chunk text content")
-    embedding: List[float] = Field(..., description="Dense vector embedding")
+    embedding: List[float] = Field(
+        default_factory=list,
+        description="Dense vector embedding (empty when not requested)",
+    )
 
     # Minimal pointer to help extract relevant portions
     char_start: Optional[int] = Field(
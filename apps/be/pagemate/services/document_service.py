@@ -1,9 +1,13 @@
+import logging
 from datetime import datetime, timezone
 from typing import Any, Optional
 
-from pagemate import clients
+from pagemate import clients, tools
+from pagemate.services import index_service, storage_service
 from pagemate.schema.document import Document, DocumentStatus, DocumentChunk
 
+logger = logging.getLogger(__name__)
+
 
 async def list_documents(offset: int = 0, limit: int = 20) -> list[Document]:
     """Returns a list of all documents with pagination."""
@@ -14,13 +18,14 @@ async def list_documents(offset: int = 0, limit: int = 20) -> list[Document]:
 
 
 async def list_documents_by_tenant_id(
-    tenant_id: str, offset: int = 0, limit: int = 20
+    tenant_id: str, offset: int = 0, limit: int = 20, newest_first: bool = True
 ) -> list[Document]:
-    """Returns a list of documents for the given tenant_id with pagination."""
+    """Returns a page of documents for the given tenant_id, ordered by created_at."""
     documents_data = await clients.mongo.document.list_documents_by_tenant_id(
         tenant_id=tenant_id,
         offset=offset,
         limit=limit,
+        newest_first=newest_first,
     )
     return [Document(**data) for data in documents_data]
 
@@ -47,7 +52,7 @@ async def get_document_status(
     # Count chunks
     try:
         chunks_count = await clients.mongo.chunk.count_chunks_by_document_id(
-            document_id
+            document_id, generation=int(document_data.get("chunk_generation") or 0)
         )
     except Exception:
         chunks_count = 0
@@ -61,6 +66,7 @@ async def create_document(
     size: int,
     *,
     tenant_id: str,
+    sha256: str | None = None,
 ) -> Document:
     """Creates a new document and returns the Document model."""
     now = datetime.now(timezone.utc)
@@ -68,6 +74,7 @@ async def create_document(
         "name": name,
         "object_path": object_path,
         "size": size,
+        "sha256": sha256,
         "created_at": now,
         "updated_at": now,
         "embedding_status": "pending",
@@ -103,17 +110,37 @@ async def update_document(
 
 async def delete_document(document_id: str, *, tenant_id: str) -> bool:
     """Deletes the document for the given document_id and tenant_id and returns deletion success status."""
+    document_data = await clients.mongo.document.get_document_by_id(
+        document_id=document_id, tenant_id=tenant_id
+    )
+    if document_data is None:
+        return False
+
+    # Shared chunk embeddings are reference-counted by content hash
+    refs = await clients.mongo.chunk.count_content_hashes_by_document_id(
+        document_id=document_id,
+        tenant_id=tenant_id,
+    )
+
     # First delete all chunks associated with this document
     await clients.mongo.chunk.delete_chunks_by_document_id(
         document_id=document_id,
         tenant_id=tenant_id,
     )
+    for model, counts in refs.items():
+        await clients.mongo.embedding_store.release(model, counts)
     
+    index_service.evict_document(tenant_id=tenant_id, document_id=document_id)
+
     # Then delete the document itself
-    return await clients.mongo.document.delete_document(
+    deleted = await clients.mongo.document.delete_document(
         document_id=document_id,
         tenant_id=tenant_id,
     )
+    if deleted:
+        # Drops this document's reference to its (possibly shared) file
+        await storage_service.remove_file(document_data["object_path"])
+    return deleted
 
 
 async def list_document_chunks(
@@ -122,12 +149,47 @@ async def list_document_chunks(
     limit: int | None = None,
     *,
     tenant_id: str,
+    with_embedding: bool = True,
 ) -> list[DocumentChunk]:
     """Returns a list of chunks for the given document_id with pagination."""
+    # Only the chunk set of each document's published generation
+    if document_id:
+        generations = await clients.mongo.document.get_chunk_generations(
+            tenant_id, [document_id]
+        )
+        generations.setdefault(document_id, 0)
+    else:
+        generations = await clients.mongo.document.get_chunk_generations(tenant_id)
     chunks_data = await clients.mongo.chunk.list_document_chunks(
         document_id=document_id,
         offset=offset,
         limit=limit,
         tenant_id=tenant_id,
+        projection=None if with_embedding else clients.mongo.chunk.CONTENT_PROJECTION,
+        generations=generations,
+    )
+    return [_to_document_chunk(data) for data in chunks_data]
+
+
+async def list_document_chunks_by_ids(
+    chunk_ids: list[str], *, tenant_id: str, with_embedding: bool = False
+) -> list[DocumentChunk]:
+    """Returns the chunks for the given ids, in the order of chunk_ids."""
+    chunks_data = await clients.mongo.chunk.list_chunks_by_ids(
+        chunk_ids,
+        tenant_id=tenant_id,
+        projection=None if with_embedding else clients.mongo.chunk.CONTENT_PROJECTION,
     )
-    return [DocumentChunk(**data) for data in chunks_data]
+    by_id = {str(data["_id"]): data for data in chunks_data}
+    return [_to_document_chunk(by_id[x]) for x in chunk_ids if x in by_id]
+
+
+def _to_document_chunk(data: dict) -> DocumentChunk:
+    """Builds a DocumentChunk, decoding packed (schema_version 2) embeddings."""
+    try:
+        embedding = tools.vector.decode_embedding(data)
+    except (ValueError, TypeError) as e:
+        logger.warning("Chunk %s has a bad embedding: %s", data.get("_id"), e)
+        embedding = None
+    data["embedding"] = embedding.tolist() if embedding is not None else []
+    return DocumentChunk(**data)
@@ -1,28 +1,155 @@
+import asyncio
+import hashlib
+import logging
+from datetime import datetime, timedelta, timezone
 from typing import Literal
 
 import numpy as np
 
 from pagemate import clients, tools
 from pagemate.schema import DocumentChunk
+from pagemate.settings import settings
+from pagemate.tools.cache import LRUCache, VectorCacheBackend
 
+logger = logging.getLogger(__name__)
 
-async def get_embedding(
-    query: str, embedding_type: Literal["query", "document"]
+
+class MongoVectorCacheBackend(VectorCacheBackend):
+    """Shares cached embeddings across API replicas through MongoDB."""
+
+    async def get(self, key: str) -> np.ndarray | None:
+        data = await clients.mongo.embedding_cache.get_embedding(key)
+        if data is None:
+            return None
+        return np.frombuffer(data, dtype=np.float32)
+
+    async def set(self, key: str, value: np.ndarray, ttl_seconds: float) -> None:
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=ttl_seconds)
+        await clients.mongo.embedding_cache.set_embedding(
+            key, value.astype(np.float32).tobytes(), expires_at
+        )
+
+
+embedding_cache = LRUCache(
+    max_size=settings.embedding_cache_max_size,
+    ttl_seconds=settings.embedding_cache_ttl_seconds,
+)
+shared_embedding_cache: VectorCacheBackend | None = (
+    MongoVectorCacheBackend() if settings.embedding_cache_backend == "mongo" else None
+)
+_inflight: dict[str, asyncio.Task[np.ndarray]] = {}
+# Fire-and-forget shared cache writes (referenced until done)
+_pending_writes: set[asyncio.Task] = set()
+
+
+def _cache_key(query: str, embedding_type: Literal["query", "document"]) -> str:
+    if embedding_type == "query":
+        model = settings.query_embedding_model
+    else:
+        model = settings.document_embedding_model
+    normalized = " ".join(query.split()).casefold()
+    digest = hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+    return f"{model}:{digest}"
+
+
+async def _fetch_embedding(
+    key: str, query: str, embedding_type: Literal["query", "document"]
 ) -> np.ndarray:
+    if shared_embedding_cache is not None:
+        try:
+            embedding = await shared_embedding_cache.get(key)
+        except Exception as e:
+            # The shared tier is only a cache: fall through to the upstream
+            logger.warning("Shared embedding cache read failed: %s", e)
+            embedding = None
+        if embedding is not None:
+            embedding_cache.stats.shared_hits += 1
+            return embedding
+
     embedding = await clients.opanai.get_embedding(query, embedding_type)
     embedding = np.array(embedding, dtype=np.float32)
+
+    if shared_embedding_cache is not None:
+        # Not awaited: the request does not wait on the cache write
+        task = asyncio.create_task(
+            _store_shared(shared_embedding_cache, key, embedding)
+        )
+        _pending_writes.add(task)
+        task.add_done_callback(_pending_writes.discard)
     return embedding
 
 
+async def _store_shared(
+    backend: VectorCacheBackend, key: str, embedding: np.ndarray
+) -> None:
+    try:
+        await backend.set(
+            key, embedding, settings.embedding_cache_ttl_seconds
+        )
+    except Exception as e:
+        logger.warning("Shared embedding cache write failed: %s", e)
+
+
+async def _load_embedding(
+    key: str, query: str, embedding_type: Literal["query", "document"]
+) -> np.ndarray:
+    embedding = await _fetch_embedding(key, query, embedding_type)
+    embedding.setflags(write=False)
+    embedding_cache.set(key, embedding)
+    return embedding
+
+
+def _forget_inflight(key: str, task: asyncio.Task) -> None:
+    if _inflight.get(key) is task:
+        del _inflight[key]
+    if not task.cancelled():
+        # Mark the exception as retrieved in case every waiter went away
+        task.exception()
+
+
+async def get_embedding(
+    query: str, embedding_type: Literal["query", "document"]
+) -> np.ndarray:
+    """
+    Returns the embedding for the text, served from the LRU/TTL cache when
+    possible. Concurrent misses for the same key share one upstream call.
+    The returned array is read-only because it may be shared.
+    """
+    key = _cache_key(query, embedding_type)
+
+    embedding = embedding_cache.get(key)
+    if embedding is not None:
+        return embedding
+
+    task = _inflight.get(key)
+    if task is not None:
+        embedding_cache.stats.coalesced += 1
+    else:
+        # The fetch runs in its own task, so a caller that is cancelled (client
+        # disconnect, timeout) does not cancel it for the other waiters
+        task = asyncio.create_task(_load_embedding(key, query, embedding_type))
+        _inflight[key] = task
+        task.add_done_callback(lambda t: _forget_inflight(key, t))
+    return await asyncio.shield(task)
+
+
+def cache_stats() -> dict[str, int]:
+    """Returns hit/miss/eviction counters of the embedding cache."""
+    return {**embedding_cache.stats.as_dict(), "size": len(embedding_cache)}
+
+
 async def list_exact_nearest_neighbors(
     query_embedding: np.ndarray,
     candidate_chunks: list[DocumentChunk],
     metric: Literal["cosine", "dot"] = "cosine",
     limit: int = 10,
-) -> list[tuple[float, dict]]:
+) -> list[DocumentChunk]:
     """
     Exact Nearest Neighbor Search using Cosine Similarity
     """
+    if not candidate_chunks:
+        return []
+
     candidate_embeddings = [x.embedding for x in candidate_chunks]
     candidate_embeddings = np.array(candidate_embeddings, dtype=np.float32)
 
@@ -34,11 +161,6 @@ async def list_exact_nearest_neighbors(
         raise ValueError(f"Unsupported metric: {metric}")
 
     similarities = metric_func(query_embedding, candidate_embeddings)
+    indices, _ = tools.vector.top_k(similarities, limit)
 
-    results = list(zip(similarities, candidate_chunks))
-    results.sort(key=lambda x: x[0], reverse=True)
-    results = results[:limit]
-
-    _, chunks = zip(*results)
-
-    return chunks
+    return [candidate_chunks[i] for i in indices]
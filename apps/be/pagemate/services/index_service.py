@@ -0,0 +1,349 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Literal
+
+import numpy as np
+
+from pagemate import clients
+from pagemate.settings import settings
+from pagemate.tools.ann import IVFQuantizer, default_nlist
+from pagemate.tools.index import VectorIndex
+from pagemate.tools.vector import decode_embedding
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class TenantIndex:
+    index: VectorIndex | None = None
+    watermark: datetime | None = None
+    checked_at: float = 0.0
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    trained_size: int = 0
+    training: asyncio.Task | None = None
+    # monotonic time before which a failed training is not retried
+    training_retry_at: float = 0.0
+    # document_id -> chunk_generation, and ids of rows outside it
+    generations: dict[str, int] = field(default_factory=dict)
+    hidden: set[str] = field(default_factory=set)
+    # ids of visible rows whose embedding could not be indexed
+    skipped: set[str] = field(default_factory=set)
+
+
+_tenant_indexes: dict[str, TenantIndex] = {}
+
+
+def _to_matrix(
+    chunks: list[dict], dim: int | None
+) -> tuple[list[dict], np.ndarray, list[str]]:
+    """
+    Stacks chunk embeddings, dropping rows that are empty, malformed or of the
+    wrong size (one bad row must not fail the tenant's whole index).
+    Returns (rows, matrix, ids of the dropped rows).
+    """
+    rows, vectors, dropped = [], [], []
+    for chunk in chunks:
+        try:
+            embedding = decode_embedding(chunk)
+        except (ValueError, TypeError) as e:
+            logger.warning("Skipping chunk %s: bad embedding: %s", chunk.get("_id"), e)
+            dropped.append(str(chunk["_id"]))
+            continue
+        if embedding is None or not len(embedding):
+            dropped.append(str(chunk["_id"]))
+            continue
+        if dim is None:
+            dim = len(embedding)
+        if len(embedding) != dim:
+            dropped.append(str(chunk["_id"]))
+            continue
+        rows.append(chunk)
+        vectors.append(embedding)
+    if not vectors:
+        return rows, np.empty((0, dim or 0), dtype=np.float32), dropped
+    return rows, np.stack(vectors), dropped
+
+
+def _max_updated_at(chunks: list[dict], current: datetime | None) -> datetime | None:
+    for chunk in chunks:
+        updated_at = chunk.get("updated_at")
+        if isinstance(updated_at, datetime) and (
+            current is None or updated_at > current
+        ):
+            current = updated_at
+    return current
+
+
+def _apply(state: TenantIndex, chunks: list[dict]) -> None:
+    # Only rows of each document's current generation are searchable
+    visible, retired = [], []
+    for chunk in chunks:
+        chunk_id = str(chunk["_id"])
+        generation = state.generations.get(chunk.get("document_id"), 0)
+        if clients.mongo.chunk.is_visible(chunk, generation):
+            state.hidden.discard(chunk_id)
+            visible.append(chunk)
+        else:
+            state.hidden.add(chunk_id)
+            state.skipped.discard(chunk_id)
+            retired.append(chunk_id)
+
+    dim = state.index.dim if state.index is not None else None
+    rows, matrix, dropped = _to_matrix(visible, dim)
+    # Dropped rows are counted apart so the count check in _sync still adds up
+    # (a row whose new embedding is bad also leaves the index)
+    state.skipped.update(dropped)
+    retired.extend(dropped)
+    if state.index is not None and retired:
+        state.index.remove(retired)
+    if not rows:
+        return
+    if state.index is None:
+        state.index = VectorIndex(dim=matrix.shape[1], capacity=len(rows))
+    chunk_ids = [str(x["_id"]) for x in rows]
+    state.index.upsert(chunk_ids, [x.get("document_id") for x in rows], matrix)
+    state.skipped.difference_update(chunk_ids)
+
+
+async def _rebuild(tenant_id: str, state: TenantIndex) -> None:
+    t0 = time.perf_counter()
+    chunks = await clients.mongo.chunk.list_chunk_embeddings(tenant_id=tenant_id)
+
+    fresh = TenantIndex(lock=state.lock)
+    fresh.generations = await clients.mongo.document.get_chunk_generations(tenant_id)
+    _apply(fresh, chunks)
+
+    # Keep the trained quantizer (and known list assignments) across rebuilds
+    previous = state.index
+    if (
+        fresh.index is not None
+        and previous is not None
+        and previous.quantizer is not None
+        and previous.dim == fresh.index.dim
+    ):
+        assignments = dict(zip(previous.ids.tolist(), previous.lists.tolist()))
+        fresh.index.set_quantizer(previous.quantizer, assignments)
+
+    state.index = fresh.index
+    state.generations = fresh.generations
+    state.hidden = fresh.hidden
+    state.skipped = fresh.skipped
+    state.watermark = _max_updated_at(chunks, None)
+
+    logger.info(
+        "Rebuilt vector index: tenant_id=%s, size=%d, took=%.3fs",
+        tenant_id,
+        len(state.index) if state.index is not None else 0,
+        time.perf_counter() - t0,
+    )
+
+
+async def _sync(tenant_id: str, state: TenantIndex) -> None:
+    """Pulls chunks updated since the watermark; rebuilds when counts disagree."""
+    expected = await clients.mongo.chunk.count_chunks_by_tenant_id(tenant_id)
+
+    if state.index is None or state.watermark is None:
+        await _rebuild(tenant_id, state)
+        return
+
+    overlap = timedelta(seconds=settings.vector_index_sync_overlap_seconds)
+    changed = await clients.mongo.chunk.list_chunk_embeddings(
+        tenant_id=tenant_id, updated_after=state.watermark - overlap
+    )
+    # A generation flip only writes the document, so visibility is re-checked
+    # against the current chunk_generation of every document: the rows of the
+    # flipped ones are re-applied whatever their updated_at
+    generations = await clients.mongo.document.get_chunk_generations(tenant_id)
+    flipped = [
+        document_id
+        for document_id, generation in generations.items()
+        if state.generations.get(document_id, 0) != generation
+    ]
+    state.generations = generations
+    if flipped:
+        changed += await clients.mongo.chunk.list_chunk_embeddings(
+            tenant_id=tenant_id, document_ids=flipped
+        )
+    # One row per chunk (a row may come from both queries)
+    changed = list({str(x["_id"]): x for x in changed}.values())
+    _apply(state, changed)
+    state.watermark = _max_updated_at(changed, state.watermark)
+
+    # Deletions (or chunks written with an older timestamp) cannot be seen
+    # through the watermark, so fall back to a full rebuild.
+    if len(state.index) + len(state.hidden) + len(state.skipped) != expected:
+        await _rebuild(tenant_id, state)
+
+
+async def get_index(tenant_id: str) -> VectorIndex | None:
+    """Returns the resident index for the tenant, syncing it with Mongo if stale."""
+    state = _tenant_indexes.setdefault(tenant_id, TenantIndex())
+
+    if time.monotonic() - state.checked_at < settings.vector_index_refresh_seconds:
+        return state.index
+
+    async with state.lock:
+        if time.monotonic() - state.checked_at >= settings.vector_index_refresh_seconds:
+            await _sync(tenant_id, state)
+            state.checked_at = time.monotonic()
+
+    return state.index
+
+
+def _quantizer_path(tenant_id: str):
+    return settings.file_storage_base_path.joinpath("indexes", f"{tenant_id}.ivf.npz")
+
+
+async def train_quantizer(tenant_id: str) -> IVFQuantizer | None:
+    """
+    Attaches an IVF quantizer to the tenant index. A quantizer persisted in
+    the file storage dir is reused unless the index has outgrown it;
+    otherwise new centroids are trained off the event loop and saved.
+    """
+    state = _tenant_indexes.get(tenant_id)
+    index = state.index if state is not None else None
+    if index is None:
+        return None
+
+    path = _quantizer_path(tenant_id)
+    if index.quantizer is None and path.exists():
+        try:
+            quantizer, assignments = await asyncio.to_thread(IVFQuantizer.load, path)
+        except Exception as e:
+            logger.warning("Failed to load ANN index %s: %s", path, e)
+        else:
+            if (
+                quantizer.dim == index.dim
+                and len(assignments) * settings.ann_retrain_growth >= len(index)
+            ):
+                index.set_quantizer(quantizer, assignments)
+                state.trained_size = len(assignments)
+                logger.info("Loaded ANN index: tenant_id=%s, path=%s", tenant_id, path)
+                return quantizer
+
+    t0 = time.perf_counter()
+    chunk_ids = index.ids.copy()
+    vectors = index.vectors.copy()
+    nlist = settings.ann_nlist or default_nlist(len(vectors))
+
+    def build():
+        quantizer = IVFQuantizer.train(
+            vectors,
+            nlist=nlist,
+            iterations=settings.ann_train_iterations,
+            sample_size=settings.ann_train_sample_size,
+        )
+        assignments = quantizer.assign(vectors)
+        quantizer.save(path, chunk_ids, assignments)
+        return quantizer, assignments
+
+    quantizer, assignments = await asyncio.to_thread(build)
+
+    # The index may have been rebuilt or changed while training
+    index = state.index
+    if index is None or index.dim != quantizer.dim:
+        return None
+    index.set_quantizer(quantizer, dict(zip(chunk_ids.tolist(), assignments.tolist())))
+    state.trained_size = len(chunk_ids)
+
+    logger.info(
+        "Trained ANN index: tenant_id=%s, size=%d, nlist=%d, took=%.3fs",
+        tenant_id,
+        len(chunk_ids),
+        quantizer.nlist,
+        time.perf_counter() - t0,
+    )
+    return quantizer
+
+
+def _schedule_training(tenant_id: str, state: TenantIndex) -> None:
+    index = state.index
+    if index is None or (state.training is not None and not state.training.done()):
+        return
+    if time.monotonic() < state.training_retry_at:
+        return
+    if (
+        index.quantizer is not None
+        and len(index) < state.trained_size * settings.ann_retrain_growth
+    ):
+        return
+    state.training = asyncio.create_task(train_quantizer(tenant_id))
+    state.training.add_done_callback(
+        lambda task: _training_done(tenant_id, state, task)
+    )
+
+
+def _training_done(tenant_id: str, state: TenantIndex, task: asyncio.Task) -> None:
+    if task.cancelled():
+        return
+    e = task.exception()
+    if e is not None:
+        state.training_retry_at = time.monotonic() + settings.ann_train_retry_seconds
+        logger.error(
+            "ANN training failed: tenant_id=%s, retry in %.0fs: %s",
+            tenant_id,
+            settings.ann_train_retry_seconds,
+            e,
+            exc_info=e,
+        )
+
+
+def _resolve_mode(
+    tenant_id: str, mode: Literal["exact", "ann"] | None, size: int
+) -> Literal["exact", "ann"]:
+    if mode is not None:
+        return mode
+    mode = settings.retrieval_tenant_modes.get(tenant_id, settings.retrieval_mode)
+    if mode == "auto":
+        return "ann" if size >= settings.ann_min_vectors else "exact"
+    return mode
+
+
+async def search(
+    tenant_id: str,
+    query_embedding: np.ndarray,
+    limit: int = 10,
+    document_id: str | None = None,
+    mode: Literal["exact", "ann"] | None = None,
+    nprobe: int | None = None,
+) -> tuple[list[str], list[float]]:
+    """
+    Returns (chunk_ids, scores) of the nearest chunks, best first.
+
+    `mode` picks exact or approximate (IVF) search; when omitted the
+    per-tenant or global setting decides. ANN falls back to exact search
+    until the tenant's quantizer has been trained.
+    """
+    index = await get_index(tenant_id)
+    if index is None:
+        return [], []
+
+    if _resolve_mode(tenant_id, mode, len(index)) == "ann":
+        _schedule_training(tenant_id, _tenant_indexes[tenant_id])
+        if index.quantizer is not None:
+            nprobe = nprobe or settings.ann_nprobe
+        else:
+            nprobe = None
+    else:
+        nprobe = None
+
+    ids, scores = index.search(
+        query_embedding, limit=limit, document_id=document_id, nprobe=nprobe
+    )
+    return ids.tolist(), scores.tolist()
+
+
+def evict_document(tenant_id: str, document_id: str) -> None:
+    """Drops a document's rows from the resident index (if loaded)."""
+    state = _tenant_indexes.get(tenant_id)
+    if state is None or state.index is None:
+        return
+    state.index.remove_document(document_id)
+
+
+def evict_tenant(tenant_id: str) -> None:
+    """Forgets the resident index for the tenant."""
+    _tenant_indexes.pop(tenant_id, None)
@@ -0,0 +1,47 @@
+from pagemate.schema import DocumentChunk
+from pagemate.settings import settings
+
+CONTEXT_INSTRUCTION = (
+    "Answer using the reference passages below when they are relevant. "
+    "If they do not contain the answer, say so instead of guessing."
+)
+
+
+def build_context(chunks: list[DocumentChunk], max_chars: int) -> tuple[str, list]:
+    """
+    Packs retrieved chunks (best first) into a numbered context block
+    without exceeding `max_chars`. The chunk that crosses the budget is
+    truncated; anything after it is dropped. Returns (context, used chunks).
+    """
+    parts: list[str] = []
+    used: list[DocumentChunk] = []
+    remaining = max_chars
+
+    for chunk in chunks:
+        header = f"[{len(used) + 1}] "
+        text = chunk.text.strip()
+        if not text:
+            continue
+        available = remaining - len(header) - 2
+        if available <= 0:
+            break
+        if len(text) > available:
+            text = text[:available]
+        parts.append(header + text)
+        used.append(chunk)
+        remaining -= len(parts[-1]) + 2
+
+    return "\n\n".join(parts), used
+
+
+def build_messages(history: list[dict], context: str) -> list[dict]:
+    """System prompt (secret_recipe + retrieved context) followed by the chat."""
+    messages: list[dict] = []
+    if settings.secret_recipe:
+        messages.append({"role": "system", "content": settings.secret_recipe})
+    if context:
+        messages.append(
+            {"role": "system", "content": f"{CONTEXT_INSTRUCTION}\n\n{context}"}
+        )
+    messages.extend(history)
+    return messages
@@ -1,11 +1,20 @@
+import os
 import pathlib
+import re
 import uuid
+from typing import AsyncIterator
+
+from fastapi import UploadFile
 
 from pagemate import clients
 from pagemate.settings import settings
 
 FILE_STORAGE_BASE_PATH = pathlib.Path("/file-storage")
 
+FileTooLargeError = clients.storage.FileTooLargeError
+
+_SHA256 = re.compile(r"[0-9a-f]{64}")
+
 
 async def file_exists(path: str | pathlib.Path) -> bool:
     """파일이 존재하는지 확인합니다."""
@@ -28,6 +37,80 @@ async def save_file(content: bytes, extension: str) -> tuple[pathlib.Path, int]:
     return path_obj, file_size
 
 
+def object_key(sha256: str) -> str:
+    """content-addressed 객체 key: 해시 앞 두 바이트로 두 단계 디렉터리를 나눕니다."""
+    return f"objects/{sha256[:2]}/{sha256[2:4]}/{sha256}"
+
+
+def object_path(sha256: str) -> str:
+    """문서의 object_path로 저장할 위치 (로컬 백엔드는 파일 경로, 아니면 key)."""
+    key = object_key(sha256)
+    return str(clients.storage.get_backend().local_path(key) or key)
+
+
+async def save_upload(file: UploadFile, extension: str) -> tuple[str, int, str]:
+    """업로드된 파일을 content-addressed 저장소에 넣고 (경로, 크기, sha256)을 반환합니다.
+
+    고정 크기 청크로 복사하므로 업로드 크기와 상관없이 메모리 사용량이 일정합니다.
+    같은 내용의 파일은 한 번만 저장되고 참조 수만 늘어납니다.
+    """
+    if extension.startswith("."):
+        raise ValueError("Extension should not start with a dot.")
+
+    max_size = settings.upload_max_size_bytes
+    # The multipart parser already knows the size: reject before copying
+    if file.size is not None and file.size > max_size:
+        raise FileTooLargeError(max_size)
+
+    backend = clients.storage.get_backend()
+    staged = await backend.write_staged(
+        _read_chunks(file, settings.upload_chunk_size), max_size=max_size
+    )
+    try:
+        await clients.mongo.file_object.acquire(staged.sha256, staged.size)
+    except BaseException:
+        await backend.discard(staged)
+        raise
+    try:
+        # Published even when the object already exists: together with the
+        # move-aside in release_object, a concurrent delete of the last
+        # reference can never leave this new reference without its file
+        await backend.publish(staged, object_key(staged.sha256))
+    except BaseException:
+        await backend.discard(staged)
+        await release_object(staged.sha256)
+        raise
+    return object_path(staged.sha256), staged.size, staged.sha256
+
+
+async def release_object(sha256: str) -> None:
+    """객체의 참조를 하나 놓고, 마지막 참조였으면 객체를 삭제합니다."""
+    if await clients.mongo.file_object.release(sha256) > 0:
+        return
+    backend = clients.storage.get_backend()
+    key = object_key(sha256)
+    # Move aside before dropping the record; if someone re-acquired the
+    # object meanwhile, the record survives and the file is moved back
+    trash = f"trash/{uuid.uuid4().hex}"
+    moved = await backend.move(key, trash)
+    if await clients.mongo.file_object.delete_if_unreferenced(sha256):
+        if moved:
+            await backend.delete(trash)
+    elif moved:
+        await backend.move(trash, key)
+
+
+async def _read_chunks(file: UploadFile, chunk_size: int) -> AsyncIterator[bytes]:
+    while chunk := await file.read(chunk_size):
+        yield chunk
+
+
+async def stat_file(path: str | pathlib.Path) -> os.stat_result:
+    """파일 정보를 조회합니다. 파일이 없으면 FileNotFoundError를 발생시킵니다."""
+    path_obj = pathlib.Path(path) if isinstance(path, str) else path
+    return await clients.storage.stat_file(path_obj)
+
+
 async def read_file(path: str | pathlib.Path) -> bytes:
     """텍스트 파일을 읽어옵니다."""
     path_obj = pathlib.Path(path) if isinstance(path, str) else path
@@ -40,6 +123,11 @@ async def read_file(path: str | pathlib.Path) -> bytes:
 
 
 async def remove_file(path: str | pathlib.Path) -> None:
-    """파일을 삭제합니다."""
+    """파일을 삭제합니다. content-addressed 객체는 마지막 참조일 때만 삭제됩니다."""
     path_obj = pathlib.Path(path) if isinstance(path, str) else path
+    sha256 = path_obj.name
+    if _SHA256.fullmatch(sha256) and object_path(sha256) == str(path_obj):
+        await release_object(sha256)
+        return
+    # Files uploaded before content addressing belong to one document each
     await clients.storage.delete_file(path_obj)
@@ -1,27 +1,48 @@
-import asyncio
-
-import openai
+from typing import AsyncIterator
 
+from pagemate import clients
 from pagemate.settings import settings
 
-openai_client = openai.Client(
-    api_key=settings.upstage_completion_api_key,
-    base_url=settings.upstage_completion_base_url,
-)
-
 
-async def complete_chat(messages: list[dict]) -> str:
+async def complete_chat(messages: list[dict], timeout: float | None = None) -> str:
     params = {
         "model": settings.upstage_completion_model,
         "messages": messages,
+        "timeout": timeout or settings.upstage_completion_timeout_seconds,
     }
 
-    current_loop = asyncio.get_event_loop()
-
-    response = await current_loop.run_in_executor(
-        None,
-        lambda: openai_client.chat.completions.create(**params),
-    )
+    async with clients.opanai.completion_semaphore:
+        completion_client = clients.opanai.get_completion_client()
+        response = await completion_client.chat.completions.create(**params)
     content = response.choices[0].message.content
 
     return content
+
+
+async def stream_chat(
+    messages: list[dict], timeout: float | None = None
+) -> AsyncIterator[str]:
+    """
+    Yields content deltas as they arrive from the upstream stream.
+    Closing or cancelling the generator (e.g. on client disconnect)
+    closes the upstream stream as well.
+    """
+    params = {
+        "model": settings.upstage_completion_model,
+        "messages": messages,
+        "stream": True,
+        "timeout": timeout or settings.upstage_completion_timeout_seconds,
+    }
+
+    async with clients.opanai.completion_semaphore:
+        completion_client = clients.opanai.get_completion_client()
+        stream = await completion_client.chat.completions.create(**params)
+        try:
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                content = chunk.choices[0].delta.content
+                if content:
+                    yield content
+        finally:
+            await stream.close()
@@ -1,11 +1,26 @@
 import pathlib
+from typing import Literal
 
 from pydantic_settings import BaseSettings
 
 
 class Settings(BaseSettings):
     mongo_url: str = "mongodb://localhost:27017"
+    mongo_database: str = "pagemate"
+    mongo_max_pool_size: int = 100
+    mongo_min_pool_size: int = 10
+    mongo_max_idle_time_ms: int = 300_000
+    mongo_connect_timeout_ms: int = 5_000
+    mongo_server_selection_timeout_ms: int = 5_000
+    mongo_wait_queue_timeout_ms: int = 5_000
+    # Create the declared indexes (clients.mongo.indexes) on startup
+    mongo_ensure_indexes: bool = True
+
+    # local (sha256-sharded files under file_storage_base_path)
+    storage_backend: Literal["local"] = "local"
     file_storage_base_path_str: str = "/file-storage"
+    upload_max_size_bytes: int = 100 * 1024 * 1024
+    upload_chunk_size: int = 1024 * 1024
 
     upstage_completion_model: str = "solar-pro2"
     upstage_completion_api_key: str = "your-upstage-api-key"
@@ -14,9 +29,41 @@ class Settings(BaseSettings):
     upstage_embedding_api_key: str = "your-upstage-api-key"
     upstage_embedding_base_url: str = "https://api.upstage.ai/v1"
 
+    upstage_max_connections: int = 100
+    upstage_max_keepalive_connections: int = 20
+    upstage_max_retries: int = 2
+    upstage_embedding_max_concurrency: int = 32
+    upstage_completion_max_concurrency: int = 32
+    upstage_embedding_timeout_seconds: float = 10.0
+    upstage_completion_timeout_seconds: float = 60.0
+
     query_embedding_model: str = "embedding-query"
     document_embedding_model: str = "embedding-passage"
 
+    # memory | mongo (shared across API replicas, memory stays in front)
+    embedding_cache_backend: Literal["memory", "mongo"] = "memory"
+    embedding_cache_max_size: int = 4096
+    embedding_cache_ttl_seconds: float = 86_400
+
+    vector_index_refresh_seconds: float = 5.0
+    vector_index_sync_overlap_seconds: float = 60.0
+
+    # exact | ann | auto (ann once a tenant has `ann_min_vectors` chunks)
+    retrieval_mode: Literal["exact", "ann", "auto"] = "auto"
+    retrieval_tenant_modes: dict[str, Literal["exact", "ann", "auto"]] = {}
+
+    ann_min_vectors: int = 50_000
+    ann_nlist: int | None = None
+    ann_nprobe: int = 8
+    ann_train_iterations: int = 10
+    ann_train_sample_size: int = 65_536
+    ann_retrain_growth: float = 2.0
+    # Wait this long before training again after a failed training run
+    ann_train_retry_seconds: float = 300.0
+
+    rag_top_k: int = 5
+    rag_context_max_chars: int = 8_000
+
     secret_recipe: str = (
         "Current website is Acme Insurance."
         "You are an AI assistant that helps users navigate to the appropriate pages."
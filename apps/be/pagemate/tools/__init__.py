@@ -1,3 +1,8 @@
+from pagemate.tools import ann
+from pagemate.tools import cache
+from pagemate.tools import conditional
+from pagemate.tools import index
+from pagemate.tools import sse
 from pagemate.tools import vector
 
-__all__ = ["vector"]
+__all__ = ["ann", "cache", "conditional", "index", "sse", "vector"]
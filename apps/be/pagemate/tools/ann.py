@@ -0,0 +1,127 @@
+import pathlib
+
+import numpy as np
+
+from pagemate.tools.vector import top_k
+
+ASSIGN_BATCH_SIZE = 4096
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class IVFQuantizer:
+    """
+    Coarse quantizer for an inverted-file (IVF) index.
+
+    Centroids are trained with spherical k-means over normalized vectors.
+    Every indexed row is assigned to its closest centroid ("list"), and a
+    query only scores the rows of its `nprobe` closest lists.
+    """
+
+    def __init__(self, centroids: np.ndarray):
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+
+    @property
+    def nlist(self) -> int:
+        return self.centroids.shape[0]
+
+    @property
+    def dim(self) -> int:
+        return self.centroids.shape[1]
+
+    @classmethod
+    def train(
+        cls,
+        vectors: np.ndarray,
+        nlist: int,
+        iterations: int = 10,
+        sample_size: int | None = None,
+        seed: int = 0,
+    ) -> "IVFQuantizer":
+        """Trains centroids on (a sample of) the given normalized vectors."""
+        rng = np.random.default_rng(seed)
+        n = len(vectors)
+        nlist = max(1, min(nlist, n))
+
+        if sample_size is not None and n > sample_size:
+            vectors = vectors[rng.choice(n, size=sample_size, replace=False)]
+            n = sample_size
+
+        centroids = vectors[rng.choice(n, size=nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assignments = cls(centroids).assign(vectors)
+
+            order = np.argsort(assignments, kind="stable")
+            counts = np.bincount(assignments, minlength=nlist)
+            starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+            nonempty = counts > 0
+
+            sums = np.add.reduceat(vectors[order], starts[nonempty], axis=0)
+            centroids[nonempty] = _normalize(sums)
+
+            # Re-seed empty lists with random vectors so no centroid is wasted
+            empty = np.flatnonzero(~nonempty)
+            if len(empty):
+                centroids[empty] = vectors[rng.choice(n, size=len(empty))]
+
+        return cls(centroids)
+
+    def assign(self, vectors: np.ndarray) -> np.ndarray:
+        """Returns the closest list id for every vector."""
+        assignments = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), ASSIGN_BATCH_SIZE):
+            batch = vectors[start : start + ASSIGN_BATCH_SIZE]
+            assignments[start : start + len(batch)] = np.argmax(
+                batch @ self.centroids.T, axis=1
+            )
+        return assignments
+
+    def probe(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        """Returns the ids of the `nprobe` lists closest to the query."""
+        lists, _ = top_k(self.centroids @ query, max(1, nprobe))
+        return lists
+
+    def save(
+        self,
+        path: pathlib.Path,
+        chunk_ids: np.ndarray,
+        assignments: np.ndarray,
+    ) -> None:
+        """Persists centroids with the row assignments they were built with."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                centroids=self.centroids,
+                chunk_ids=np.asarray(chunk_ids, dtype=str),
+                assignments=np.asarray(assignments, dtype=np.int32),
+            )
+        tmp_path.replace(path)
+
+    @classmethod
+    def load(cls, path: pathlib.Path) -> tuple["IVFQuantizer", dict[str, int]]:
+        """Loads centroids and a chunk_id -> list id map saved by `save`."""
+        with np.load(path, allow_pickle=False) as data:
+            quantizer = cls(data["centroids"])
+            assignments = dict(
+                zip(data["chunk_ids"].tolist(), data["assignments"].tolist())
+            )
+        return quantizer, assignments
+
+
+def default_nlist(n: int) -> int:
+    """Rule of thumb: about 4 * sqrt(n) lists."""
+    return max(1, int(4 * np.sqrt(n)))
+
+
+def recall_at_k(exact_ids: list, approx_ids: list, k: int) -> float:
+    """Fraction of the exact top-k that the approximate search also returned."""
+    expected = set(exact_ids[:k])
+    if not expected:
+        return 1.0
+    return len(expected.intersection(approx_ids[:k])) / len(expected)
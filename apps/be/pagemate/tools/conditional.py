@@ -0,0 +1,40 @@
+from email.utils import parsedate_to_datetime
+
+from starlette.datastructures import Headers
+from starlette.responses import Response
+
+# Headers a 304 must repeat from the full response (RFC 9110, 15.4.5)
+VALIDATOR_HEADERS = ("etag", "last-modified", "cache-control", "vary")
+
+
+def is_not_modified(request_headers: Headers, response_headers: Headers) -> bool:
+    """
+    Whether the client's cached copy is still current. If-None-Match takes
+    precedence over If-Modified-Since, which is only compared when the
+    client sent no entity tags.
+    """
+    if if_none_match := request_headers.get("if-none-match"):
+        if if_none_match.strip() == "*":
+            return True
+        etag = response_headers.get("etag", "").removeprefix("W/")
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return bool(etag) and etag in tags
+
+    since = request_headers.get("if-modified-since")
+    last_modified = response_headers.get("last-modified")
+    if not since or not last_modified:
+        return False
+    try:
+        return parsedate_to_datetime(since) >= parsedate_to_datetime(last_modified)
+    except (TypeError, ValueError):
+        return False
+
+
+def not_modified(response: Response) -> Response:
+    """304 carrying the validators of the response it replaces."""
+    headers = {
+        key: value
+        for key, value in response.headers.items()
+        if key in VALIDATOR_HEADERS
+    }
+    return Response(status_code=304, headers=headers)
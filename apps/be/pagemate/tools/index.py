@@ -0,0 +1,236 @@
+from typing import Iterable
+
+import numpy as np
+
+from pagemate.tools.ann import IVFQuantizer
+from pagemate.tools.vector import top_k
+
+
+class VectorIndex:
+    """
+    Resident vector index backed by a contiguous float32 matrix.
+
+    Rows are L2-normalized on insert so a search is a single matrix-vector
+    product. Chunk ids and document ids are kept in parallel arrays, and a
+    removed row is swapped with the last one to keep the matrix dense.
+
+    With a quantizer attached, every row also carries its IVF list id (-1 if
+    not assigned yet). The rows of each list are kept in an inverted list
+    (row positions, updated on upsert and swap-remove), so a search only
+    touches the rows of the lists it probes.
+    """
+
+    def __init__(self, dim: int, capacity: int = 1024):
+        self.dim = dim
+        self._size = 0
+        self._vectors = np.empty((max(1, capacity), dim), dtype=np.float32)
+        self._ids = np.empty(max(1, capacity), dtype=object)
+        self._document_ids = np.empty(max(1, capacity), dtype=object)
+        self._lists = np.full(max(1, capacity), -1, dtype=np.int32)
+        # list id -> row positions, and each row's slot in its list
+        self._members: dict[int, list[int]] = {}
+        self._slots = np.zeros(max(1, capacity), dtype=np.int64)
+        self._positions: dict[str, int] = {}
+        self.quantizer: IVFQuantizer | None = None
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, chunk_id: str) -> bool:
+        return chunk_id in self._positions
+
+    @property
+    def vectors(self) -> np.ndarray:
+        return self._vectors[: self._size]
+
+    @property
+    def ids(self) -> np.ndarray:
+        return self._ids[: self._size]
+
+    @property
+    def document_ids(self) -> np.ndarray:
+        return self._document_ids[: self._size]
+
+    @property
+    def lists(self) -> np.ndarray:
+        return self._lists[: self._size]
+
+    def _reserve(self, capacity: int) -> None:
+        if capacity <= len(self._ids):
+            return
+        new_capacity = max(capacity, len(self._ids) * 2)
+
+        vectors = np.empty((new_capacity, self.dim), dtype=np.float32)
+        vectors[: self._size] = self._vectors[: self._size]
+        ids = np.empty(new_capacity, dtype=object)
+        ids[: self._size] = self._ids[: self._size]
+        document_ids = np.empty(new_capacity, dtype=object)
+        document_ids[: self._size] = self._document_ids[: self._size]
+        lists = np.full(new_capacity, -1, dtype=np.int32)
+        lists[: self._size] = self._lists[: self._size]
+        slots = np.zeros(new_capacity, dtype=np.int64)
+        slots[: self._size] = self._slots[: self._size]
+
+        self._vectors, self._ids, self._document_ids = vectors, ids, document_ids
+        self._lists, self._slots = lists, slots
+
+    def _link(self, position: int, list_id: int) -> None:
+        members = self._members.setdefault(list_id, [])
+        self._lists[position] = list_id
+        self._slots[position] = len(members)
+        members.append(position)
+
+    def _unlink(self, position: int) -> None:
+        members = self._members[int(self._lists[position])]
+        slot = int(self._slots[position])
+        tail = members.pop()
+        if tail != position:
+            members[slot] = tail
+            self._slots[tail] = slot
+
+    def _relink(self, src: int, dst: int) -> None:
+        """The row at `src` moved to `dst`: point its list entry there."""
+        slot = int(self._slots[src])
+        self._members[int(self._lists[src])][slot] = dst
+        self._slots[dst] = slot
+
+    def _rebuild_members(self) -> None:
+        self._members = {}
+        for position, list_id in enumerate(self.lists.tolist()):
+            self._link(position, list_id)
+
+    def upsert(
+        self,
+        chunk_ids: Iterable[str],
+        document_ids: Iterable[str],
+        embeddings: np.ndarray,
+    ) -> None:
+        """Insert new rows or overwrite existing ones in place."""
+        chunk_ids = list(chunk_ids)
+        document_ids = list(document_ids)
+        embeddings = np.asarray(embeddings, dtype=np.float32).reshape(-1, self.dim)
+        if not (len(chunk_ids) == len(document_ids) == len(embeddings)):
+            raise ValueError("chunk_ids, document_ids and embeddings must align")
+
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        embeddings = embeddings / norms
+        if self.quantizer is not None:
+            lists = self.quantizer.assign(embeddings)
+        else:
+            lists = np.full(len(embeddings), -1, dtype=np.int32)
+
+        self._reserve(self._size + len(chunk_ids))
+        for chunk_id, document_id, vector, list_id in zip(
+            chunk_ids, document_ids, embeddings, lists
+        ):
+            position = self._positions.get(chunk_id)
+            if position is None:
+                position = self._size
+                self._positions[chunk_id] = position
+                self._ids[position] = chunk_id
+                self._size += 1
+            else:
+                self._unlink(position)
+            self._document_ids[position] = document_id
+            self._vectors[position] = vector
+            self._link(position, int(list_id))
+
+    def remove(self, chunk_ids: Iterable[str]) -> int:
+        """Remove rows by chunk id and return the number removed."""
+        removed = 0
+        for chunk_id in chunk_ids:
+            position = self._positions.pop(chunk_id, None)
+            if position is None:
+                continue
+            self._unlink(position)
+            last = self._size - 1
+            if position != last:
+                moved_id = self._ids[last]
+                self._vectors[position] = self._vectors[last]
+                self._ids[position] = moved_id
+                self._document_ids[position] = self._document_ids[last]
+                self._lists[position] = self._lists[last]
+                self._relink(last, position)
+                self._positions[moved_id] = position
+            self._ids[last] = None
+            self._document_ids[last] = None
+            self._size -= 1
+            removed += 1
+        return removed
+
+    def remove_document(self, document_id: str) -> int:
+        """Remove every row belonging to the given document."""
+        mask = self.document_ids == document_id
+        return self.remove(self.ids[mask].tolist())
+
+    def set_quantizer(
+        self,
+        quantizer: IVFQuantizer | None,
+        assignments: dict[str, int] | None = None,
+    ) -> None:
+        """
+        Attach (or detach) an IVF quantizer and assign every row to a list.
+        Known assignments (e.g. loaded from disk) are reused by chunk id.
+        """
+        self.quantizer = quantizer
+        if quantizer is None:
+            self._lists[: self._size] = -1
+            self._rebuild_members()
+            return
+
+        lists = np.full(self._size, -1, dtype=np.int32)
+        if assignments:
+            for position, chunk_id in enumerate(self.ids):
+                lists[position] = assignments.get(chunk_id, -1)
+        missing = np.flatnonzero(lists < 0)
+        if len(missing):
+            lists[missing] = quantizer.assign(self.vectors[missing])
+        self._lists[: self._size] = lists
+        self._rebuild_members()
+
+    def search(
+        self,
+        query: np.ndarray,
+        limit: int = 10,
+        document_id: str | None = None,
+        nprobe: int | None = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Return (chunk_ids, cosine scores) of the best matches, best first.
+        When `nprobe` is given and a quantizer is attached, only rows in the
+        `nprobe` closest lists (plus unassigned rows) are scored.
+        """
+        if self._size == 0 or limit <= 0:
+            return np.empty(0, dtype=object), np.empty(0, dtype=np.float32)
+
+        query = np.asarray(query, dtype=np.float32).reshape(self.dim)
+        norm = np.linalg.norm(query)
+        if norm > 0:
+            query = query / norm
+
+        rows = None
+        if nprobe is not None and self.quantizer is not None:
+            # Unassigned rows (list id -1) are always probed
+            probed = [*self.quantizer.probe(query, nprobe).tolist(), -1]
+            members = [self._members[x] for x in probed if self._members.get(x)]
+            rows = (
+                np.concatenate([np.asarray(m, dtype=np.int64) for m in members])
+                if members
+                else np.empty(0, dtype=np.int64)
+            )
+        if document_id is not None:
+            if rows is None:
+                rows = np.flatnonzero(self.document_ids == document_id)
+            else:
+                rows = rows[self._document_ids[rows] == document_id]
+
+        if rows is None:
+            scores = self.vectors @ query
+            ids = self.ids
+        else:
+            scores = self._vectors[rows] @ query
+            ids = self._ids[rows]
+
+        order, scores = top_k(scores, limit)
+        return ids[order], scores
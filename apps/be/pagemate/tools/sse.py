@@ -0,0 +1,45 @@
+import json
+from typing import AsyncIterator
+
+HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def format_event(payload: dict | str, event: str | None = None) -> str:
+    """Formats one Server-Sent Event (`event:` line only when named)."""
+    if not isinstance(payload, str):
+        payload = json.dumps(payload, ensure_ascii=False)
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {payload}\n\n"
+
+
+async def prime(deltas: AsyncIterator[str]) -> str:
+    """
+    Waits for the first delta so that failures before any output can still
+    be reported as a regular HTTP error. Returns "" for an empty stream.
+    """
+    try:
+        return await anext(deltas, "")
+    except BaseException:
+        await deltas.aclose()
+        raise
+
+
+async def stream_events(
+    first: str,
+    deltas: AsyncIterator[str],
+    preamble: list[str] | None = None,
+) -> AsyncIterator[str]:
+    """Formats content deltas as Server-Sent Events, ending with [DONE]."""
+    try:
+        for event in preamble or []:
+            yield event
+        if first:
+            yield format_event({"content": first})
+        async for delta in deltas:
+            yield format_event({"content": delta})
+        yield format_event("[DONE]")
+    except Exception as e:
+        # Headers are already sent; report the failure in-band
+        yield format_event({"detail": str(e)}, event="error")
+    finally:
+        await deltas.aclose()
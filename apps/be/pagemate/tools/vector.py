@@ -1,19 +1,86 @@
 import numpy as np
 
+# Chunk storage encodings (schema_version 2); must match the worker's codec
+EMBEDDING_DTYPES = {
+    "float32": "<f4",
+    "float16": "<f2",
+    "int8": "i1",
+}
+
 
 def inner_products(query: np.ndarray, keys: np.ndarray) -> np.ndarray:
-    similarities = np.dot(keys, query)
+    """
+    Inner products between query vector(s) and a set of key vectors.
+    A (d,) query yields (n,) scores, a (b, d) batch yields (b, n).
+    """
+    similarities = np.dot(query, keys.T)
     return similarities
 
 
 def cosine_similarities(query: np.ndarray, keys: np.ndarray) -> np.ndarray:
     """
-    Compute cosine similarities between a query vector and a set of key vectors.
+    Compute cosine similarities between query vector(s) and a set of key vectors.
     """
 
-    q_norm = query / np.linalg.norm(query)
+    q_norm = query / np.linalg.norm(query, axis=-1, keepdims=True)
     keys_norm = keys / np.linalg.norm(keys, axis=1, keepdims=True)
 
     similarities = inner_products(q_norm, keys_norm)
 
     return similarities
+
+
+def top_k(scores: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Select the k highest scores without sorting everything.
+
+    Uses argpartition to find the top k in O(n), then sorts only those k.
+    Accepts (n,) scores or a (b, n) batch and returns (indices, scores) of
+    the same leading shape, best first. NaN scores rank last.
+    """
+    scores = np.asarray(scores)
+    n = scores.shape[-1]
+    k = max(0, min(k, n))
+
+    if k == 0:
+        shape = scores.shape[:-1] + (0,)
+        return np.empty(shape, dtype=np.intp), np.empty(shape, dtype=scores.dtype)
+
+    if k < n:
+        indices = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+    else:
+        indices = np.broadcast_to(np.arange(n), scores.shape).copy()
+
+    top_scores = np.take_along_axis(scores, indices, axis=-1)
+    order = np.argsort(-top_scores, axis=-1, kind="stable")
+    indices = np.take_along_axis(indices, order, axis=-1)
+    top_scores = np.take_along_axis(top_scores, order, axis=-1)
+
+    return indices, top_scores
+
+
+def decode_embedding(chunk: dict) -> np.ndarray | None:
+    """
+    Decode a stored chunk embedding into a float32 vector.
+
+    schema_version 2 chunks hold packed binary (`embedding_encoding`), which
+    is read with np.frombuffer without copying for float32. Legacy chunks
+    hold a list of floats. A malformed embedding (unknown encoding, byte
+    length not a multiple of the item size) raises ValueError.
+    """
+    raw = chunk.get("embedding")
+    if raw is None:
+        return None
+
+    if isinstance(raw, (bytes, bytearray, memoryview)):
+        encoding = chunk.get("embedding_encoding") or "float32"
+        if encoding not in EMBEDDING_DTYPES:
+            raise ValueError(f"Unsupported embedding encoding: {encoding}")
+        vector = np.frombuffer(raw, dtype=EMBEDDING_DTYPES[encoding])
+        if encoding == "int8":
+            return vector.astype(np.float32) * np.float32(
+                chunk.get("embedding_scale", 1.0)
+            )
+        return vector.astype(np.float32, copy=False)
+
+    return np.asarray(raw, dtype=np.float32)
@@ -0,0 +1,238 @@
+"""Shared embedding batcher for the worker.
+
+Embed-stage threads hand their chunk texts to one `EmbeddingBatcher`,
+which packs texts from every in-flight document into provider requests.
+A request is flushed as soon as it reaches `max_inputs` texts or
+`token_budget` estimated tokens, or once its oldest text has waited
+`max_wait_seconds`. At most `max_inflight` requests run at a time; each
+text's vector is delivered back to its caller through a Future.
+
+When the provider rejects a request (a 4xx such as an over-long or invalid
+text), the batch is split in halves and resent, so only the futures of the
+rejected texts fail and the other documents in the batch are unaffected.
+Transient errors (timeouts, 429, 5xx) fail the whole batch; its documents
+are retried later.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Deque, Dict, List, Optional
+
+logger = logging.getLogger("worker.batcher")
+
+Vector = List[float]
+
+
+def approx_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token)."""
+    return len(text) // 4 + 1
+
+
+def is_rejected(e: Exception) -> bool:
+    """The provider refused the input itself (4xx other than timeout/rate limit).
+
+    Matches the OpenAI client's APIStatusError (e.g. BadRequestError) by its
+    `status_code`.
+    """
+    status = getattr(e, "status_code", None)
+    return isinstance(status, int) and 400 <= status < 500 and status not in (
+        408,
+        409,
+        429,
+    )
+
+
+@dataclass
+class _Pending:
+    text: str
+    tokens: int
+    future: "Future[Vector]" = field(default_factory=Future)
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+@dataclass
+class BatcherStats:
+    requests: int = 0
+    inputs: int = 0
+    tokens: int = 0
+    failures: int = 0
+    busy_seconds: float = 0.0
+
+
+class EmbeddingBatcher:
+    def __init__(
+        self,
+        embed_fn: Callable[[List[str]], List[Vector]],
+        max_inputs: int = 100,
+        token_budget: int = 150_000,
+        max_wait_seconds: float = 0.05,
+        max_inflight: int = 4,
+        count_tokens: Callable[[str], int] = approx_tokens,
+        rejected: Callable[[Exception], bool] = is_rejected,
+    ):
+        self.embed_fn = embed_fn
+        self.max_inputs = max(1, max_inputs)
+        self.token_budget = max(1, token_budget)
+        self.max_wait_seconds = max_wait_seconds
+        self.max_inflight = max(1, max_inflight)
+        self.count_tokens = count_tokens
+        self.rejected = rejected
+        self.stats = BatcherStats()
+        self._stats_lock = threading.Lock()
+        self._queue: Deque[_Pending] = deque()
+        self._queued_tokens = 0
+        self._cond = threading.Condition()
+        self._slots = threading.Semaphore(self.max_inflight)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_inflight, thread_name_prefix="embed-request"
+        )
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(
+            target=self._run, name="embed-batcher", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Flushes whatever is queued, then waits for in-flight requests."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+        self._executor.shutdown(wait=True)
+
+    def submit(self, texts: List[str]) -> List["Future[Vector]"]:
+        items = [_Pending(text, self.count_tokens(text)) for text in texts]
+        with self._cond:
+            if self._stopping:
+                raise RuntimeError("Embedding batcher is stopped")
+            self._queue.extend(items)
+            self._queued_tokens += sum(item.tokens for item in items)
+            self._cond.notify()
+        return [item.future for item in items]
+
+    def embed(self, texts: List[str]) -> List[Vector]:
+        """Blocks until every text is embedded (order preserved)."""
+        if not texts:
+            return []
+        return [f.result() for f in self.submit(texts)]
+
+    def _ready(self, now: float) -> bool:
+        if not self._queue:
+            return False
+        return (
+            self._stopping
+            or len(self._queue) >= self.max_inputs
+            or self._queued_tokens >= self.token_budget
+            or now - self._queue[0].enqueued_at >= self.max_wait_seconds
+        )
+
+    def _take(self) -> List[_Pending]:
+        batch: List[_Pending] = []
+        tokens = 0
+        while self._queue and len(batch) < self.max_inputs:
+            nxt = self._queue[0]
+            # Always send at least one (an oversized text goes alone)
+            if batch and tokens + nxt.tokens > self.token_budget:
+                break
+            batch.append(self._queue.popleft())
+            tokens += nxt.tokens
+        self._queued_tokens -= tokens
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._ready(time.monotonic()):
+                    if self._stopping and not self._queue:
+                        return
+                    timeout = None
+                    if self._queue:
+                        timeout = max(
+                            0.0,
+                            self._queue[0].enqueued_at
+                            + self.max_wait_seconds
+                            - time.monotonic(),
+                        )
+                    self._cond.wait(timeout)
+            # Wait for a free request slot outside the lock, so texts keep
+            # accumulating (into fuller requests) while the provider is busy
+            self._slots.acquire()
+            with self._cond:
+                batch = self._take()
+            if not batch:
+                self._slots.release()
+                continue
+            self._executor.submit(self._send, batch)
+
+    def _send(self, batch: List[_Pending]) -> None:
+        try:
+            self._deliver(batch)
+        finally:
+            self._slots.release()
+
+    def _deliver(self, batch: List[_Pending]) -> None:
+        t0 = time.perf_counter()
+        try:
+            vectors = self.embed_fn([item.text for item in batch])
+            if len(vectors) != len(batch):
+                raise ValueError(
+                    f"Provider returned {len(vectors)} vectors for {len(batch)} inputs"
+                )
+        except Exception as e:
+            with self._stats_lock:
+                self.stats.failures += 1
+            if len(batch) > 1 and self.rejected(e):
+                # Bisect (in this request slot) until the rejected text is alone
+                logger.warning(
+                    "Embedding request of %d inputs rejected (%s); splitting",
+                    len(batch),
+                    e,
+                )
+                mid = len(batch) // 2
+                self._deliver(batch[:mid])
+                self._deliver(batch[mid:])
+                return
+            for item in batch:
+                item.future.set_exception(e)
+            return
+        finally:
+            with self._stats_lock:
+                self.stats.requests += 1
+                self.stats.inputs += len(batch)
+                self.stats.tokens += sum(item.tokens for item in batch)
+                self.stats.busy_seconds += time.perf_counter() - t0
+        for item, vec in zip(batch, vectors):
+            item.future.set_result(vec)
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._stats_lock:
+            s = BatcherStats(**vars(self.stats))
+        return {
+            "requests": s.requests,
+            "inputs": s.inputs,
+            "failures": s.failures,
+            "avg_inputs": s.inputs / s.requests if s.requests else 0.0,
+            "avg_tokens": s.tokens / s.requests if s.requests else 0.0,
+            "avg_seconds": s.busy_seconds / s.requests if s.requests else 0.0,
+        }
+
+    def log_stats(self) -> None:
+        s = self.snapshot()
+        logger.info(
+            "embed requests=%d inputs=%d failures=%d avg_inputs=%.1f "
+            "avg_tokens=%.0f avg=%.3fs",
+            s["requests"],
+            s["inputs"],
+            s["failures"],
+            s["avg_inputs"],
+            s["avg_tokens"],
+            s["avg_seconds"],
+        )
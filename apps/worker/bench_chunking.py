@@ -0,0 +1,133 @@
+"""Microbenchmark: offset-array chunker vs. the previous per-token chunker.
+
+    uv run bench_chunking.py --chars 100000 --repeat 5
+    uv run bench_chunking.py --file parsed.md --tokenizer tiktoken:cl100k_base
+
+Reports wall time and peak traced allocations per implementation, and checks
+that the new chunker (word budget, no heading split) produces exactly the
+same chunks as the old one.
+"""
+
+import argparse
+import random
+import re
+import statistics
+import time
+import tracemalloc
+from typing import Callable, List, Optional, Tuple
+
+from chunking import chunk_document, load_length_function
+
+
+def legacy_chunk_text_tokens(
+    text: str, max_tokens: int = 750, overlap_tokens: int = 100
+) -> List[Tuple[str, int, int]]:
+    """The previous main._chunk_text_tokens (tuple + substring per token)."""
+    max_tokens = max(1, max_tokens)
+    overlap_tokens = max(0, min(overlap_tokens, max_tokens - 1))
+    toks = [
+        (text[m.start() : m.end()], m.start(), m.end())
+        for m in re.finditer(r"\S+", text)
+    ]
+    if not toks:
+        return []
+    chunks: List[Tuple[str, int, int]] = []
+    i, n = 0, len(toks)
+    while i < n:
+        j = min(n, i + max_tokens)
+        token_slice = toks[i:j]
+        start_char = token_slice[0][1]
+        end_char = token_slice[-1][2]
+        chunk_text = text[start_char:end_char]
+        if chunk_text.strip():
+            chunks.append((chunk_text, start_char, end_char))
+        if j >= n:
+            break
+        i = max(0, j - overlap_tokens)
+    return chunks
+
+
+def synthetic_markdown(chars: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    vocab = [
+        "claim", "policy", "coverage", "premium", "보험", "약관", "deductible",
+        "beneficiary", "rider", "exclusion", "renewal", "청구", "insured",
+    ]
+    parts: List[str] = []
+    size = 0
+    while size < chars:
+        if rng.random() < 0.02:
+            block = f"\n\n{'#' * rng.randint(1, 3)} Section {len(parts)}\n\n"
+        else:
+            block = " ".join(rng.choices(vocab, k=rng.randint(5, 30))) + (
+                "\n" if rng.random() < 0.1 else " "
+            )
+        parts.append(block)
+        size += len(block)
+    return "".join(parts)[:chars]
+
+
+def measure(fn: Callable[[], list], repeat: int) -> Tuple[float, float, int]:
+    """Returns (median seconds, peak MiB, chunk count)."""
+    timings = []
+    result: list = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - t0)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(timings), peak / 2**20, len(result)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--file", help="Text/markdown file (default: synthetic)")
+    parser.add_argument("--chars", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--max-tokens", type=int, default=750)
+    parser.add_argument("--overlap", type=int, default=100)
+    parser.add_argument(
+        "--tokenizer", help="Also time a tokenizer budget, e.g. tiktoken:cl100k_base"
+    )
+    args = parser.parse_args(argv)
+
+    if args.file:
+        with open(args.file, encoding="utf-8") as f:
+            text = f.read()
+    else:
+        text = synthetic_markdown(args.chars)
+
+    cases = {
+        "legacy": lambda: legacy_chunk_text_tokens(text, args.max_tokens, args.overlap),
+        "offsets": lambda: chunk_document(
+            text, args.max_tokens, args.overlap, split_headings=False
+        ),
+        "offsets+headings": lambda: chunk_document(text, args.max_tokens, args.overlap),
+    }
+    if args.tokenizer:
+        length_fn = load_length_function(args.tokenizer)
+        cases[f"offsets+{args.tokenizer}"] = lambda: chunk_document(
+            text, args.max_tokens, args.overlap, length_fn=length_fn
+        )
+
+    same = legacy_chunk_text_tokens(
+        text, args.max_tokens, args.overlap
+    ) == chunk_document(text, args.max_tokens, args.overlap, split_headings=False)
+    print(f"text: {len(text)} chars; identical word-budget output: {same}")
+
+    baseline = None
+    for name, fn in cases.items():
+        seconds, peak, count = measure(fn, args.repeat)
+        baseline = baseline or seconds
+        print(
+            f"  {name:<28} {seconds * 1000:8.2f} ms  x{baseline / seconds:5.1f}  "
+            f"peak {peak:7.2f} MiB  chunks {count}"
+        )
+    return 0 if same else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
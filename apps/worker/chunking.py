@@ -0,0 +1,213 @@
+"""Offset-array text chunker.
+
+Words are located in one vectorized pass: the text is viewed as UTF-32 code
+points, whitespace is looked up in a table, and word starts/ends are the
+edges of the non-whitespace runs. Windows are then chosen over those two
+int arrays, and only the final chunk strings are sliced out of the text.
+No per-word tuples or substrings are created.
+
+Chunk budgets are measured by a pluggable length function (see
+`load_length_function`). The default counts whitespace-delimited words by
+index arithmetic, matching the previous chunker. With a real tokenizer, each
+window is the longest run of words whose text fits the budget, found by
+binary search.
+
+Markdown headings (as returned by Upstage document-parse) split the text into
+sections. Consecutive small sections are packed together, and windows never
+straddle a section boundary.
+"""
+
+import re
+from typing import Callable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+Chunk = Tuple[str, int, int]
+LengthFn = Callable[[str], int]
+
+# Every code point Python treats as whitespace (the largest is U+3000)
+_WS_LIMIT = 0x3001
+_WS_TABLE = np.zeros(_WS_LIMIT, dtype=bool)
+_WS_TABLE[[c for c in range(_WS_LIMIT) if chr(c).isspace()]] = True
+
+_HEADING = re.compile(r"^#{1,6}[ \t]", re.MULTILINE)
+
+
+def word_offsets(text: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Start and end (exclusive) character offsets of every word."""
+    if not text:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty
+    cps = np.frombuffer(text.encode("utf-32-le", "surrogatepass"), dtype="<u4")
+    ws = np.zeros(len(cps), dtype=bool)
+    low = cps < _WS_LIMIT
+    ws[low] = _WS_TABLE[cps[low]]
+    edges = np.diff(np.concatenate(([1], ws.view(np.int8), [1])))
+    return np.flatnonzero(edges == -1), np.flatnonzero(edges == 1)
+
+
+def section_bounds(text: str, starts: np.ndarray) -> List[int]:
+    """Word indexes where a markdown heading starts a new section."""
+    positions = [m.start() for m in _HEADING.finditer(text)]
+    bounds = np.searchsorted(starts, positions).tolist()
+    return sorted({0, len(starts), *bounds})
+
+
+class _Measure:
+    """Token length of word ranges [i, j) of one text."""
+
+    def __init__(
+        self,
+        text: str,
+        starts: np.ndarray,
+        ends: np.ndarray,
+        length_fn: Optional[LengthFn],
+    ):
+        self.text = text
+        self.starts = starts
+        self.ends = ends
+        self.length_fn = length_fn
+
+    def __call__(self, i: int, j: int) -> int:
+        if self.length_fn is None:
+            return j - i
+        return self.length_fn(self.text[self.starts[i] : self.ends[j - 1]])
+
+    def longest_fit(self, i: int, hi: int, budget: int) -> int:
+        """Largest j in (i, hi] with measure(i, j) <= budget (at least i+1)."""
+        # Every word is at least one token, so the window is at most `budget` words
+        hi = min(hi, i + budget)
+        if self.length_fn is None or self(i, hi) <= budget:
+            return hi
+        lo = i + 1
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if self(i, mid) <= budget:
+                lo = mid
+            else:
+                hi = mid - 1
+        return lo
+
+    def overlap_start(self, i: int, j: int, overlap: int) -> int:
+        """Smallest k in (i, j] whose tail [k, j) fits in `overlap` tokens."""
+        if overlap <= 0:
+            return j
+        if self.length_fn is None:
+            return max(j - overlap, i + 1)
+        lo, hi = max(i + 1, j - overlap), j
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self(mid, j) <= overlap:
+                hi = mid
+            else:
+                lo = mid + 1
+        return lo
+
+
+def _windows(
+    measure: _Measure, lo: int, hi: int, max_tokens: int, overlap: int
+) -> Iterator[Tuple[int, int]]:
+    i = lo
+    while i < hi:
+        j = measure.longest_fit(i, hi, max_tokens)
+        yield i, j
+        if j >= hi:
+            return
+        i = measure.overlap_start(i, j, overlap)
+
+
+def _pack(
+    measure: _Measure, bounds: List[int], max_tokens: int
+) -> List[Tuple[int, int]]:
+    """Merges consecutive sections while the merged text fits one chunk."""
+    groups: List[Tuple[int, int]] = []
+    for lo, hi in zip(bounds, bounds[1:]):
+        if lo >= hi:
+            continue
+        # Word count bounds the token count, so skip measuring hopeless merges
+        if (
+            groups
+            and hi - groups[-1][0] <= max_tokens
+            and measure(groups[-1][0], hi) <= max_tokens
+        ):
+            groups[-1] = (groups[-1][0], hi)
+        else:
+            groups.append((lo, hi))
+    return groups
+
+
+def chunk_spans(
+    text: str,
+    max_tokens: int = 750,
+    overlap_tokens: int = 100,
+    length_fn: Optional[LengthFn] = None,
+    split_headings: bool = True,
+) -> np.ndarray:
+    """(start, end) character offsets of each chunk, shape (n, 2).
+
+    `max_tokens`/`overlap_tokens` are measured with `length_fn` (words when
+    None). With `split_headings`, windows stay within markdown sections.
+    """
+    max_tokens = max(1, max_tokens)
+    overlap_tokens = max(0, min(overlap_tokens, max_tokens - 1))
+
+    starts, ends = word_offsets(text)
+    n = len(starts)
+    if not n:
+        return np.empty((0, 2), dtype=np.int64)
+    measure = _Measure(text, starts, ends, length_fn)
+
+    if split_headings:
+        groups = _pack(measure, section_bounds(text, starts), max_tokens)
+    else:
+        groups = [(0, n)]
+
+    windows = [
+        (i, j)
+        for lo, hi in groups
+        for i, j in _windows(measure, lo, hi, max_tokens, overlap_tokens)
+    ]
+    first, last = np.array(windows, dtype=np.int64).T
+    return np.stack((starts[first], ends[last - 1]), axis=1)
+
+
+def slice_chunks(text: str, spans: np.ndarray) -> List[Chunk]:
+    return [(text[start:end], start, end) for start, end in spans.tolist()]
+
+
+def chunk_document(
+    text: str,
+    max_tokens: int = 750,
+    overlap_tokens: int = 100,
+    length_fn: Optional[LengthFn] = None,
+    split_headings: bool = True,
+) -> List[Chunk]:
+    """Splits text into (chunk_text, char_start, char_end) windows."""
+    spans = chunk_spans(text, max_tokens, overlap_tokens, length_fn, split_headings)
+    return slice_chunks(text, spans)
+
+
+def load_length_function(spec: Optional[str]) -> Optional[LengthFn]:
+    """Builds a token length function from a spec string.
+
+    - "" / "words": whitespace words (None, the fast path)
+    - "tiktoken:<encoding>": tiktoken encoding, e.g. tiktoken:cl100k_base
+    - "hf:<model or path>": Hugging Face `tokenizers` tokenizer
+    """
+    if not spec or spec == "words":
+        return None
+    kind, _, name = spec.partition(":")
+    if kind == "tiktoken":
+        import tiktoken
+
+        encoding = tiktoken.get_encoding(name or "cl100k_base")
+        return lambda s: len(encoding.encode_ordinary(s))
+    if kind == "hf":
+        from tokenizers import Tokenizer
+
+        if name.endswith(".json"):
+            tokenizer = Tokenizer.from_file(name)
+        else:
+            tokenizer = Tokenizer.from_pretrained(name)
+        return lambda s: len(tokenizer.encode(s, add_special_tokens=False).ids)
+    raise ValueError(f"Unknown tokenizer spec: {spec!r}")
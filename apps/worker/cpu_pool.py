@@ -0,0 +1,146 @@
+"""Process pool for the worker's CPU-bound stage work.
+
+Pipeline stages run on threads, which is right for the network and database
+stages. Pure-Python CPU work (reading and normalizing text files, chunking,
+PDF text layers), however, would share one GIL across every in-flight
+document. `CpuPool` runs that work in worker processes sized to the cores;
+the stage threads only wait on the result.
+
+Large texts are not pickled into a task. They are written once into a shared
+memory block (UTF-8) that the child maps and decodes. Chunking sends back
+only the (start, end) offsets as a small int array, and the parent slices the
+chunk strings out of its own copy of the text. Texts shorter than `min_chars`
+are handled in the calling thread, where the IPC round-trip would cost more
+than it saves.
+"""
+
+import functools
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+
+from chunking import Chunk, LengthFn, chunk_spans, load_length_function, slice_chunks
+
+
+class SharedText:
+    """A text copied into a shared memory block; unlinked on exit."""
+
+    def __init__(self, text: str):
+        data = text.encode("utf-8", "surrogatepass")
+        self.size = len(data)
+        self.shm = SharedMemory(create=True, size=max(1, self.size))
+        self.shm.buf[: self.size] = data
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    def __enter__(self) -> "SharedText":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.shm.close()
+        self.shm.unlink()
+
+
+def _attach_text(name: str, size: int) -> str:
+    # track=False: the parent owns (and unlinks) the block
+    shm = SharedMemory(name=name, track=False)
+    try:
+        return bytes(shm.buf[:size]).decode("utf-8", "surrogatepass")
+    finally:
+        shm.close()
+
+
+@functools.lru_cache(maxsize=4)
+def _length_fn(tokenizer: Optional[str]) -> Optional[LengthFn]:
+    """Tokenizers are loaded once per process."""
+    return load_length_function(tokenizer)
+
+
+def _chunk_task(
+    name: str,
+    size: int,
+    max_tokens: int,
+    overlap_tokens: int,
+    tokenizer: Optional[str],
+    split_headings: bool,
+) -> np.ndarray:
+    return chunk_spans(
+        _attach_text(name, size),
+        max_tokens,
+        overlap_tokens,
+        _length_fn(tokenizer),
+        split_headings,
+    )
+
+
+def read_text(path: str, max_chars: int) -> str:
+    """Text file contents, truncated and with every line stripped."""
+    try:
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+            data = f.read(max_chars)
+    except Exception:
+        # Fallback to binary read and decode
+        with open(path, "rb") as f:
+            raw = f.read()
+        data = raw.decode("utf-8", errors="ignore")[:max_chars]
+    return "\n".join(line.strip() for line in data.splitlines())
+
+
+class CpuPool:
+    def __init__(self, processes: int, min_chars: int = 20_000):
+        self.min_chars = min_chars
+        self.executor: Optional[Executor] = None
+        if processes > 0:
+            # Spawned, not forked: the worker process already runs threads
+            self.executor = ProcessPoolExecutor(
+                processes, mp_context=multiprocessing.get_context("spawn")
+            )
+
+    def chunk(
+        self,
+        text: str,
+        max_tokens: int,
+        overlap_tokens: int,
+        tokenizer: Optional[str] = None,
+        split_headings: bool = True,
+    ) -> List[Chunk]:
+        if self.executor is None or len(text) < self.min_chars:
+            spans = chunk_spans(
+                text, max_tokens, overlap_tokens, _length_fn(tokenizer), split_headings
+            )
+        else:
+            with SharedText(text) as shared:
+                spans = self.executor.submit(
+                    _chunk_task,
+                    shared.name,
+                    shared.size,
+                    max_tokens,
+                    overlap_tokens,
+                    tokenizer,
+                    split_headings,
+                ).result()
+        return slice_chunks(text, spans)
+
+    def read_text(self, path: Path, max_chars: int) -> str:
+        if self.executor is None or path.stat().st_size < self.min_chars:
+            return read_text(str(path), max_chars)
+        return self.executor.submit(read_text, str(path), max_chars).result()
+
+    def shutdown(self) -> None:
+        if self.executor is not None:
+            self.executor.shutdown()
+
+
+def build_cpu_pool() -> CpuPool:
+    """Pool configured from the environment (see .env.example)."""
+    return CpuPool(
+        int(os.getenv("CPU_PROCESSES") or os.cpu_count() or 1),
+        min_chars=int(os.getenv("CPU_OFFLOAD_MIN_CHARS", "20000")),
+    )
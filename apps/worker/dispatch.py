@@ -0,0 +1,178 @@
+"""Event-driven wake-ups for the embedding worker.
+
+`DocumentWatcher` tails the documents collection with a change stream and
+sets a `threading.Event` whenever a document becomes `pending` (new upload
+or requeue). The dispatch loop waits on that event instead of sleeping, so
+new work is claimed as soon as it lands. The stream's resume token is
+persisted in the worker state collection, so a restarted worker picks up
+where it left off.
+
+Change streams need a replica set (or sharded cluster). On a standalone
+server the watcher disables itself and the loop degrades to polling every
+`poll_interval` seconds.
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+logger = logging.getLogger("worker.dispatch")
+
+# Server error codes meaning "change streams are not available here"
+_UNSUPPORTED_CODES = {40573, 40324, 136}
+# The stored resume token fell off the oplog (ChangeStreamHistoryLost)
+_HISTORY_LOST_CODES = {286, 280}
+
+PENDING_PIPELINE: List[Dict[str, Any]] = [
+    {
+        "$match": {
+            "$or": [
+                {
+                    "operationType": {"$in": ["insert", "replace"]},
+                    "fullDocument.embedding_status": "pending",
+                },
+                {
+                    "operationType": "update",
+                    "updateDescription.updatedFields.embedding_status": "pending",
+                },
+            ]
+        }
+    },
+    # Keep only what is needed to wake up (and _id, which is the resume token)
+    {"$project": {"operationType": 1, "documentKey": 1}},
+]
+
+
+class DocumentWatcher:
+    """Background change-stream listener that signals pending work."""
+
+    def __init__(
+        self,
+        documents_col,
+        state_col,
+        wake: threading.Event,
+        max_await_ms: int = 1000,
+        token_save_interval: float = 30.0,
+    ):
+        self.documents_col = documents_col
+        self.state_col = state_col
+        self.wake = wake
+        self.max_await_ms = max_await_ms
+        self.token_save_interval = token_save_interval
+        self.state_id = f"change_stream:{documents_col.name}"
+        self.available = True
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def active(self) -> bool:
+        return (
+            self.available and self._thread is not None and self._thread.is_alive()
+        )
+
+    def start(self) -> None:
+        self._thread = threading.Thread(
+            target=self._run, name="change-stream", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5.0)
+
+    def _load_token(self) -> Optional[Dict[str, Any]]:
+        try:
+            state = self.state_col.find_one({"_id": self.state_id})
+        except PyMongoError as e:
+            logger.warning("Could not load resume token: %s", e)
+            return None
+        return state.get("resume_token") if state else None
+
+    def _save_token(self, token: Optional[Dict[str, Any]]) -> None:
+        if token is None:
+            return
+        try:
+            self.state_col.update_one(
+                {"_id": self.state_id},
+                {
+                    "$set": {
+                        "resume_token": token,
+                        "updated_at": datetime.now(timezone.utc),
+                    }
+                },
+                upsert=True,
+            )
+        except PyMongoError as e:
+            logger.warning("Could not save resume token: %s", e)
+
+    def _clear_token(self) -> None:
+        try:
+            self.state_col.delete_one({"_id": self.state_id})
+        except PyMongoError:
+            pass
+
+    def _run(self) -> None:
+        token = self._load_token()
+        backoff = 1.0
+        while not self._stop.is_set():
+            try:
+                with self.documents_col.watch(
+                    PENDING_PIPELINE,
+                    resume_after=token,
+                    max_await_time_ms=self.max_await_ms,
+                ) as stream:
+                    logger.info(
+                        "Watching '%s' for pending documents (resumed=%s)",
+                        self.documents_col.name,
+                        token is not None,
+                    )
+                    # Anything queued while we were down is picked up by the
+                    # dispatch loop's first sweep; wake it once to be sure.
+                    self.wake.set()
+                    backoff = 1.0
+                    saved_at = time.monotonic()
+                    while not self._stop.is_set():
+                        change = stream.try_next()
+                        token = stream.resume_token
+                        if change is not None:
+                            logger.debug(
+                                "Change event: op=%s _id=%s",
+                                change.get("operationType"),
+                                (change.get("documentKey") or {}).get("_id"),
+                            )
+                            self.wake.set()
+                        # Idle streams still advance the token (post-batch
+                        # token); persist it now and then so it never ages
+                        # out of the oplog.
+                        if (
+                            change is not None
+                            or time.monotonic() - saved_at >= self.token_save_interval
+                        ):
+                            self._save_token(token)
+                            saved_at = time.monotonic()
+            except OperationFailure as e:
+                if e.code in _UNSUPPORTED_CODES:
+                    logger.warning(
+                        "Change streams unavailable (%s); falling back to polling",
+                        e,
+                    )
+                    self.available = False
+                    return
+                if e.code in _HISTORY_LOST_CODES and token is not None:
+                    logger.warning("Resume token expired; watching from now on")
+                    token = None
+                    self._clear_token()
+                    continue
+                logger.error("Change stream error: %s", e)
+            except PyMongoError as e:
+                logger.error("Change stream error: %s", e)
+
+            # Transient failure: retry with backoff, polling meanwhile
+            self.wake.set()
+            self._stop.wait(backoff)
+            backoff = min(backoff * 2, 30.0)
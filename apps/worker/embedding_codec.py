@@ -0,0 +1,73 @@
+"""Packed on-disk encoding for chunk embeddings.
+
+schema_version 1 (or missing): `embedding` is a BSON array of doubles.
+schema_version 2: `embedding` is BSON binary holding little-endian values in
+`embedding_encoding` (float32 | float16 | int8). int8 vectors are symmetric-
+quantized and carry `embedding_scale` (value = int8 * scale).
+
+The API decodes the same layout in pagemate.tools.vector.decode_embedding;
+keep both in sync.
+"""
+
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from bson.binary import Binary
+
+CHUNK_SCHEMA_VERSION = 2
+
+ENCODINGS: Dict[str, str] = {
+    "float32": "<f4",
+    "float16": "<f2",
+    "int8": "i1",
+}
+
+# Fields written by encode_embedding (useful for projections)
+EMBEDDING_FIELDS: List[str] = [
+    "embedding",
+    "embedding_encoding",
+    "embedding_scale",
+    "schema_version",
+]
+
+
+def encode_embedding(vec: Sequence[float], encoding: str = "float32") -> Dict[str, Any]:
+    """Return the chunk fields that store `vec` in the packed format."""
+    if encoding not in ENCODINGS:
+        raise ValueError(f"Unsupported embedding encoding: {encoding}")
+    arr = np.asarray(vec, dtype=np.float32)
+    fields: Dict[str, Any] = {
+        "schema_version": CHUNK_SCHEMA_VERSION,
+        "embedding_encoding": encoding,
+    }
+    if encoding == "int8":
+        peak = float(np.max(np.abs(arr))) if arr.size else 0.0
+        scale = peak / 127.0 if peak > 0 else 1.0
+        packed = np.clip(np.rint(arr / scale), -127, 127).astype(ENCODINGS[encoding])
+        fields["embedding_scale"] = scale
+    else:
+        packed = arr.astype(ENCODINGS[encoding])
+    fields["embedding"] = Binary(packed.tobytes())
+    return fields
+
+
+def decode_embedding(doc: Dict[str, Any]) -> Optional[np.ndarray]:
+    """Return the chunk embedding as a float32 array (None if absent).
+
+    Raises ValueError for a malformed embedding (unknown encoding, or a byte
+    length that is not a multiple of the item size).
+    """
+    raw = doc.get("embedding")
+    if raw is None:
+        return None
+    if isinstance(raw, (bytes, bytearray, memoryview)):
+        encoding = doc.get("embedding_encoding") or "float32"
+        if encoding not in ENCODINGS:
+            raise ValueError(f"Unsupported embedding encoding: {encoding}")
+        arr = np.frombuffer(raw, dtype=ENCODINGS[encoding])
+        if encoding == "int8":
+            return arr.astype(np.float32) * np.float32(doc.get("embedding_scale", 1.0))
+        return arr.astype(np.float32, copy=False)
+    if isinstance(raw, list):
+        return np.asarray(raw, dtype=np.float32)
+    return None
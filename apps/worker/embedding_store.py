@@ -0,0 +1,101 @@
+"""Content-addressed store of chunk embeddings.
+
+Entries live in the `embedding_store` collection, keyed by
+`<model>:<sha256(chunk text)>`, and hold the vector in the packed chunk
+format (see embedding_codec) plus a `refcount`: the number of chunk rows,
+across all documents and tenants, that carry the same `content_hash`.
+
+The worker looks chunks up before embedding, so only unseen text reaches
+the provider. Writing a document's chunks acquires references for the new
+set before releasing the old one, so text shared by both never drops to
+zero in between. An entry is deleted only once its refcount reaches zero.
+The API's document delete path releases references the same way
+(pagemate.clients.mongo.embedding_store); keep both in sync.
+"""
+
+import hashlib
+import logging
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List
+
+from pymongo import UpdateOne
+
+from embedding_codec import decode_embedding, encode_embedding
+
+logger = logging.getLogger("worker.embedding_store")
+
+STORE_COLLECTION = "embedding_store"
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def store_key(model: str, digest: str) -> str:
+    return f"{model}:{digest}"
+
+
+def lookup(store_col, keys: Iterable[str]) -> Dict[str, List[float]]:
+    """Returns the stored vectors for whichever of `keys` exist."""
+    keys = list(set(keys))
+    if not keys:
+        return {}
+    found: Dict[str, List[float]] = {}
+    for doc in store_col.find({"_id": {"$in": keys}, "refcount": {"$gt": 0}}):
+        try:
+            vec = decode_embedding(doc)
+        except (ValueError, TypeError) as e:
+            # Treated as missing: the text is embedded again
+            logger.warning("Skipping store entry %s: bad embedding: %s", doc["_id"], e)
+            continue
+        if vec is not None:
+            found[doc["_id"]] = vec.tolist()
+    return found
+
+
+def acquire(
+    store_col,
+    model: str,
+    vectors: Dict[str, List[float]],
+    counts: Counter,
+    encoding: str,
+) -> None:
+    """Adds `counts[digest]` references per content hash, creating entries.
+
+    `vectors` maps content hash to vector (needed when the entry is new).
+    """
+    if not counts:
+        return
+    now = datetime.now(timezone.utc)
+    ops = [
+        UpdateOne(
+            {"_id": store_key(model, digest)},
+            {
+                "$inc": {"refcount": n},
+                "$set": {"last_used_at": now},
+                "$setOnInsert": {
+                    "model": model,
+                    "content_hash": digest,
+                    "created_at": now,
+                    **encode_embedding(vectors[digest], encoding),
+                },
+            },
+            upsert=True,
+        )
+        for digest, n in counts.items()
+    ]
+    store_col.bulk_write(ops, ordered=False)
+
+
+def release(store_col, model: str, counts: Counter) -> None:
+    """Drops `counts[digest]` references; deletes entries nobody references."""
+    if not counts:
+        return
+    keys = [store_key(model, digest) for digest in counts]
+    ops = [
+        UpdateOne({"_id": store_key(model, digest)}, {"$inc": {"refcount": -n}})
+        for digest, n in counts.items()
+    ]
+    store_col.bulk_write(ops, ordered=False)
+    store_col.delete_many({"_id": {"$in": keys}, "refcount": {"$lte": 0}})
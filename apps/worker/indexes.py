@@ -0,0 +1,74 @@
+"""Indexes behind the worker's (and the API's) hot queries.
+
+The declarations are shared with the API: keep INDEXES identical to
+pagemate.clients.mongo.indexes.INDEXES, which also lists the hot queries and
+reports any that run as a COLLSCAN (`moon run be:mongo-indexes`). Both sides
+create them on startup; `create_indexes` is a no-op for indexes that already
+exist, so replicas racing on it is harmless.
+
+Keys are the default collection names; the worker passes its configured
+collections (MONGO_DOCUMENTS_COLLECTION, MONGO_CHUNKS_COLLECTION).
+"""
+
+import logging
+from typing import Any, Dict, List
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+logger = logging.getLogger("worker.indexes")
+
+INDEXES: Dict[str, List[IndexModel]] = {
+    "documents": [
+        # Per-tenant document listing (sorted by created_at, skip/limit)
+        IndexModel(
+            [("tenant_id", ASCENDING), ("created_at", DESCENDING)],
+            name="tenant_id_created_at",
+        ),
+        # Claims: pending, or processing with an expired lease
+        IndexModel(
+            [("embedding_status", ASCENDING), ("lease_expires_at", ASCENDING)],
+            name="embedding_status_lease_expires_at",
+        ),
+        # requeue_one_failed
+        IndexModel(
+            [
+                ("embedding_status", ASCENDING),
+                ("next_retry_at", ASCENDING),
+                ("attempts", ASCENDING),
+            ],
+            name="embedding_status_next_retry_at_attempts",
+        ),
+        # Re-reading a claim by its token (only claimed documents have one)
+        IndexModel([("claim_token", ASCENDING)], name="claim_token", sparse=True),
+    ],
+    "document_chunks": [
+        # Tenant-wide reads/counts and incremental index sync (updated_at >= ...)
+        IndexModel(
+            [("tenant_id", ASCENDING), ("updated_at", ASCENDING)],
+            name="tenant_id_updated_at",
+        ),
+        # Per-document reads/deletes and generation flips (gen_from/gen_to)
+        IndexModel(
+            [
+                ("document_id", ASCENDING),
+                ("tenant_id", ASCENDING),
+                ("gen_from", ASCENDING),
+            ],
+            name="document_id_tenant_id_gen_from",
+        ),
+    ],
+    "tenants": [
+        IndexModel([("name", ASCENDING)], name="name"),
+    ],
+}
+
+
+def ensure_indexes(collections: Dict[str, Any]) -> None:
+    """Creates the declared indexes on {default name: collection}.
+
+    Raises OperationFailure if an index with the same name but a different
+    definition exists.
+    """
+    for name, col in collections.items():
+        created = col.create_indexes(INDEXES[name])
+        logger.info("Ensured indexes on %s: %s", col.name, ", ".join(created))
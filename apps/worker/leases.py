@@ -0,0 +1,256 @@
+"""Lease-based job claiming for the embedding worker.
+
+A claim grabs up to N documents in three round trips, whatever N is:
+
+1. find the ids of up to N claimable documents,
+2. `update_many` them to `processing` under a fresh `claim_token`, with
+   `worker_id` and `lease_expires_at` set (the filter re-checks eligibility,
+   so two workers never win the same document),
+3. read back the documents carrying our token.
+
+A document is claimable when it is `pending`, or when it is `processing` but
+its lease has expired (the worker holding it died). Taking over an expired
+lease counts as an attempt, so a document that keeps killing its worker
+(crash, OOM) is marked `failed` once it has used up `max_attempts` instead of
+being reclaimed forever. `LeaseHeartbeat`
+keeps the leases of in-flight documents alive. Final status writes should be
+fenced with `owned_filter`, so a worker whose lease was taken over cannot
+overwrite the new owner's result.
+"""
+
+import logging
+import os
+import socket
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from pymongo.errors import PyMongoError
+
+logger = logging.getLogger("worker.leases")
+
+LEASE_FIELDS = ("worker_id", "claim_token", "lease_expires_at")
+
+
+def default_worker_id() -> str:
+    return os.getenv("WORKER_ID") or f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _expired(now: datetime, lease_seconds: float) -> Dict[str, Any]:
+    """`processing` documents whose worker stopped renewing the lease."""
+    return {
+        "embedding_status": "processing",
+        "$or": [
+            {"lease_expires_at": {"$lte": now}},
+            # Claimed before leases existed: treat as expired after one lease
+            {
+                "lease_expires_at": {"$exists": False},
+                "started_at": {"$lte": now - timedelta(seconds=lease_seconds)},
+            },
+        ],
+    }
+
+
+def _under_limit(max_attempts: int) -> Dict[str, Any]:
+    return {
+        "$or": [
+            {"attempts": {"$exists": False}},
+            {"attempts": {"$lt": max_attempts}},
+        ]
+    }
+
+
+def _claimable(
+    now: datetime, lease_seconds: float, max_attempts: int
+) -> Dict[str, Any]:
+    return {
+        "$or": [
+            {"embedding_status": "pending"},
+            {"$and": [_expired(now, lease_seconds), _under_limit(max_attempts)]},
+        ]
+    }
+
+
+def fail_exhausted(
+    doc_col, now: datetime, lease_seconds: float, max_attempts: int
+) -> int:
+    """Marks expired claims that used up their attempts as failed."""
+    res = doc_col.update_many(
+        {
+            "$and": [
+                _expired(now, lease_seconds),
+                {"attempts": {"$gte": max_attempts}},
+            ]
+        },
+        {
+            "$set": {
+                "embedding_status": "failed",
+                "error": "Worker lost while processing (lease expired "
+                f"after {max_attempts} attempt(s))",
+                "failed_at": now,
+                "updated_at": now,
+            },
+            "$unset": release_fields(),
+        },
+    )
+    if res.modified_count:
+        logger.warning(
+            "Failed %d document(s) whose lease expired too often", res.modified_count
+        )
+    return res.modified_count
+
+
+def claim_batch(
+    doc_col,
+    limit: int,
+    worker_id: str,
+    lease_seconds: float,
+    max_attempts: int = 3,
+) -> List[Dict[str, Any]]:
+    """Atomically claims up to `limit` documents for `worker_id`."""
+    if limit <= 0:
+        return []
+    now = datetime.now(timezone.utc)
+    claimable = _claimable(now, lease_seconds, max_attempts)
+    try:
+        fail_exhausted(doc_col, now, lease_seconds, max_attempts)
+        candidates = list(
+            doc_col.find(claimable, projection={"embedding_status": 1}).limit(limit)
+        )
+        if not candidates:
+            logger.debug("No pending document to claim")
+            return []
+
+        token = uuid.uuid4().hex
+        claim = {
+            "$set": {
+                "embedding_status": "processing",
+                "worker_id": worker_id,
+                "claim_token": token,
+                "lease_expires_at": now + timedelta(seconds=lease_seconds),
+                "started_at": now,
+                "updated_at": now,
+            }
+        }
+        pending = [d["_id"] for d in candidates if d["embedding_status"] == "pending"]
+        reclaim = [d["_id"] for d in candidates if d["embedding_status"] != "pending"]
+        modified = 0
+        if pending:
+            modified += doc_col.update_many(
+                {"_id": {"$in": pending}, "embedding_status": "pending"}, claim
+            ).modified_count
+        if reclaim:
+            # The previous owner died mid-attempt: that attempt counts
+            modified += doc_col.update_many(
+                {
+                    "$and": [
+                        {"_id": {"$in": reclaim}},
+                        _expired(now, lease_seconds),
+                        _under_limit(max_attempts),
+                    ]
+                },
+                {**claim, "$inc": {"attempts": 1}},
+            ).modified_count
+        if not modified:
+            return []
+        docs = list(doc_col.find({"claim_token": token}))
+        logger.info(
+            "Claimed %d document(s) (%d candidate(s), %d reclaimed) for %s",
+            len(docs),
+            len(candidates),
+            len(reclaim),
+            worker_id,
+        )
+        return docs
+    except PyMongoError as e:
+        logger.error("Mongo error while claiming: %s", e)
+        return []
+
+
+def owned_filter(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Filter matching the document only while our claim on it stands."""
+    filt: Dict[str, Any] = {"_id": doc.get("_id")}
+    token = doc.get("claim_token")
+    if token:
+        filt["claim_token"] = token
+    return filt
+
+
+def release_fields() -> Dict[str, str]:
+    """`$unset` spec dropping the lease once a job is finished."""
+    return {field: "" for field in LEASE_FIELDS}
+
+
+class LeaseHeartbeat:
+    """Extends the leases of the documents this worker is processing."""
+
+    def __init__(
+        self,
+        doc_col,
+        worker_id: str,
+        lease_seconds: float,
+        interval: Optional[float] = None,
+    ):
+        self.doc_col = doc_col
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds
+        self.interval = interval or max(1.0, lease_seconds / 3)
+        self._held: Dict[Any, str] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def hold(self, doc: Dict[str, Any]) -> None:
+        with self._lock:
+            self._held[doc["_id"]] = doc.get("claim_token", "")
+
+    def release(self, doc: Dict[str, Any]) -> None:
+        with self._lock:
+            self._held.pop(doc["_id"], None)
+
+    def start(self) -> None:
+        self._thread = threading.Thread(
+            target=self._run, name="lease-heartbeat", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5.0)
+
+    def beat(self) -> int:
+        """Pushes every held lease forward; returns the number still owned."""
+        with self._lock:
+            held = list(self._held.items())
+        if not held:
+            return 0
+        now = datetime.now(timezone.utc)
+        try:
+            res = self.doc_col.update_many(
+                {
+                    "$or": [{"_id": _id, "claim_token": token} for _id, token in held],
+                    "embedding_status": "processing",
+                    "worker_id": self.worker_id,
+                },
+                {
+                    "$set": {
+                        "lease_expires_at": now
+                        + timedelta(seconds=self.lease_seconds)
+                    }
+                },
+            )
+        except PyMongoError as e:
+            logger.warning("Lease heartbeat failed: %s", e)
+            return 0
+        if res.matched_count < len(held):
+            logger.warning(
+                "Lost %d lease(s); another worker may have reclaimed them",
+                len(held) - res.matched_count,
+            )
+        return res.matched_count
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.beat()
@@ -1,14 +1,14 @@
 import os
-import re
 
 import sys
+import threading
 import time
 import logging
-from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from collections import Counter
+from dataclasses import dataclass, field
 from datetime import datetime, timezone, timedelta
 from typing import Any, Dict, Optional, List, Tuple
 
-import requests
 from pymongo import MongoClient, ReturnDocument
 from pymongo.errors import PyMongoError
 from openai import OpenAI
@@ -16,6 +16,24 @@ from pathlib import Path
 
 import dotenv
 
+import embedding_store
+import indexes
+import leases
+import reindex
+from batcher import EmbeddingBatcher
+from cpu_pool import CpuPool, build_cpu_pool
+from dispatch import DocumentWatcher
+from parsing import TransientParseError, build_parser
+from pdf_extract import PdfExtractor, build_pdf_extractor
+from sources import (
+    ResolvedSource,
+    SourceResolver,
+    SourceUnavailable,
+    build_source_resolver,
+)
+from pipeline import Pipeline, Stage
+from embedding_codec import encode_embedding
+
 dotenv.load_dotenv()
 
 # Module-level logger (configured in setup_logging())
@@ -89,28 +107,10 @@ def get_chunks_collection(db: Any):
     return db[name]
 
 
-def claim_pending(doc_col) -> Optional[Dict[str, Any]]:
-    try:
-        now = utc_now()
-        doc = doc_col.find_one_and_update(
-            {"embedding_status": "pending"},
-            {
-                "$set": {
-                    "embedding_status": "processing",
-                    "started_at": now,
-                    "updated_at": now,
-                }
-            },
-            return_document=ReturnDocument.AFTER,
-        )
-        if doc:
-            logger.info("Claimed pending document: _id=%s", _short_id(doc.get("_id")))
-        else:
-            logger.debug("No pending document to claim")
-        return doc
-    except PyMongoError as e:
-        logger.error("Mongo error while claiming: %s", e)
-        return None
+def get_state_collection(db: Any):
+    name = os.getenv("MONGO_WORKER_STATE_COLLECTION", "worker_state")
+    logger.debug("Using worker state collection: %s", name)
+    return db[name]
 
 
 def read_dotted(obj: Dict[str, Any], dotted: str) -> Optional[Any]:
@@ -123,36 +123,28 @@ def read_dotted(obj: Dict[str, Any], dotted: str) -> Optional[Any]:
     return cur
 
 
-def download_file_from_api(tenant_id: str, document_id: str, obj_path: str) -> bool:
-    """Download file from API to local path. Returns True if successful."""
-    import urllib.request
-    import urllib.error
-
-    api_url = f"https://api.pagemate.app/tenants/{tenant_id}/documents/{document_id}/attachment"
-
-    try:
-        logger.debug("Downloading file from API: %s", api_url)
-
-        # Create directory if it doesn't exist
-        Path(obj_path).parent.mkdir(parents=True, exist_ok=True)
+@dataclass
+class EmbeddingJob:
+    """A claimed document travelling through the pipeline stages."""
 
-        # Download the file
-        urllib.request.urlretrieve(api_url, obj_path)
-        logger.debug("Successfully downloaded file to: %s", obj_path)
-        return True
+    doc: Dict[str, Any]
+    text: Optional[str] = None
+    source: Optional[Path] = None
+    ext: str = ""
+    resolved: Optional[ResolvedSource] = None
+    pieces: List[Tuple[str, int, int]] = field(default_factory=list)
+    vectors: List[List[float]] = field(default_factory=list)
+    hashes: List[str] = field(default_factory=list)
 
-    except urllib.error.URLError as e:
-        logger.warning("Failed to download file from API: %s", e)
-        return False
-    except Exception as e:
-        logger.warning("Error downloading file: %s", e)
-        return False
+    @property
+    def doc_id(self) -> Any:
+        return self.doc.get("_id")
 
 
-def extract_text_for_embedding(doc_or_task: Dict[str, Any], documents_col) -> str:
+def _inline_text(doc: Dict[str, Any]) -> Optional[str]:
     preferred_field = os.getenv("EMBEDDING_TEXT_FIELD")
     if preferred_field:
-        val = read_dotted(doc_or_task, preferred_field)
+        val = read_dotted(doc, preferred_field)
         if isinstance(val, str) and val.strip():
             logger.debug(
                 "Text extracted from preferred field '%s' (len=%d)",
@@ -162,162 +154,115 @@ def extract_text_for_embedding(doc_or_task: Dict[str, Any], documents_col) -> st
             return val
 
     for key in ("text", "content", "input"):
-        v = doc_or_task.get(key)
+        v = doc.get(key)
         if isinstance(v, str) and v.strip():
             logger.debug("Text extracted from key '%s' (len=%d)", key, len(v))
             return v
+    return None
 
-    # If we already have the object_path in the payload, prefer it
-    obj_path = doc_or_task.get("object_path")
-    if isinstance(obj_path, str) and obj_path:
-        logger.debug("Attempting text extraction from provided object_path")
-        from pathlib import Path
-
-        p = Path(obj_path)
 
-        try:
-            # Download file from server
-            tenant_id = doc_or_task.get("tenant_id")
-            document_id = doc_or_task.get("_id") or doc_or_task.get("document_id")
-
-            download_success = download_file_from_api(tenant_id, document_id, str(p))
-            if not download_success:
-                raise Exception(f"Failed to download file to {p}")
-
-            ext = p.suffix.lower()
-            if not ext:
-                # Infer from document name when path has no extension
-                name = str(doc_or_task.get("name", ""))
-                if "." in name:
-                    ext = "." + name.rsplit(".", 1)[-1].lower()
-            if ext == ".pdf":
-                text = extract_text_from_pdf(p)
-            elif ext in (".txt", ".md"):
-                text = extract_text_from_txt(p)
-            else:
-                text = None
-        except Exception as e:
-            logger.debug("Direct extraction via object_path failed: %s", e)
-            text = None
-        finally:
-            # Clean up downloaded file
-            if p.exists():
-                try:
-                    p.unlink()
-                    logger.debug("Cleaned up downloaded file: %s", p)
-                except Exception as e:
-                    logger.warning("Failed to clean up downloaded file %s: %s", p, e)
-
-        if isinstance(text, str) and text.strip():
-            logger.debug("Text extracted (len=%d) via object_path", len(text))
-            return text
-
-    # Otherwise, determine the source document id and fetch
-    doc_id = doc_or_task.get("_id") or doc_or_task.get("document_id")
-    if doc_id is not None:
-        logger.debug("Attempting text extraction for document_id=%s", _short_id(doc_id))
-        text = try_extract_text_from_document(documents_col, doc_id)
-        if isinstance(text, str) and text.strip():
-            logger.debug(
-                "Text extracted (len=%d) for document_id=%s",
-                len(text),
-                _short_id(doc_id),
-            )
-            return text
-
-    raise ValueError("No text available for embedding")
-
-
-def try_extract_text_from_document(documents_col, doc_id: Any) -> Optional[str]:
-    enable = os.getenv("PDF_EXTRACT_ENABLE", "true").lower() in (
-        "1",
-        "true",
-        "yes",
-        "y",
-    )
-    src = documents_col.find_one(
-        {"_id": doc_id}, projection={"object_path": 1, "name": 1}
+def _source_ext(path: Path, name: str) -> str:
+    # Infer from document name when path has no extension
+    return path.suffix.lower() or (
+        "." + name.rsplit(".", 1)[-1].lower() if "." in name else ""
     )
-    if not src:
-        logger.warning(
-            "Extraction: source document not found: _id=%s", _short_id(doc_id)
-        )
-        return None
-    obj_path = src.get("object_path")
-    name = str(src.get("name", ""))
-    if not isinstance(obj_path, str) or not obj_path:
-        logger.debug("Extraction: missing object_path for _id=%s", _short_id(doc_id))
-        return None
-
-    path = Path(obj_path)
-    if not path.exists() or not path.is_file():
-        logger.warning(
-            "Extraction: path not found %s for _id=%s", path, _short_id(doc_id)
-        )
-        return None
 
-    ext = path.suffix.lower() or (
-        "." + name.rsplit(".", 1)[-1].lower() if "." in name else ""
+
+def fetch_source(
+    job: EmbeddingJob, documents_col, resolver: SourceResolver
+) -> EmbeddingJob:
+    """Fetch stage: inline text, else the stored file (local or downloaded)."""
+    doc = job.doc
+    job.text = _inline_text(doc)
+    if job.text is not None:
+        return job
+
+    src = doc
+    if not doc.get("object_path"):
+        # Otherwise, determine the source document id and look the file up
+        doc_id = doc.get("_id") or doc.get("document_id")
+        src = documents_col.find_one(
+            {"_id": doc_id},
+            projection={"object_path": 1, "name": 1, "sha256": 1, "tenant_id": 1},
+        ) or {}
+    if not src.get("object_path"):
+        raise ValueError("No text available for embedding")
+
+    # Never the canonical file's owner: only private downloads get discarded
+    job.resolved = resolver.resolve(src)
+    job.source = job.resolved.path
+    job.ext = _source_ext(Path(src["object_path"]), str(src.get("name", "")))
+    logger.debug(
+        "Source for document_id=%s: %s (%s)",
+        _short_id(job.doc_id),
+        job.source,
+        "downloaded" if job.resolved.temporary else "local",
     )
-    try:
-        if ext == ".pdf":
-            if not enable:
-                logger.debug("PDF extraction disabled via env")
-                return None
-            logger.info("Extracting text from PDF: path=%s", path)
-            return extract_text_from_pdf(path)
-        if ext in (".txt", ".md"):
-            logger.info("Extracting text from TXT: path=%s", path)
-            return extract_text_from_txt(path)
-        logger.debug(
-            "Extraction: unsupported extension '%s' for _id=%s", ext, _short_id(doc_id)
-        )
-        return None
-    except Exception as e:
-        logger.error("Extraction failed for %s: %s", path, e)
-        return None
-
-
-def extract_text_from_pdf(path: Path) -> str:
-    api_key = os.getenv("OPENAI_API_KEY")
-
-    url = "https://api.upstage.ai/v1/document-digitization"
-    headers = {"Authorization": f"Bearer {api_key}"}
-    files = {"document": open(path, "rb")}
-    data = {
-        "model": "document-parse-250618",
-        "ocr": "auto",
-        "chart_recognition": False,
-        "coordinates": False,
-        "output_formats": '["markdown"]',
-        "base64_encoding": '["figure"]',
-    }
+    return job
 
-    response = requests.post(url, headers=headers, files=files, data=data)
-    response = response.json()
 
-    content = response["content"]["markdown"]
+def parse_source(
+    job: EmbeddingJob,
+    documents_col,
+    pdf_extractor: PdfExtractor,
+    cpu: CpuPool,
+    resolver: SourceResolver,
+) -> EmbeddingJob:
+    """Parse stage: turn the fetched file into text."""
+    if job.text is None and job.source is not None:
+        path = job.source
+        try:
+            if job.ext == ".pdf":
+                if os.getenv("PDF_EXTRACT_ENABLE", "true").lower() not in (
+                    "1",
+                    "true",
+                    "yes",
+                    "y",
+                ):
+                    raise ValueError("PDF extraction disabled via env")
+                logger.info("Extracting text from PDF: path=%s", path)
+                job.text = pdf_extractor.extract(path)
+            elif job.ext in (".txt", ".md"):
+                logger.info("Extracting text from TXT: path=%s", path)
+                job.text = extract_text_from_txt(path, cpu)
+            else:
+                raise ValueError(f"Unsupported extension '{job.ext}'")
+        finally:
+            # Clean up a private download (stored files are left alone)
+            if job.resolved is not None:
+                resolver.discard(job.resolved)
 
-    image_pattern = r"!\[.*?\]\(.*?\)"
-    content = re.sub(image_pattern, "", content)
+    if not isinstance(job.text, str) or not job.text.strip():
+        raise ValueError("No text available for embedding")
+    logger.debug(
+        "Text extracted (len=%d) for document_id=%s",
+        len(job.text),
+        _short_id(job.doc_id),
+    )
 
-    return content
+    # Optionally persist the resolved text onto the embedding document (truncated)
+    if os.getenv("EMBEDDING_SAVE_TEXT", "false").lower() in ("1", "true", "yes", "y"):
+        try:
+            max_save = int(os.getenv("EMBEDDING_MAX_TEXT_SAVE_CHARS", "4000"))
+            save_text = job.text[:max_save]
+            documents_col.update_one(
+                {"_id": job.doc_id},
+                {"$set": {"text": save_text, "updated_at": utc_now()}},
+            )
+            logger.debug(
+                "Saved text snapshot to document _id=%s (len=%d)",
+                _short_id(job.doc_id),
+                len(save_text),
+            )
+        except Exception:
+            pass
+    return job
 
 
-def extract_text_from_txt(path: Path) -> str:
+def extract_text_from_txt(path: Path, cpu: CpuPool) -> str:
     max_chars = int(os.getenv("TEXT_EXTRACT_MAX_CHARS", "100000"))
-    try:
-        with path.open("r", encoding="utf-8", errors="ignore") as f:
-            data = f.read()
-    except Exception:
-        # Fallback to binary read and decode
-        with path.open("rb") as f:
-            raw = f.read()
-        data = raw.decode("utf-8", errors="ignore")
-    if len(data) > max_chars:
-        data = data[:max_chars]
-    # Normalize whitespace similar to PDF extraction
-    data = "\n".join(line.strip() for line in data.splitlines())
+    # Read and whitespace-normalized in a worker process for large files
+    data = cpu.read_text(path, max_chars)
     logger.info("TXT extraction completed: chars=%d", len(data))
     return data
 
@@ -382,61 +327,6 @@ def requeue_one_failed(doc_col) -> bool:
         return False
 
 
-def _words_with_spans(text: str) -> List[Tuple[str, int, int]]:
-    """Split text into tokens and return (token, start, end) spans.
-    Uses a simple regex to approximate tokens and positions.
-    """
-    import re
-
-    spans: List[Tuple[str, int, int]] = []
-    for m in re.finditer(r"\S+", text):
-        s, e = m.span()
-        spans.append((text[s:e], s, e))
-    return spans
-
-
-def _chunk_text_tokens(
-    text: str,
-    max_tokens: int = 750,
-    overlap_tokens: int = 100,
-) -> List[Tuple[str, int, int]]:
-    """Chunk text by token count with token-span-derived char offsets.
-
-    Returns list of tuples: (chunk_text, char_start, char_end)
-    """
-    max_tokens = max(1, max_tokens)
-    overlap_tokens = max(0, min(overlap_tokens, max_tokens - 1))
-
-    toks = _words_with_spans(text)
-    if not toks:
-        return []
-
-    chunks: List[Tuple[str, int, int]] = []
-    i = 0
-    n = len(toks)
-    logger.debug(
-        "Chunking text: tokens=%d, max_tokens=%d, overlap_tokens=%d",
-        n,
-        max_tokens,
-        overlap_tokens,
-    )
-    while i < n:
-        j = min(n, i + max_tokens)
-        token_slice = toks[i:j]
-        start_char = token_slice[0][1]
-        end_char = token_slice[-1][2]
-        chunk_text = text[start_char:end_char]
-        if chunk_text.strip():
-            chunks.append((chunk_text, start_char, end_char))
-        if j >= n:
-            break
-        i = j - overlap_tokens
-        if i < 0:
-            i = 0
-    logger.info("Chunked text into %d chunk(s)", len(chunks))
-    return chunks
-
-
 def _embed_batch(client: OpenAI, model: str, texts: List[str]) -> List[List[float]]:
     if not texts:
         return []
@@ -449,190 +339,306 @@ def _embed_batch(client: OpenAI, model: str, texts: List[str]) -> List[List[floa
     return [item.embedding for item in resp.data]  # type: ignore[attr-defined]
 
 
-def create_chunks_for_document(
-    documents_col,
-    doc: Dict[str, Any],
-    full_text: str,
-    client: OpenAI,
+def chunk_text(job: EmbeddingJob, cpu: CpuPool) -> EmbeddingJob:
+    """Chunk stage (CPU, in the process pool): token-budgeted, heading-aware."""
+    # Only chunk-level embeddings to avoid context limit errors
+    if os.getenv("CHUNK_ENABLE", "true").lower() in ("1", "true", "yes", "y"):
+        job.pieces = cpu.chunk(
+            job.text or "",
+            max_tokens=int(os.getenv("CHUNK_MAX_TOKENS", "750")),
+            overlap_tokens=int(os.getenv("CHUNK_OVERLAP_TOKENS", "100")),
+            # e.g. tiktoken:cl100k_base or hf:<tokenizer.json>; default counts words
+            tokenizer=os.getenv("CHUNK_TOKENIZER") or None,
+            split_headings=os.getenv("CHUNK_SPLIT_HEADINGS", "true").lower()
+            in ("1", "true", "yes", "y"),
+        )
+        logger.info(
+            "Chunked document_id=%s into %d chunk(s)",
+            _short_id(job.doc_id),
+            len(job.pieces),
+        )
+        if not job.pieces:
+            logger.warning(
+                "No chunk pieces generated for document_id=%s", _short_id(job.doc_id)
+            )
+    return job
+
+
+def embed_chunks(
+    job: EmbeddingJob,
+    batcher: EmbeddingBatcher,
+    store_col,
     model: str,
-) -> None:
-    # The document itself is the task source
-    doc_id = doc.get("_id")
+) -> EmbeddingJob:
+    """Embed stage: reuse stored vectors, batch-embed only unseen chunk text."""
+    texts = [t[0] for t in job.pieces]
+    job.hashes = [embedding_store.content_hash(t) for t in texts]
+
+    by_hash: Dict[str, List[float]] = {}
+    if store_col is not None:
+        found = embedding_store.lookup(
+            store_col, (embedding_store.store_key(model, h) for h in job.hashes)
+        )
+        by_hash = {key.rsplit(":", 1)[1]: vec for key, vec in found.items()}
+
+    # Identical texts within the document are embedded once
+    missing: Dict[str, str] = {}
+    for h, text in zip(job.hashes, texts):
+        if h not in by_hash:
+            missing.setdefault(h, text)
+    if missing:
+        by_hash.update(zip(missing, batcher.embed(list(missing.values()))))
+
+    if texts:
+        logger.info(
+            "Embeddings for document_id=%s: chunks=%d reused=%d embedded=%d",
+            _short_id(job.doc_id),
+            len(texts),
+            len(texts) - sum(1 for h in job.hashes if h in missing),
+            len(missing),
+        )
+    job.vectors = [by_hash[h] for h in job.hashes]
+    return job
+
+
+def write_chunks(
+    job: EmbeddingJob, documents_col, store_col, model: str
+) -> EmbeddingJob:
+    """Write stage: publish the document's new chunk generation (see reindex)."""
+    doc = job.doc
+    doc_id = job.doc_id
     if not doc_id:
         logger.warning("Missing _id on document; skipping chunk creation")
-        return
+        return job
     tenant_id = doc.get("tenant_id")
-    if not tenant_id:
-        logger.warning(
-            "Missing tenant_id for document_id=%s; skipping chunks", _short_id(doc_id)
-        )
-        return
 
-    chunks_col = get_chunks_collection(documents_col.database)
-    # Remove existing chunks for idempotency
-    delete_res = chunks_col.delete_many({"document_id": doc_id})
-    try:
-        logger.debug(
-            "Deleted existing chunks for document_id=%s: count=%s",
-            _short_id(doc_id),
-            getattr(delete_res, "deleted_count", "?"),
+    staged: Optional[reindex.ChunkPlan] = None
+    if tenant_id:
+        # Always stage a generation, even an empty one: text that re-parses to
+        # nothing must retire every live chunk
+        chunks_col = get_chunks_collection(documents_col.database)
+        encoding = os.getenv("EMBEDDING_STORAGE_ENCODING", "float32")
+        # Chunks store document_id as a string; the document _id may be an ObjectId
+        doc_id_str = str(doc_id)
+        generation = int(doc.get("chunk_generation") or 0)
+        incremental = os.getenv("REINDEX_MODE", "incremental").lower() != "full"
+
+        stale_refs = reindex.rollback_unpublished(chunks_col, doc_id_str, generation)
+        stored = reindex.load_live(chunks_col, doc_id_str)
+        plan = reindex.plan_chunks(
+            stored, job.pieces, job.hashes, model, generation + 1, incremental
         )
-    except Exception:
-        pass
 
-    # Prefer token-based chunking to respect embedding context limits
-    pieces = _chunk_text_tokens(full_text)
-    if not pieces:
-        logger.warning(
-            "No chunk pieces generated for document_id=%s", _short_id(doc_id)
-        )
-        return
+        # Take references for the inserted rows before any are released, so
+        # text shared with the retired rows never reaches refcount zero
+        if store_col is not None:
+            embedding_store.acquire(
+                store_col,
+                model,
+                dict(zip(job.hashes, job.vectors)),
+                Counter(job.hashes[pos] for pos in plan.inserts),
+                encoding,
+            )
+            for old_model, counts in stale_refs.items():
+                embedding_store.release(store_col, old_model, counts)
 
-    # Embed in batches to avoid large requests
-    batch_size = int(os.getenv("CHUNK_EMBED_BATCH_SIZE", "16"))
-    doc_id_str = str(doc_id)
-    logger.info(
-        "Creating chunks: document_id=%s, total_pieces=%d, batch_size=%d",
-        _short_id(doc_id_str),
-        len(pieces),
-        batch_size,
-    )
-    now = utc_now()
-    docs: List[Dict[str, Any]] = []
-    idx_global = 0
-    for bstart in range(0, len(pieces), batch_size):
-        bend = min(len(pieces), bstart + batch_size)
-        batch = pieces[bstart:bend]
-        texts = [t[0] for t in batch]
-        vecs = _embed_batch(client, model, texts)
-        for (txt, start, end), vec in zip(batch, vecs):
-            docs.append(
+        now = utc_now()
+        new_rows: List[Dict[str, Any]] = []
+        for pos in plan.inserts:
+            txt, start, end = job.pieces[pos]
+            new_rows.append(
                 {
-                    "_id": f"{doc_id_str}:{idx_global}",
+                    "_id": f"{doc_id_str}:{plan.generation}:{pos}",
                     "document_id": doc_id_str,
                     "tenant_id": tenant_id,
-                    "index": idx_global,
+                    "index": pos,
                     "text": txt,
-                    "embedding": vec,
+                    **encode_embedding(job.vectors[pos], encoding),
+                    "content_hash": job.hashes[pos],
+                    "embedding_model": model,
+                    "gen_from": plan.generation,
                     "char_start": start,
                     "char_end": end,
                     "created_at": now,
                     "updated_at": now,
                 }
             )
-            idx_global += 1
+        reindex.stage_generation(chunks_col, plan, new_rows)
+        logger.info(
+            "Staged chunks: document_id=%s, %s",
+            _short_id(doc_id_str),
+            plan.summary(),
+        )
+        staged = plan
+    elif job.pieces:
+        logger.warning(
+            "Missing tenant_id for document_id=%s; skipping chunks", _short_id(doc_id)
+        )
 
-    if docs:
-        insert_res = chunks_col.insert_many(docs)
-        try:
-            logger.info(
-                "Inserted chunks: document_id=%s, count=%d",
-                _short_id(doc_id_str),
-                len(getattr(insert_res, "inserted_ids", []) or docs),
+    # Mark task completed (document-level embedding is optional per schema).
+    # Flipping chunk_generation in the same write publishes the new chunk set.
+    completed: Dict[str, Any] = {
+        "embedding_status": "completed",
+        "error": None,
+        "completed_at": utc_now(),
+        "updated_at": utc_now(),
+    }
+    if staged is not None:
+        completed["chunk_generation"] = staged.generation
+    res = documents_col.update_one(
+        leases.owned_filter(doc),
+        {
+            "$set": completed,
+            "$unset": {"embedding": "", **leases.release_fields()},
+        },
+    )
+    if staged is not None:
+        if not res.matched_count:
+            # Lease lost: the new owner rolls our unpublished rows back
+            logger.warning(
+                "Lost claim on document %s; generation %d not published",
+                _short_id(doc_id),
+                staged.generation,
             )
-        except Exception:
-            pass
-
-
-def process_embedding(
-    documents_col, doc: Dict[str, Any], client: OpenAI, model: str
-) -> None:
-    emb_id = doc.get("_id")
-    logger.info("Processing document embedding: _id=%s", _short_id(emb_id))
-    try:
-        text = extract_text_for_embedding(doc, documents_col)
-        # Optionally persist the resolved text onto the embedding document (truncated)
-        if os.getenv("EMBEDDING_SAVE_TEXT", "false").lower() in (
-            "1",
-            "true",
-            "yes",
-            "y",
-        ):
-            try:
-                max_save = int(os.getenv("EMBEDDING_MAX_TEXT_SAVE_CHARS", "4000"))
-                save_text = text[:max_save]
-                documents_col.update_one(
-                    {"_id": emb_id},
-                    {"$set": {"text": save_text, "updated_at": utc_now()}},
-                )
-                logger.debug(
-                    "Saved text snapshot to document _id=%s (len=%d)",
-                    _short_id(emb_id),
-                    len(save_text),
-                )
-            except Exception:
-                pass
-    except Exception as e:
+            return job
+        reindex.finish_generation(chunks_col, str(doc_id), staged.generation)
+        if store_col is not None:
+            for old_model, counts in reindex.retired_hash_counts(staged).items():
+                embedding_store.release(store_col, old_model, counts)
+    logger.info("Completed embedding for document %s (chunked)", _short_id(doc_id))
+    return job
+
+
+# Failures before any text exists are permanent; later ones are retried
+_INVALID_PAYLOAD_STAGES = ("fetch", "parse")
+# ...except these, which a later attempt may get past
+_TRANSIENT_ERRORS = (TransientParseError, SourceUnavailable)
+
+
+def mark_failed(documents_col, stage: str, job: EmbeddingJob, e: BaseException) -> None:
+    """Pipeline error hook: record the failure (with retry backoff if transient)."""
+    doc = job.doc
+    emb_id = job.doc_id
+    if stage in _INVALID_PAYLOAD_STAGES and not isinstance(e, _TRANSIENT_ERRORS):
         logger.error("Document %s: invalid payload: %s", _short_id(emb_id), e)
         try:
             documents_col.update_one(
-                {"_id": emb_id},
+                leases.owned_filter(doc),
                 {
                     "$set": {
                         "embedding_status": "failed",
                         "error": str(e),
                         "failed_at": utc_now(),
                         "updated_at": utc_now(),
-                    }
+                    },
+                    "$unset": leases.release_fields(),
                 },
             )
         except Exception:
             pass
         return
 
+    logger.error(
+        "Embedding for document %s failed in %s: %s", _short_id(emb_id), stage, e
+    )
     try:
-        # Only chunk-level embeddings to avoid context limit errors
-        if os.getenv("CHUNK_ENABLE", "true").lower() in ("1", "true", "yes", "y"):
-            logger.debug("Chunking+embedding enabled for _id=%s", _short_id(emb_id))
-            create_chunks_for_document(
-                documents_col=documents_col,
-                doc=doc,
-                full_text=text,
-                client=client,
-                model=model,
-            )
-
-        # Mark task completed (document-level embedding is optional per schema)
+        attempts_prev = int(doc.get("attempts", 0) or 0)
+        attempts = attempts_prev + 1
+        next_retry = compute_next_retry(utc_now(), attempts)
         documents_col.update_one(
-            {"_id": emb_id},
+            leases.owned_filter(doc),
             {
                 "$set": {
-                    "embedding_status": "completed",
-                    "error": None,
-                    "completed_at": utc_now(),
+                    "embedding_status": "failed",
+                    "error": f"{type(e).__name__}: {e}",
+                    "failed_at": utc_now(),
                     "updated_at": utc_now(),
+                    "attempts": attempts,
+                    "next_retry_at": next_retry,
                 },
-                "$unset": {"embedding": ""},
+                "$unset": leases.release_fields(),
             },
         )
-        logger.info("Completed embedding for document %s (chunked)", _short_id(emb_id))
-    except Exception as e:
-        logger.error("Embedding for document %s failed: %s", _short_id(emb_id), e)
-        try:
-            attempts_prev = int(doc.get("attempts", 0) or 0)
-            attempts = attempts_prev + 1
-            next_retry = compute_next_retry(utc_now(), attempts)
-            documents_col.update_one(
-                {"_id": emb_id},
-                {
-                    "$set": {
-                        "embedding_status": "failed",
-                        "error": f"{type(e).__name__}: {e}",
-                        "failed_at": utc_now(),
-                        "updated_at": utc_now(),
-                        "attempts": attempts,
-                        "next_retry_at": next_retry,
-                    }
-                },
-            )
-            logger.warning(
-                "Scheduled retry for _id=%s attempts=%d next_retry_at=%s",
-                _short_id(emb_id),
-                attempts,
-                next_retry.isoformat(),
-            )
-        except Exception:
-            pass
+        logger.warning(
+            "Scheduled retry for _id=%s attempts=%d next_retry_at=%s",
+            _short_id(emb_id),
+            attempts,
+            next_retry.isoformat(),
+        )
+    except Exception:
+        pass
+
+
+def build_batcher(client: OpenAI, model: str) -> EmbeddingBatcher:
+    """Shared batcher sized by the provider limits (see .env.example)."""
+    return EmbeddingBatcher(
+        lambda texts: _embed_batch(client, model, texts),
+        max_inputs=int(os.getenv("EMBED_MAX_INPUTS", "100")),
+        token_budget=int(os.getenv("EMBED_TOKEN_BUDGET", "150000")),
+        max_wait_seconds=float(os.getenv("EMBED_MAX_WAIT_MS", "50")) / 1000,
+        max_inflight=int(os.getenv("EMBED_MAX_INFLIGHT", "4")),
+    )
+
+
+def build_pipeline(
+    documents_col,
+    batcher: EmbeddingBatcher,
+    pdf_extractor: PdfExtractor,
+    cpu: CpuPool,
+    resolver: SourceResolver,
+    model: str,
+    on_finish=None,
+) -> Pipeline:
+    """fetch → parse → chunk → embed → write, each with its own worker pool."""
+    store_col = None
+    if os.getenv("EMBEDDING_DEDUP_ENABLE", "true").lower() in ("1", "true", "yes", "y"):
+        store_col = documents_col.database[embedding_store.STORE_COLLECTION]
+
+    def workers(stage: str, default: int) -> int:
+        return int(os.getenv(f"PIPELINE_{stage.upper()}_WORKERS", str(default)))
+
+    queue_size = int(os.getenv("PIPELINE_QUEUE_SIZE", "4"))
+    stages = [
+        Stage(
+            "fetch",
+            lambda job: fetch_source(job, documents_col, resolver),
+            workers("fetch", 4),
+            queue_size,
+        ),
+        Stage(
+            "parse",
+            lambda job: parse_source(
+                job, documents_col, pdf_extractor, cpu, resolver
+            ),
+            workers("parse", 4),
+            queue_size,
+        ),
+        Stage(
+            "chunk",
+            lambda job: chunk_text(job, cpu),
+            # Threads only wait on the process pool
+            workers("chunk", 4),
+            queue_size,
+        ),
+        Stage(
+            "embed",
+            lambda job: embed_chunks(job, batcher, store_col, model),
+            # Threads only wait on the batcher; more of them = fuller requests
+            workers("embed", 8),
+            queue_size,
+        ),
+        Stage(
+            "write",
+            lambda job: write_chunks(job, documents_col, store_col, model),
+            workers("write", 2),
+            queue_size,
+        ),
+    ]
+    return Pipeline(
+        stages,
+        on_error=lambda stage, job, e: mark_failed(documents_col, stage, job, e),
+        on_finish=on_finish,
+    )
 
 
 def _short_id(val: Any) -> str:
@@ -660,80 +666,138 @@ def main() -> None:
         "https://api.upstage.ai/v1",
     )
     concurrency = int(os.getenv("WORKER_CONCURRENCY", "8"))
-
-    def run_polling_loop():
+    worker_id = leases.default_worker_id()
+    lease_seconds = float(os.getenv("LEASE_SECONDS", "120"))
+    # Shared by failure retries and reclaims of expired leases
+    max_attempts = int(os.getenv("RETRY_FAILED_MAX_ATTEMPTS", "3"))
+    if os.getenv("MONGO_ENSURE_INDEXES", "true").lower() in ("1", "true", "yes", "y"):
+        try:
+            indexes.ensure_indexes(
+                {"documents": documents_col, "document_chunks": chunks_col}
+            )
+        except PyMongoError as e:
+            logger.warning("Could not ensure indexes: %s", e)
+    heartbeat = leases.LeaseHeartbeat(documents_col, worker_id, lease_seconds)
+    heartbeat.start()
+
+    wake = threading.Event()
+
+    def on_finish(job: EmbeddingJob) -> None:
+        heartbeat.release(job.doc)
+        # A finished document frees a slot: wake to refill it
+        wake.set()
+
+    batcher = build_batcher(oa_client, embedding_model)
+    batcher.start()
+    # One pooled connection per parse thread
+    parser = build_parser(
+        openai_api_key, pool_size=int(os.getenv("PIPELINE_PARSE_WORKERS", "4"))
+    )
+    # CPU-bound stage work (text files, chunking, PDF text layers)
+    cpu = build_cpu_pool()
+    pdf_extractor = build_pdf_extractor(parser, cpu.executor)
+    # Stored files are read in place when the storage volume is shared
+    resolver = build_source_resolver(
+        pool_size=int(os.getenv("PIPELINE_FETCH_WORKERS", "4"))
+    )
+    resolver.prune()
+    pipeline = build_pipeline(
+        documents_col,
+        batcher,
+        pdf_extractor,
+        cpu,
+        resolver,
+        embedding_model,
+        on_finish=on_finish,
+    )
+    pipeline.start()
+    stats_interval = float(os.getenv("PIPELINE_STATS_INTERVAL", "60"))
+
+    watcher: Optional[DocumentWatcher] = None
+    if os.getenv("WATCH_ENABLE", "true").lower() in ("1", "true", "yes", "y"):
+        watcher = DocumentWatcher(documents_col, get_state_collection(db), wake)
+        watcher.start()
+    # With a live change stream, idle sweeps only catch time-based retries
+    sweep_interval = float(os.getenv("WATCH_SWEEP_INTERVAL", "30.0"))
+
+    def idle_timeout() -> float:
+        if watcher is not None and watcher.active:
+            return sweep_interval
+        return poll_interval
+
+    def run_dispatch_loop():
         logger.info(
-            "Polling for pending documents every %.2fs with concurrency=%d",
-            poll_interval,
+            "Dispatching pending documents as %s with concurrency=%d "
+            "(lease=%.0fs, change stream=%s)",
+            worker_id,
             concurrency,
+            lease_seconds,
+            watcher is not None,
         )
-        with ThreadPoolExecutor(max_workers=concurrency) as executor:
-            inflight = set()
-            while True:
-                try:
-                    # Fill the pool up to the concurrency limit
-                    submitted = 0
-                    while len(inflight) < concurrency:
-                        emb = claim_pending(documents_col)
-                        if not emb:
-                            break
-                        fut = executor.submit(
-                            process_embedding,
-                            documents_col,
-                            emb,
-                            oa_client,
-                            embedding_model,
-                        )
-                        inflight.add(fut)
-                        submitted += 1
-                    if submitted:
-                        logger.debug(
-                            "Submitted %d task(s); inflight=%d",
-                            submitted,
-                            len(inflight),
-                        )
-
-                    if not inflight and submitted == 0:
-                        # Attempt to requeue a failed task if eligible
-                        if not requeue_one_failed(documents_col):
-                            logger.debug("Idle: sleeping for %.2fs", poll_interval)
-                            time.sleep(poll_interval)
+        stats_at = time.monotonic()
+        while True:
+            try:
+                # Clear before claiming: wake-ups that arrive while we
+                # claim are kept for the wait below
+                wake.clear()
+
+                # Keep up to `concurrency` documents in the pipeline
+                claimed = leases.claim_batch(
+                    documents_col,
+                    concurrency - pipeline.inflight,
+                    worker_id,
+                    lease_seconds,
+                    max_attempts,
+                )
+                for emb in claimed:
+                    heartbeat.hold(emb)
+                    pipeline.submit(EmbeddingJob(doc=emb))
+                if claimed:
+                    logger.debug(
+                        "Submitted %d document(s); inflight=%d",
+                        len(claimed),
+                        pipeline.inflight,
+                    )
+
+                if not pipeline.inflight and not claimed:
+                    # Attempt to requeue a failed task if eligible
+                    if requeue_one_failed(documents_col):
                         continue
 
-                    if inflight:
-                        done, _ = wait(
-                            inflight, timeout=poll_interval, return_when=FIRST_COMPLETED
-                        )
-                        # Drain completed futures
-                        for f in done:
-                            inflight.discard(f)
-                            exc = f.exception()
-                            if exc:
-                                logger.error(
-                                    "Worker task error: %s: %s", type(exc).__name__, exc
-                                )
-                        if done:
-                            logger.debug(
-                                "Completed %d future(s); inflight=%d",
-                                len(done),
-                                len(inflight),
-                            )
-                    else:
-                        # No work in flight; small pause to avoid tight loop
-                        logger.debug(
-                            "No work in flight; sleeping for %.2fs", poll_interval
-                        )
-                        time.sleep(poll_interval)
-                except KeyboardInterrupt:
-                    # Graceful shutdown
-                    logger.warning("Received interrupt; shutting down workers…")
-                    break
-                except Exception as e:
-                    logger.error("Polling loop error: %s", e)
-                    time.sleep(10.0)
-
-    run_polling_loop()
+                if time.monotonic() - stats_at >= stats_interval:
+                    pipeline.log_stats()
+                    batcher.log_stats()
+                    parser.log_stats()
+                    pdf_extractor.log_stats()
+                    stats_at = time.monotonic()
+
+                timeout = idle_timeout()
+                logger.debug("Waiting up to %.2fs for work", timeout)
+                wake.wait(timeout)
+            except KeyboardInterrupt:
+                # Graceful shutdown
+                logger.warning("Received interrupt; shutting down workers…")
+                break
+            except Exception as e:
+                logger.error("Dispatch loop error: %s", e)
+                time.sleep(10.0)
 
+    try:
+        run_dispatch_loop()
+    finally:
+        # Finish what was claimed (leases stay alive meanwhile)
+        pipeline.stop()
+        batcher.stop()
+        parser.close()
+        resolver.close()
+        cpu.shutdown()
+        pipeline.log_stats()
+        batcher.log_stats()
+        parser.log_stats()
+        pdf_extractor.log_stats()
+        heartbeat.stop()
+        if watcher is not None:
+            watcher.stop()
 
 if __name__ == "__main__":
     main()
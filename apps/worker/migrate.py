@@ -0,0 +1,133 @@
+import argparse
+import os
+import sys
+from typing import Any, Dict, List, Optional
+
+from pymongo import MongoClient, UpdateOne
+import dotenv
+
+from embedding_codec import CHUNK_SCHEMA_VERSION, ENCODINGS, encode_embedding
+
+dotenv.load_dotenv()
+
+
+def migrate_chunks(
+    chunks_col,
+    encoding: str,
+    batch_size: int,
+    tenant_id: Optional[str] = None,
+    dry_run: bool = False,
+) -> int:
+    """Rewrite float-array chunk embeddings into the packed binary format.
+
+    Walks the collection in _id order (keyset pagination) so updates never
+    disturb the cursor. Returns the number of chunks rewritten.
+    """
+    filt: Dict[str, Any] = {
+        "$or": [
+            {"schema_version": {"$exists": False}},
+            {"schema_version": {"$lt": CHUNK_SCHEMA_VERSION}},
+        ]
+    }
+    if tenant_id:
+        filt["tenant_id"] = tenant_id
+
+    migrated = 0
+    last_id: Any = None
+    while True:
+        page_filter = dict(filt)
+        if last_id is not None:
+            page_filter["_id"] = {"$gt": last_id}
+        batch = list(
+            chunks_col.find(page_filter, projection={"_id": 1, "embedding": 1})
+            .sort("_id", 1)
+            .limit(batch_size)
+        )
+        if not batch:
+            break
+        last_id = batch[-1]["_id"]
+
+        ops: List[UpdateOne] = []
+        for doc in batch:
+            vec = doc.get("embedding")
+            if not isinstance(vec, list) or not vec:
+                continue
+            ops.append(
+                UpdateOne(
+                    {"_id": doc["_id"], "embedding": {"$type": "array"}},
+                    {"$set": encode_embedding(vec, encoding)},
+                )
+            )
+        if ops and not dry_run:
+            res = chunks_col.bulk_write(ops, ordered=False)
+            migrated += res.modified_count
+        else:
+            migrated += len(ops)
+        print(f"- processed {len(batch)} chunk(s), rewritten so far: {migrated}")
+
+    return migrated
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Rewrite chunk embeddings into the packed binary format"
+    )
+    parser.add_argument(
+        "--mongo-url",
+        dest="mongo_url",
+        default=os.getenv("MONGO_URL"),
+        help="Mongo connection URI (env MONGO_URL)",
+    )
+    parser.add_argument(
+        "--mongo-db",
+        dest="mongo_db",
+        default=os.getenv("MONGO_DB"),
+        help="Mongo database name (env MONGO_DB)",
+    )
+    parser.add_argument(
+        "--chunks-collection",
+        dest="chunks_col_name",
+        default=os.getenv("MONGO_CHUNKS_COLLECTION", "document_chunks"),
+        help="Chunks collection name (default: document_chunks)",
+    )
+    parser.add_argument(
+        "--encoding",
+        choices=sorted(ENCODINGS),
+        default=os.getenv("EMBEDDING_STORAGE_ENCODING", "float32"),
+        help="Target encoding (default: env EMBEDDING_STORAGE_ENCODING or float32)",
+    )
+    parser.add_argument(
+        "--batch-size", type=int, default=500, help="Chunks per bulk write"
+    )
+    parser.add_argument("--tenant", dest="tenant_id", help="Only migrate one tenant")
+    parser.add_argument(
+        "--dry-run", action="store_true", help="Count chunks without writing"
+    )
+    args = parser.parse_args(argv)
+
+    if not args.mongo_url:
+        print(
+            "ERROR: MONGO_URL is required (flag --mongo-url or env MONGO_URL).",
+            file=sys.stderr,
+        )
+        return 2
+
+    client = MongoClient(args.mongo_url, tz_aware=True)
+    db = client[args.mongo_db] if args.mongo_db else client.get_default_database()
+    try:
+        migrated = migrate_chunks(
+            db[args.chunks_col_name],
+            encoding=args.encoding,
+            batch_size=args.batch_size,
+            tenant_id=args.tenant_id,
+            dry_run=args.dry_run,
+        )
+        verb = "Would rewrite" if args.dry_run else "Rewrote"
+        print(f"{verb} {migrated} chunk(s) to {args.encoding}")
+    finally:
+        client.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,367 @@
+"""Upstage document-parse client with a local parse cache.
+
+PDFs are uploaded as a streamed multipart body: the form fields, the file
+(read from disk in blocks) and the closing boundary are chained into one
+file-like object with a known length, so the upload never holds the whole
+document in memory. The body is seekable, which lets urllib3 rewind it when
+it retries a failed connection. Requests go through one pooled
+`requests.Session` with explicit connect/read timeouts.
+
+Parsed markdown is cached on disk under
+`<cache_dir>/<model>-<options digest>/<sha256[:2]>/<sha256>.md` (page subsets:
+`<sha256>-p<pages digest>.json`). It is keyed by the file content and the
+parse model/options, so retries and re-indexing of an unchanged file never
+pay for the parse call again. Entries are written
+to a temp file and renamed into place, so concurrent workers sharing the
+directory never see partial output.
+"""
+
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple
+
+import requests
+from pypdf import PdfReader, PdfWriter
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger("worker.parsing")
+
+PARSE_URL = "https://api.upstage.ai/v1/document-digitization"
+DEFAULT_MODEL = "document-parse-250618"
+DEFAULT_OPTIONS: Dict[str, str] = {
+    "ocr": "auto",
+    "chart_recognition": "false",
+    "coordinates": "false",
+    "output_formats": '["markdown"]',
+    "base64_encoding": '["figure"]',
+}
+
+_IMAGE = re.compile(r"!\[.*?\]\(.*?\)")
+_BLOCK_SIZE = 1 << 20
+
+
+class ParseError(ValueError):
+    """The document could not be parsed (bad file, rejected request)."""
+
+
+class TransientParseError(RuntimeError):
+    """The parse call failed for a reason worth retrying (timeout, 429, 5xx)."""
+
+
+def file_sha256(path: Path) -> str:
+    with path.open("rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+def open_pdf(path: Path) -> PdfReader:
+    reader = PdfReader(path)
+    if reader.is_encrypted:
+        # Owner-password-only PDFs open with an empty user password
+        reader.decrypt("")
+    return reader
+
+
+def write_page_subset(src: Path, pages: List[int], dest: Path) -> None:
+    """Copies pages (0-based) of `src` into a new PDF at `dest`."""
+    reader = open_pdf(src)
+    writer = PdfWriter()
+    for i in pages:
+        writer.add_page(reader.pages[i])
+    with dest.open("wb") as f:
+        writer.write(f)
+
+
+class MultipartFile(io.RawIOBase):
+    """multipart/form-data body streamed from a file on disk.
+
+    Seekable to any absolute position, so an HTTP retry can rewind it.
+    """
+
+    def __init__(
+        self,
+        fields: Dict[str, str],
+        file_field: str,
+        path: Path,
+        content_type: str = "application/octet-stream",
+    ):
+        super().__init__()
+        self.boundary = uuid.uuid4().hex
+        head = b"".join(
+            f'--{self.boundary}\r\nContent-Disposition: form-data; name="{k}"'
+            f"\r\n\r\n{v}\r\n".encode()
+            for k, v in fields.items()
+        )
+        head += (
+            f'--{self.boundary}\r\nContent-Disposition: form-data; name="{file_field}"'
+            f'; filename="{path.name}"\r\nContent-Type: {content_type}\r\n\r\n'
+        ).encode()
+        tail = f"\r\n--{self.boundary}--\r\n".encode()
+        self._file: BinaryIO = path.open("rb")
+        size = os.fstat(self._file.fileno()).st_size
+        # (start offset, length, reader) of each segment
+        self._segments: List[Tuple[int, int, Any]] = [
+            (0, len(head), io.BytesIO(head)),
+            (len(head), size, self._file),
+            (len(head) + size, len(tail), io.BytesIO(tail)),
+        ]
+        self.len = len(head) + size + len(tail)
+        self._pos = 0
+
+    @property
+    def content_type(self) -> str:
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += self.len
+        self._pos = max(0, min(offset, self.len))
+        return self._pos
+
+    def readinto(self, buf) -> int:
+        for start, length, reader in self._segments:
+            if start <= self._pos < start + length:
+                reader.seek(self._pos - start)
+                want = min(len(buf), start + length - self._pos)
+                n = reader.readinto(memoryview(buf)[:want]) or 0
+                self._pos += n
+                return n
+        return 0
+
+    def __iter__(self) -> Iterator[bytes]:
+        while chunk := self.read(_BLOCK_SIZE):
+            yield chunk
+
+    def close(self) -> None:
+        if not self.closed:
+            self._file.close()
+        super().close()
+
+
+class ParseCache:
+    """Parse results on disk, by namespace and a name starting with the sha256."""
+
+    def __init__(self, root: Path):
+        self.root = root
+
+    def _path(self, namespace: str, name: str) -> Path:
+        return self.root / namespace / name[:2] / name
+
+    def get(self, namespace: str, name: str) -> Optional[str]:
+        try:
+            text = self._path(namespace, name).read_text(encoding="utf-8")
+        except FileNotFoundError:
+            return None
+        return text
+
+    def put(self, namespace: str, name: str, text: str) -> None:
+        path = self._path(namespace, name)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp, path)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+
+
+@dataclass
+class ParseStats:
+    calls: int = 0
+    cache_hits: int = 0
+    bytes_uploaded: int = 0
+    seconds: float = 0.0
+
+
+class DocumentParser:
+    def __init__(
+        self,
+        api_key: str,
+        model: str = DEFAULT_MODEL,
+        options: Optional[Dict[str, str]] = None,
+        url: str = PARSE_URL,
+        connect_timeout: float = 10.0,
+        read_timeout: float = 300.0,
+        pool_size: int = 4,
+        cache: Optional[ParseCache] = None,
+    ):
+        self.model = model
+        self.options = dict(DEFAULT_OPTIONS if options is None else options)
+        self.url = url
+        self.timeout = (connect_timeout, read_timeout)
+        self.cache = cache
+        self.stats = ParseStats()
+        self._lock = threading.Lock()
+
+        self.session = requests.Session()
+        self.session.headers["Authorization"] = f"Bearer {api_key}"
+        # Only connection failures and throttling/unavailable replies are
+        # retried here; a read timeout means the parse may still be running
+        retry = Retry(
+            total=3,
+            connect=3,
+            read=0,
+            status=2,
+            backoff_factor=1.0,
+            status_forcelist=(429, 502, 503, 504),
+            allowed_methods=None,
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=max(1, pool_size), max_retries=retry
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    @property
+    def cache_namespace(self) -> str:
+        """Cache entries are only valid for the same model and request options."""
+        options = json.dumps(self.options, sort_keys=True).encode()
+        return f"{self.model}-{hashlib.sha256(options).hexdigest()[:8]}"
+
+    def parse_pdf(self, path: Path) -> str:
+        """Markdown of the PDF, with inline images removed."""
+        return _IMAGE.sub("", self.parse_markdown(path))
+
+    def parse_markdown(self, path: Path) -> str:
+        """Markdown of the whole document."""
+        return self._cached(path, ".md", lambda: _markdown(self._request(path)))
+
+    def parse_pages(self, path: Path, pages: List[int]) -> Dict[int, str]:
+        """Markdown of some pages (0-based), with inline images removed.
+
+        The pages are copied into a smaller PDF and sent as one request; the
+        response elements are mapped back to the original page indexes.
+        """
+
+        def request() -> str:
+            with tempfile.TemporaryDirectory() as tmp:
+                subset = Path(tmp) / path.name
+                write_page_subset(path, pages, subset)
+                return json.dumps(_markdown_by_page(self._request(subset), len(pages)))
+
+        selector = hashlib.sha256(",".join(map(str, pages)).encode()).hexdigest()
+        by_page = json.loads(self._cached(path, f"-p{selector[:12]}.json", request))
+        return {page: _IMAGE.sub("", md) for page, md in zip(pages, by_page)}
+
+    def _cached(self, path: Path, suffix: str, produce: Callable[[], str]) -> str:
+        if self.cache is None:
+            return produce()
+        name = file_sha256(path) + suffix
+        cached = self.cache.get(self.cache_namespace, name)
+        if cached is not None:
+            with self._lock:
+                self.stats.cache_hits += 1
+            logger.info("Parse cache hit: %s path=%s", name[:12], path)
+            return cached
+
+        value = produce()
+        try:
+            self.cache.put(self.cache_namespace, name, value)
+        except OSError as e:
+            logger.warning("Could not write parse cache entry: %s", e)
+        return value
+
+    def _request(self, path: Path) -> Dict[str, Any]:
+        fields = {"model": self.model, **self.options}
+        with MultipartFile(fields, "document", path, "application/pdf") as body:
+            try:
+                response = self.session.post(
+                    self.url,
+                    data=body,
+                    headers={"Content-Type": body.content_type},
+                    timeout=self.timeout,
+                )
+            except (requests.ConnectionError, requests.Timeout) as e:
+                raise TransientParseError(f"document-parse unreachable: {e}") from e
+            size = body.len
+
+        with self._lock:
+            self.stats.calls += 1
+            self.stats.bytes_uploaded += size
+            self.stats.seconds += response.elapsed.total_seconds()
+
+        if response.status_code == 429 or response.status_code >= 500:
+            raise TransientParseError(
+                f"document-parse HTTP {response.status_code}: {response.text[:200]}"
+            )
+        if not response.ok:
+            raise ParseError(
+                f"document-parse HTTP {response.status_code}: {response.text[:200]}"
+            )
+        try:
+            return response.json()
+        except ValueError as e:
+            raise ParseError(f"Unexpected document-parse response: {e}") from e
+
+    def log_stats(self) -> None:
+        with self._lock:
+            s = ParseStats(**vars(self.stats))
+        logger.info(
+            "parse: calls=%d cache_hits=%d uploaded=%.1fMiB api_time=%.1fs",
+            s.calls,
+            s.cache_hits,
+            s.bytes_uploaded / 2**20,
+            s.seconds,
+        )
+
+    def close(self) -> None:
+        self.session.close()
+
+
+def _markdown(response: Dict[str, Any]) -> str:
+    try:
+        return response["content"]["markdown"]
+    except (KeyError, TypeError) as e:
+        raise ParseError(f"Unexpected document-parse response: {e}") from e
+
+
+def _markdown_by_page(response: Dict[str, Any], pages: int) -> List[str]:
+    """Groups the response elements by their (1-based) page number."""
+    elements = response.get("elements")
+    if not isinstance(elements, list) or not elements:
+        # No layout elements: attribute everything to the first page
+        return [_markdown(response)] + [""] * (pages - 1)
+    by_page: List[List[str]] = [[] for _ in range(pages)]
+    for element in elements:
+        page = int(element.get("page") or 1) - 1
+        markdown = (element.get("content") or {}).get("markdown") or ""
+        if markdown and 0 <= page < pages:
+            by_page[page].append(markdown)
+    return ["\n\n".join(parts) for parts in by_page]
+
+
+def build_parser(api_key: str, pool_size: int = 4) -> DocumentParser:
+    """Parser configured from the environment (see .env.example)."""
+    cache_dir = os.getenv("PARSE_CACHE_DIR", ".cache/parse")
+    return DocumentParser(
+        api_key,
+        model=os.getenv("PARSE_MODEL", DEFAULT_MODEL),
+        connect_timeout=float(os.getenv("PARSE_CONNECT_TIMEOUT", "10")),
+        read_timeout=float(os.getenv("PARSE_READ_TIMEOUT", "300")),
+        pool_size=pool_size,
+        cache=ParseCache(Path(cache_dir)) if cache_dir else None,
+    )
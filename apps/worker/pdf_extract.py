@@ -0,0 +1,185 @@
+"""Local PDF text extraction with the remote parser as a per-page fallback.
+
+Born-digital PDFs carry a text layer that pypdf can read in milliseconds per
+page, so the remote document-parse call is only needed for the pages that do
+not have one. The pages are extracted in a process pool in ranges of
+`pages_per_task`, each task opening the PDF once. A page is kept local if
+its text is long enough and not garbled. Image-heavy pages need more text
+than that, since their content is mostly in the images.
+
+The remaining (scanned) pages are copied into one smaller PDF and sent to the
+remote parser. Its output is mapped back per page and merged in page order.
+A PDF with no usable text layer at all is sent whole, exactly as before.
+"""
+
+import logging
+import os
+import threading
+import unicodedata
+from concurrent.futures import Executor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from pypdf.errors import PyPdfError
+
+from parsing import DocumentParser, open_pdf
+
+logger = logging.getLogger("worker.pdf_extract")
+
+# (extracted text, number of embedded images) per page
+PageText = Tuple[str, int]
+
+
+def extract_page_range(path: str, start: int, stop: int) -> List[PageText]:
+    """Process-pool task: text and image count of pages [start, stop)."""
+    reader = open_pdf(Path(path))
+    out: List[PageText] = []
+    for i in range(start, stop):
+        page = reader.pages[i]
+        try:
+            text = page.extract_text() or ""
+        except Exception:
+            # A broken content stream only costs this page its text layer
+            text = ""
+        out.append((text, _image_count(page)))
+    return out
+
+
+def _image_count(page) -> int:
+    try:
+        xobjects = page["/Resources"].get_object().get("/XObject")
+        if xobjects is None:
+            return 0
+        return sum(
+            1
+            for ref in xobjects.get_object().values()
+            if ref.get_object().get("/Subtype") == "/Image"
+        )
+    except (KeyError, AttributeError, PyPdfError):
+        return 0
+
+
+def _garbled_ratio(text: str) -> float:
+    """Share of characters that come from fonts without a usable text mapping."""
+    if not text:
+        return 0.0
+    bad = sum(
+        1
+        for c in text
+        if c == "\ufffd"
+        or "\ue000" <= c <= "\uf8ff"
+        or (unicodedata.category(c) == "Cc" and not c.isspace())
+    )
+    return bad / len(text)
+
+
+@dataclass
+class ExtractStats:
+    documents: int = 0
+    local_pages: int = 0
+    remote_pages: int = 0
+    fallbacks: int = 0
+
+
+class PdfExtractor:
+    def __init__(
+        self,
+        parser: DocumentParser,
+        pool: Optional[Executor] = None,
+        min_chars: int = 100,
+        image_page_min_chars: int = 500,
+        max_garbled_ratio: float = 0.05,
+        pages_per_task: int = 16,
+        local: bool = True,
+    ):
+        self.parser = parser
+        self.pool = pool
+        self.min_chars = min_chars
+        self.image_page_min_chars = image_page_min_chars
+        self.max_garbled_ratio = max_garbled_ratio
+        self.pages_per_task = max(1, pages_per_task)
+        self.local = local
+        self.stats = ExtractStats()
+        self._lock = threading.Lock()
+
+    def has_text_layer(self, page: PageText) -> bool:
+        text, images = page
+        chars = len(text) - sum(1 for c in text if c.isspace())
+        if chars < self.min_chars:
+            return False
+        if images and chars < self.image_page_min_chars:
+            return False
+        return _garbled_ratio(text) <= self.max_garbled_ratio
+
+    def extract(self, path: Path) -> str:
+        """Text of the PDF: local text layer per page, remote parse for the rest."""
+        if not self.local:
+            return self.parser.parse_pdf(path)
+        try:
+            pages = self._local_pages(path)
+        except (PyPdfError, ValueError, OSError) as e:
+            logger.warning("Local PDF extraction failed for %s: %s", path, e)
+            pages = []
+
+        remote = [i for i, page in enumerate(pages) if not self.has_text_layer(page)]
+        whole = not pages or len(remote) == len(pages)
+        with self._lock:
+            self.stats.documents += 1
+            if whole:
+                self.stats.fallbacks += 1
+            else:
+                self.stats.local_pages += len(pages) - len(remote)
+                self.stats.remote_pages += len(remote)
+        if whole:
+            return self.parser.parse_pdf(path)
+
+        texts = [text for text, _ in pages]
+        if remote:
+            logger.info(
+                "PDF %s: %d/%d page(s) without a text layer go to document-parse",
+                path,
+                len(remote),
+                len(pages),
+            )
+            for i, markdown in self.parser.parse_pages(path, remote).items():
+                texts[i] = markdown
+        return "\n\n".join(t.strip() for t in texts if t.strip())
+
+    def _local_pages(self, path: Path) -> List[PageText]:
+        count = len(open_pdf(path).pages)
+        starts = list(range(0, count, self.pages_per_task))
+        stops = [min(count, s + self.pages_per_task) for s in starts]
+        if self.pool is None or len(starts) <= 1:
+            ranges = map(extract_page_range, [str(path)] * len(starts), starts, stops)
+        else:
+            ranges = self.pool.map(
+                extract_page_range, [str(path)] * len(starts), starts, stops
+            )
+        return [page for pages in ranges for page in pages]
+
+    def log_stats(self) -> None:
+        with self._lock:
+            s = ExtractStats(**vars(self.stats))
+        logger.info(
+            "pdf: documents=%d local_pages=%d remote_pages=%d whole_remote=%d",
+            s.documents,
+            s.local_pages,
+            s.remote_pages,
+            s.fallbacks,
+        )
+
+
+def build_pdf_extractor(
+    parser: DocumentParser, pool: Optional[Executor]
+) -> PdfExtractor:
+    """Extractor configured from the environment (see .env.example)."""
+    return PdfExtractor(
+        parser,
+        pool,
+        min_chars=int(os.getenv("PDF_TEXT_MIN_CHARS", "100")),
+        image_page_min_chars=int(os.getenv("PDF_IMAGE_PAGE_MIN_CHARS", "500")),
+        pages_per_task=int(os.getenv("PDF_PAGES_PER_TASK", "16")),
+        local=os.getenv("PDF_LOCAL_EXTRACT_ENABLE", "true").lower()
+        in ("1", "true", "yes", "y"),
+    )
@@ -0,0 +1,193 @@
+"""Bounded-queue stage pipeline for the embedding worker.
+
+Each `Stage` owns a queue and a fixed number of worker threads. A worker
+takes an item, runs the stage function and hands the result to the next
+stage's queue. Because every queue is bounded, a slow stage blocks the one
+before it (backpressure all the way up to `Pipeline.submit`), while stages
+themselves overlap: document B can be parsed while document A is embedded.
+
+A stage function returns the (usually mutated) item. If it raises, the
+item leaves the pipeline through `on_error`; after the last stage it
+leaves through `on_done`. `on_finish` runs after either and is used to
+wake the dispatch loop when a slot frees up.
+"""
+
+import logging
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger("worker.pipeline")
+
+_STOP = object()
+
+
+@dataclass
+class StageStats:
+    processed: int = 0
+    failed: int = 0
+    busy_seconds: float = 0.0
+    wait_seconds: float = 0.0
+
+
+class Stage:
+    def __init__(
+        self,
+        name: str,
+        fn: Callable[[Any], Any],
+        workers: int = 1,
+        queue_size: int = 4,
+    ):
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, workers)
+        self.queue: "queue.Queue[Any]" = queue.Queue(maxsize=max(1, queue_size))
+        self.stats = StageStats()
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+
+    def record(self, busy: float, wait: float, ok: bool) -> None:
+        with self._lock:
+            self.stats.busy_seconds += busy
+            self.stats.wait_seconds += wait
+            if ok:
+                self.stats.processed += 1
+            else:
+                self.stats.failed += 1
+
+
+class Pipeline:
+    def __init__(
+        self,
+        stages: List[Stage],
+        on_done: Optional[Callable[[Any], None]] = None,
+        on_error: Optional[Callable[[str, Any, BaseException], None]] = None,
+        on_finish: Optional[Callable[[Any], None]] = None,
+    ):
+        if not stages:
+            raise ValueError("Pipeline needs at least one stage")
+        self.stages = stages
+        self.on_done = on_done
+        self.on_error = on_error
+        self.on_finish = on_finish
+        self._inflight = 0
+        self._lock = threading.Lock()
+        self._started_at = time.monotonic()
+
+    @property
+    def inflight(self) -> int:
+        """Items submitted and not yet finished (in any stage)."""
+        with self._lock:
+            return self._inflight
+
+    def start(self) -> None:
+        self._started_at = time.monotonic()
+        for i, stage in enumerate(self.stages):
+            nxt = self.stages[i + 1] if i + 1 < len(self.stages) else None
+            for n in range(stage.workers):
+                t = threading.Thread(
+                    target=self._work,
+                    args=(stage, nxt),
+                    name=f"{stage.name}-{n}",
+                    daemon=True,
+                )
+                t.start()
+                stage._threads.append(t)
+
+    def submit(self, item: Any, timeout: Optional[float] = None) -> None:
+        """Enqueues an item; blocks while the first stage is full."""
+        with self._lock:
+            self._inflight += 1
+        try:
+            self.stages[0].queue.put((item, time.monotonic()), timeout=timeout)
+        except BaseException:
+            with self._lock:
+                self._inflight -= 1
+            raise
+
+    def stop(self) -> None:
+        """Drains every stage in order, then stops its workers."""
+        for stage in self.stages:
+            for _ in stage._threads:
+                stage.queue.put(_STOP)
+            for t in stage._threads:
+                t.join()
+            stage._threads.clear()
+
+    def _finish(self, item: Any) -> None:
+        with self._lock:
+            self._inflight -= 1
+        if self.on_finish is not None:
+            try:
+                self.on_finish(item)
+            except Exception as e:
+                logger.error("on_finish hook failed: %s", e)
+
+    def _work(self, stage: Stage, nxt: Optional[Stage]) -> None:
+        while True:
+            entry = stage.queue.get()
+            if entry is _STOP:
+                return
+            item, enqueued_at = entry
+            t0 = time.monotonic()
+            try:
+                result = stage.fn(item)
+            except Exception as e:
+                stage.record(time.monotonic() - t0, t0 - enqueued_at, ok=False)
+                if self.on_error is not None:
+                    try:
+                        self.on_error(stage.name, item, e)
+                    except Exception as hook_error:
+                        logger.error("on_error hook failed: %s", hook_error)
+                self._finish(item)
+                continue
+            stage.record(time.monotonic() - t0, t0 - enqueued_at, ok=True)
+
+            if nxt is not None:
+                # Blocks while the next stage is saturated (backpressure)
+                nxt.queue.put((result, time.monotonic()))
+                continue
+            if self.on_done is not None:
+                try:
+                    self.on_done(result)
+                except Exception as e:
+                    logger.error("on_done hook failed: %s", e)
+            self._finish(result)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Per-stage counters, throughput (items/s) and utilization (0..1)."""
+        elapsed = max(time.monotonic() - self._started_at, 1e-9)
+        out: Dict[str, Dict[str, float]] = {}
+        for stage in self.stages:
+            with stage._lock:
+                s = StageStats(**vars(stage.stats))
+            done = s.processed + s.failed
+            out[stage.name] = {
+                "workers": stage.workers,
+                "queued": stage.queue.qsize(),
+                "processed": s.processed,
+                "failed": s.failed,
+                "throughput": s.processed / elapsed,
+                "avg_seconds": s.busy_seconds / done if done else 0.0,
+                "avg_wait_seconds": s.wait_seconds / done if done else 0.0,
+                "utilization": s.busy_seconds / (elapsed * stage.workers),
+            }
+        return out
+
+    def log_stats(self) -> None:
+        for name, s in self.stats().items():
+            logger.info(
+                "stage=%s workers=%d queued=%d processed=%d failed=%d "
+                "throughput=%.2f/s avg=%.3fs wait=%.3fs util=%.0f%%",
+                name,
+                s["workers"],
+                s["queued"],
+                s["processed"],
+                s["failed"],
+                s["throughput"],
+                s["avg_seconds"],
+                s["avg_wait_seconds"],
+                s["utilization"] * 100,
+            )
@@ -0,0 +1,175 @@
+"""Incremental, generation-versioned rewrite of a document's chunks.
+
+Chunks carry a visibility range: a row is visible while
+`gen_from <= documents.chunk_generation < gen_to` (missing bounds are
+open). Re-processing a document at generation G prepares generation N=G+1
+next to the live rows, without touching what readers see:
+
+- chunks whose text and position are unchanged keep their row,
+- everything else is inserted with `gen_from=N` (text that only moved reuses
+  its stored vector; rows of the live generation are never rewritten, since
+  their offsets must stay valid until the flip),
+- rows not kept get `gen_to=N`.
+
+The caller then flips `chunk_generation` to N in the same update that marks
+the document completed. That single-document write is the atomic swap. After
+it, the retired rows are deleted (or, after a crash, on the next attempt:
+see rollback_unpublished). Readers (the API and its resident vector
+index) filter on the same range; keep them in sync with
+pagemate.clients.mongo.chunk.visible_filter.
+"""
+
+import logging
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger("worker.reindex")
+
+Piece = Tuple[str, int, int]
+
+STORED_PROJECTION = {
+    "_id": 1,
+    "index": 1,
+    "char_start": 1,
+    "char_end": 1,
+    "content_hash": 1,
+    "embedding_model": 1,
+}
+
+
+@dataclass
+class ChunkPlan:
+    generation: int
+    inserts: List[int] = field(default_factory=list)  # positions in the new set
+    retire: List[Dict[str, Any]] = field(default_factory=list)  # stored rows
+    unchanged: int = 0
+
+    def summary(self) -> str:
+        return (
+            f"generation={self.generation} insert={len(self.inserts)} "
+            f"retire={len(self.retire)} unchanged={self.unchanged}"
+        )
+
+
+def plan_chunks(
+    stored: List[Dict[str, Any]],
+    pieces: List[Piece],
+    hashes: List[str],
+    model: str,
+    generation: int,
+    incremental: bool = True,
+) -> ChunkPlan:
+    """Diffs the new chunk set against the stored live rows by content hash.
+
+    A stored row is kept for a new chunk with the same text (and embedding
+    model) at the same position and offsets. Rows written before content
+    hashes existed are never kept. With `incremental=False` nothing is kept
+    (full rewrite, still atomic).
+    """
+    plan = ChunkPlan(generation=generation)
+    pool: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    if incremental:
+        for row in stored:
+            if row.get("embedding_model", model) == model and row.get("content_hash"):
+                pool[row["content_hash"]].append(row)
+
+    matched = set()
+    # Same text at the same position needs no write at all
+    for pos, digest in enumerate(hashes):
+        rows = pool.get(digest)
+        same = next((r for r in rows or [] if r.get("index") == pos), None)
+        if same is not None and _same_span(same, pieces[pos]):
+            rows.remove(same)
+            matched.add(same["_id"])
+            plan.unchanged += 1
+        else:
+            plan.inserts.append(pos)
+
+    plan.retire = [row for row in stored if row["_id"] not in matched]
+    return plan
+
+
+def _same_span(row: Dict[str, Any], piece: Piece) -> bool:
+    return row.get("char_start") == piece[1] and row.get("char_end") == piece[2]
+
+
+def rollback_unpublished(
+    chunks_col, document_id: str, generation: int
+) -> Dict[Optional[str], Counter]:
+    """Cleans up after a crashed attempt at the published `generation`.
+
+    Drops the rows of an unpublished generation (above `generation`) and
+    revives the rows it retired. Rows retired by a published generation whose
+    finish_generation never ran are deleted. Returns the store references held
+    by the dropped rows, by model.
+    """
+    leftovers = list(
+        chunks_col.find(
+            {
+                "document_id": document_id,
+                "$or": [
+                    {"gen_from": {"$gt": generation}},
+                    {"gen_to": {"$lte": generation}},
+                ],
+            },
+            projection={"content_hash": 1, "embedding_model": 1},
+        )
+    )
+    if leftovers:
+        chunks_col.delete_many({"_id": {"$in": [row["_id"] for row in leftovers]}})
+        logger.warning(
+            "Cleaned up %d unpublished or retired chunk(s) for document_id=%s",
+            len(leftovers),
+            document_id,
+        )
+    chunks_col.update_many(
+        {"document_id": document_id, "gen_to": {"$gt": generation}},
+        {"$unset": {"gen_to": ""}},
+    )
+    return _hash_counts(leftovers)
+
+
+def load_live(chunks_col, document_id: str) -> List[Dict[str, Any]]:
+    """Rows of the current generation (after rollback_unpublished)."""
+    return list(
+        chunks_col.find(
+            {"document_id": document_id, "gen_to": {"$exists": False}},
+            projection=STORED_PROJECTION,
+        )
+    )
+
+
+def stage_generation(
+    chunks_col, plan: ChunkPlan, new_rows: List[Dict[str, Any]]
+) -> None:
+    """Writes generation N next to the live one; invisible until the flip."""
+    if new_rows:
+        chunks_col.insert_many(new_rows)
+    if plan.retire:
+        chunks_col.update_many(
+            {"_id": {"$in": [row["_id"] for row in plan.retire]}},
+            {"$set": {"gen_to": plan.generation}},
+        )
+
+
+def finish_generation(chunks_col, document_id: str, generation: int) -> None:
+    """After the flip: delete the rows retired by this or earlier generations.
+
+    Readers already hide them (they check the document's chunk_generation),
+    so a crash before this only leaves them for rollback_unpublished.
+    """
+    chunks_col.delete_many({"document_id": document_id, "gen_to": {"$lte": generation}})
+
+
+def retired_hash_counts(plan: ChunkPlan) -> Dict[Optional[str], Counter]:
+    """Store references held by the retired rows, grouped by embedding model."""
+    return _hash_counts(plan.retire)
+
+
+def _hash_counts(rows: List[Dict[str, Any]]) -> Dict[Optional[str], Counter]:
+    by_model: Dict[Optional[str], Counter] = defaultdict(Counter)
+    for row in rows:
+        if row.get("content_hash"):
+            by_model[row.get("embedding_model")][row["content_hash"]] += 1
+    return by_model
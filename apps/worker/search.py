@@ -1,30 +1,39 @@
 import argparse
-import math
 import os
 import sys
 from typing import Any, Dict, Iterable, List, Optional, Tuple
 
+import numpy as np
 from pymongo import MongoClient
 from openai import OpenAI
 import dotenv
 
-dotenv.load_dotenv()
-
-def l2_norm(vec: List[float]) -> float:
-    return math.sqrt(sum(v * v for v in vec))
+from embedding_codec import EMBEDDING_FIELDS, decode_embedding
 
+dotenv.load_dotenv()
 
-def cosine_sim(a: List[float], b: List[float]) -> float:
-    if len(a) != len(b):
-        return float("nan")
-    dot = 0.0
-    for x, y in zip(a, b):
-        dot += x * y
-    na = l2_norm(a)
-    nb = l2_norm(b)
-    if na == 0 or nb == 0:
-        return float("nan")
-    return dot / (na * nb)
+def top_k(scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Select the k highest scores per row (argpartition + sort of k only).
+
+    Mirrors pagemate.tools.vector.top_k in the API. Accepts (n,) or (b, n)
+    scores and returns (indices, scores) best first; NaN scores rank last.
+    """
+    scores = np.asarray(scores)
+    n = scores.shape[-1]
+    k = max(0, min(k, n))
+    if k == 0:
+        shape = scores.shape[:-1] + (0,)
+        return np.empty(shape, dtype=np.intp), np.empty(shape, dtype=scores.dtype)
+    if k < n:
+        indices = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+    else:
+        indices = np.broadcast_to(np.arange(n), scores.shape).copy()
+    top_scores = np.take_along_axis(scores, indices, axis=-1)
+    order = np.argsort(-top_scores, axis=-1, kind="stable")
+    return (
+        np.take_along_axis(indices, order, axis=-1),
+        np.take_along_axis(top_scores, order, axis=-1),
+    )
 
 
 def get_db(mongo_url: str, db_name: Optional[str]) -> Tuple[MongoClient, Any]:
@@ -51,21 +60,33 @@ def top_k_cosine(
     qvec: List[float],
     k: int,
 ) -> List[Tuple[float, Dict[str, Any]]]:
-    # Maintain simple list then partial sort for small k
-    scored: List[Tuple[float, Dict[str, Any]]] = []
+    query = np.asarray(qvec, dtype=np.float32)
+    docs: List[Dict[str, Any]] = []
+    vectors: List[np.ndarray] = []
     for doc in cursor:
-        vec = doc.get("embedding")
-        if not isinstance(vec, list) or not vec:
-            continue
         try:
-            score = cosine_sim(qvec, [float(x) for x in vec])
-        except Exception:
+            vec = decode_embedding(doc)
+        except (ValueError, TypeError):
             continue
-        if math.isnan(score):
+        if vec is None or len(vec) != len(query):
             continue
-        scored.append((score, doc))
-    scored.sort(key=lambda x: x[0], reverse=True)
-    return scored[:k]
+        docs.append(doc)
+        vectors.append(vec)
+    if not docs:
+        return []
+
+    keys = np.stack(vectors)
+    norms = np.linalg.norm(keys, axis=1) * np.linalg.norm(query)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        scores = (keys @ query) / norms
+    scores[norms == 0] = np.nan
+
+    indices, top_scores = top_k(scores, k)
+    return [
+        (float(score), docs[i])
+        for i, score in zip(indices, top_scores)
+        if not np.isnan(score)
+    ]
 
 
 def main(argv: Optional[List[str]] = None) -> int:
@@ -131,19 +152,31 @@ def main(argv: Optional[List[str]] = None) -> int:
     if args.document_id:
         filt["document_id"] = args.document_id
 
-    projection = {
+    # Phase one: score on ids + vectors only
+    vector_projection = {"_id": 1, **{field: 1 for field in EMBEDDING_FIELDS}}
+    cursor = chunks_col.find(filt, projection=vector_projection)
+    scored = top_k_cosine(cursor, qvec, args.limit)
+
+    # Phase two: fetch text and metadata for the winners in one $in query
+    content_projection = {
         "_id": 1,
         "document_id": 1,
         "tenant_id": 1,
         "index": 1,
         "text": 1,
-        "embedding": 1,
         "char_start": 1,
         "char_end": 1,
     }
-
-    cursor = chunks_col.find(filt, projection=projection)
-    results = top_k_cosine(cursor, qvec, args.limit)
+    by_id = {
+        doc["_id"]: doc
+        for doc in chunks_col.find(
+            {"_id": {"$in": [doc["_id"] for _, doc in scored]}},
+            projection=content_projection,
+        )
+    }
+    results = [
+        (score, by_id[doc["_id"]]) for score, doc in scored if doc["_id"] in by_id
+    ]
 
     if args.output_format == "json":
         import json
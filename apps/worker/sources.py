@@ -0,0 +1,258 @@
+"""Resolves a claimed document to a local file the parse stage can read.
+
+Resolvers are tried in order:
+
+1. `LocalFileResolver`: the stored file itself, by `object_path` or, when
+   the storage volume is mounted elsewhere (SOURCE_STORAGE_ROOT), by its
+   content-addressed key `objects/<sha[:2]>/<sha[2:4]>/<sha256>` (keep in
+   sync with pagemate.services.storage_service.object_key) or legacy file
+   name. Nothing is copied.
+2. `HttpResolver`: downloads the attachment from the API through a pooled
+   session into a private download directory. Interrupted downloads resume
+   with a Range request (guarded by If-Range), and the result is checked
+   against the document's sha256 when it has one.
+
+Only files created by a resolver are ever removed (`SourceResolver.discard`
+refuses anything outside the download directory); the canonical stored file
+is never written or deleted.
+"""
+
+import hashlib
+import logging
+import os
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger("worker.sources")
+
+_BLOCK_SIZE = 1 << 20
+
+
+@dataclass
+class ResolvedSource:
+    path: Path
+    # True when the file is a private download the caller should discard
+    temporary: bool = False
+
+
+class SourceUnavailable(RuntimeError):
+    """No resolver could provide the document's file (yet)."""
+
+
+def object_key(sha256: str) -> str:
+    return f"objects/{sha256[:2]}/{sha256[2:4]}/{sha256}"
+
+
+class LocalFileResolver:
+    def __init__(self, storage_root: Optional[Path] = None):
+        self.storage_root = storage_root
+
+    def resolve(self, doc: Dict[str, Any]) -> Optional[ResolvedSource]:
+        for path in self._candidates(doc):
+            if path.is_file():
+                return ResolvedSource(path)
+        return None
+
+    def _candidates(self, doc: Dict[str, Any]) -> List[Path]:
+        paths = []
+        object_path = doc.get("object_path")
+        if isinstance(object_path, str) and object_path:
+            paths.append(Path(object_path))
+        if self.storage_root is not None:
+            sha256 = doc.get("sha256")
+            if isinstance(sha256, str) and sha256:
+                paths.append(self.storage_root / object_key(sha256))
+            if paths:
+                # Legacy uploads live directly under the storage root
+                paths.append(self.storage_root / paths[0].name)
+        return paths
+
+
+class HttpResolver:
+    def __init__(
+        self,
+        base_url: str,
+        download_dir: Path,
+        connect_timeout: float = 10.0,
+        read_timeout: float = 60.0,
+        attempts: int = 3,
+        pool_size: int = 4,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.download_dir = download_dir
+        self.timeout = (connect_timeout, read_timeout)
+        self.attempts = max(1, attempts)
+        self.session = requests.Session()
+        retry = Retry(
+            total=3,
+            connect=3,
+            read=0,
+            status=2,
+            backoff_factor=0.5,
+            status_forcelist=(429, 502, 503, 504),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=max(1, pool_size), max_retries=retry
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def url(self, doc: Dict[str, Any]) -> str:
+        document_id = doc.get("_id") or doc.get("document_id")
+        return (
+            f"{self.base_url}/tenants/{doc.get('tenant_id')}"
+            f"/documents/{document_id}/attachment"
+        )
+
+    def resolve(self, doc: Dict[str, Any]) -> Optional[ResolvedSource]:
+        document_id = str(doc.get("_id") or doc.get("document_id") or "")
+        if not document_id or not doc.get("tenant_id"):
+            return None
+        self.download_dir.mkdir(parents=True, exist_ok=True)
+        target = self.download_dir / document_id
+        part = target.with_suffix(".part")
+        url = self.url(doc)
+
+        validators: Dict[str, str] = {}
+        for attempt in range(1, self.attempts + 1):
+            try:
+                self._download(url, part, validators)
+                break
+            except (
+                requests.ConnectionError,
+                requests.Timeout,
+                requests.exceptions.ChunkedEncodingError,
+            ) as e:
+                # Keep the partial file: the next attempt resumes from it
+                logger.warning(
+                    "Download of %s interrupted at %d bytes (attempt %d/%d): %s",
+                    url,
+                    part.stat().st_size if part.exists() else 0,
+                    attempt,
+                    self.attempts,
+                    e,
+                )
+                if attempt == self.attempts:
+                    raise SourceUnavailable(f"Download failed: {e}") from e
+                time.sleep(min(2**attempt, 10))
+
+        expected = doc.get("sha256")
+        if isinstance(expected, str) and expected:
+            with part.open("rb") as f:
+                actual = hashlib.file_digest(f, "sha256").hexdigest()
+            if actual != expected:
+                part.unlink(missing_ok=True)
+                raise SourceUnavailable(
+                    f"Downloaded file does not match sha256 {expected[:12]}…"
+                )
+        os.replace(part, target)
+        return ResolvedSource(target, temporary=True)
+
+    def _download(self, url: str, part: Path, validators: Dict[str, str]) -> None:
+        """Fetches (the rest of) url into part, remembering the ETag."""
+        offset = part.stat().st_size if part.exists() else 0
+        headers = {}
+        if offset:
+            headers["Range"] = f"bytes={offset}-"
+            if "etag" in validators:
+                # Unless the file is unchanged, the server sends all of it
+                headers["If-Range"] = validators["etag"]
+        with self.session.get(
+            url, headers=headers, stream=True, timeout=self.timeout
+        ) as response:
+            if response.status_code == 416:
+                # The partial file is no prefix of the current one: restart
+                part.unlink(missing_ok=True)
+                raise requests.ConnectionError("Range not satisfiable; restarting")
+            if response.status_code == 404:
+                raise FileNotFoundError(f"Attachment not found: {url}")
+            if response.status_code >= 500:
+                raise SourceUnavailable(f"Attachment HTTP {response.status_code}")
+            response.raise_for_status()
+            if etag := response.headers.get("ETag"):
+                validators["etag"] = etag
+            resumed = response.status_code == 206
+            if offset and resumed:
+                logger.debug("Resuming %s at %d bytes", url, offset)
+            with part.open("ab" if resumed else "wb") as f:
+                for block in response.iter_content(_BLOCK_SIZE):
+                    f.write(block)
+
+    def close(self) -> None:
+        self.session.close()
+
+
+class SourceResolver:
+    def __init__(
+        self,
+        local: LocalFileResolver,
+        http: Optional[HttpResolver] = None,
+    ):
+        self.local = local
+        self.http = http
+
+    def resolve(self, doc: Dict[str, Any]) -> ResolvedSource:
+        source = self.local.resolve(doc)
+        if source is not None:
+            return source
+        if self.http is not None:
+            source = self.http.resolve(doc)
+            if source is not None:
+                logger.debug("Downloaded source to %s", source.path)
+                return source
+        raise SourceUnavailable("No local file and no download available")
+
+    def discard(self, source: ResolvedSource) -> None:
+        """Removes a temporary download; never touches stored files."""
+        if not source.temporary or self.http is None:
+            return
+        download_dir = self.http.download_dir.resolve()
+        if not source.path.resolve().is_relative_to(download_dir):
+            logger.error("Refusing to delete %s outside %s", source.path, download_dir)
+            return
+        try:
+            source.path.unlink(missing_ok=True)
+        except OSError as e:
+            logger.warning("Failed to clean up download %s: %s", source.path, e)
+
+    def prune(self, max_age_seconds: float = 86_400) -> None:
+        """Drops downloads (and partial ones) left behind for too long."""
+        if self.http is None or not self.http.download_dir.is_dir():
+            return
+        cutoff = time.time() - max_age_seconds
+        for path in self.http.download_dir.iterdir():
+            try:
+                if path.is_file() and path.stat().st_mtime < cutoff:
+                    path.unlink()
+            except OSError:
+                pass
+
+    def close(self) -> None:
+        if self.http is not None:
+            self.http.close()
+
+
+def build_source_resolver(pool_size: int = 4) -> SourceResolver:
+    """Resolver configured from the environment (see .env.example)."""
+    storage_root = os.getenv("SOURCE_STORAGE_ROOT")
+    base_url = os.getenv("SOURCE_API_BASE_URL", "https://api.pagemate.app")
+    http = None
+    if base_url:
+        http = HttpResolver(
+            base_url,
+            Path(os.getenv("SOURCE_DOWNLOAD_DIR", ".cache/downloads")),
+            connect_timeout=float(os.getenv("SOURCE_CONNECT_TIMEOUT", "10")),
+            read_timeout=float(os.getenv("SOURCE_READ_TIMEOUT", "60")),
+            attempts=int(os.getenv("SOURCE_DOWNLOAD_ATTEMPTS", "3")),
+            pool_size=pool_size,
+        )
+    return SourceResolver(
+        LocalFileResolver(Path(storage_root) if storage_root else None), http
+    )